@@ -1,18 +1,12 @@
-from flask import Flask, request, jsonify, render_template
-from simulang_lexer import tokenize
-from simulang_parser import parse
-from simulang_interpreter import execute, Environment
-import io
-import sys
+from flask import Flask, Response, request, jsonify, render_template
+from simulang_metrics import CONTENT_TYPE
+import simulang_service as service
 import os
-import threading
 
-app = Flask(__name__)
+# The synchronous server; asgi.py serves the same routes from an event loop.
+# Handlers live in simulang_service.
 
-# Global execution state
-runner_thread = None
-stop_flag = False
-output_buffer = io.StringIO()
+app = Flask(__name__)
 
 @app.route("/")
 def index():
@@ -20,56 +14,31 @@ def index():
 
 @app.route("/compile", methods=["POST"])
 def compile_code():
-    code = request.json.get("code", "")
-    try:
-        tokens = tokenize(code)
-        ast = parse(tokens)
-        return jsonify({"output": f"Compilation successful.\\nAST: {repr(ast)}"})
-    except Exception as e:
-        return jsonify({"error": str(e)})
+    return jsonify(service.compile_code(request.json))
 
 @app.route("/run", methods=["POST"])
 def run_code():
-    global runner_thread, stop_flag, output_buffer
-
-    code = request.json.get("code", "")
-    stop_flag = False
-    output_buffer = io.StringIO()
+    return jsonify(service.run_code(request.json))
 
-    def run():
-        global stop_flag
-        try:
-            tokens = tokenize(code)
-            ast = parse(tokens)
-            env = Environment()
-            sys.stdout = output_buffer
-            for node in ast.children:
-                execute(node, env, lambda: not stop_flag)
-        except Exception as e:
-            output_buffer.write("Error: " + str(e))
-        finally:
-            sys.stdout = sys.__stdout__
-
-    runner_thread = threading.Thread(target=run)
-    runner_thread.start()
-
-    return jsonify({"output": "Execution started."})
+@app.route("/run_batch", methods=["POST"])
+def run_batch_code():
+    result = service.run_batch_code(request.json)
+    if not isinstance(result, dict):
+        return Response(result, mimetype="application/x-ndjson")
+    return jsonify(result)
 
 @app.route("/stop", methods=["POST"])
 def stop_execution():
-    global stop_flag
-    stop_flag = True
-    return jsonify({"status": "Execution stop requested."})
+    return jsonify(service.stop_execution(request.get_json(silent=True) or {}))
 
 @app.route("/fetch_output", methods=["GET"])
 def fetch_output():
-    global runner_thread
-    is_alive = runner_thread.is_alive() if runner_thread else False
-    return jsonify({
-        "output": output_buffer.getvalue(),
-        "done": not is_alive
-    })
+    return jsonify(service.fetch_output(request.args))
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(service.metrics(), mimetype=CONTENT_TYPE)
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
-    app.run(debug=False, host="0.0.0.0", port=port)
\ No newline at end of file
+    app.run(debug=False, host="0.0.0.0", port=port)
@@ -0,0 +1,284 @@
+import asyncio
+import json
+import mimetypes
+import os
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+import simulang_service as service
+from simulang_metrics import CONTENT_TYPE
+
+# Async serving mode: the routes of app.py as a plain ASGI application.
+#
+#   uvicorn asgi:app --workers 4
+#
+# The event loop only parses requests and writes responses; every handler in
+# simulang_service (SQLite, lexing, parsing) runs on the executor, and runs
+# themselves on their own threads as before. Waiting is what the loop is
+# for: /fetch_output?wait=<seconds> holds the request until the run has new
+# output or finishes (a long poll), and /stream_output sends each piece of
+# output as a JSON line until the run is done. A waiting connection is a
+# parked coroutine, not a thread; one RunWatcher task per process polls the
+# state of the runs being waited on and wakes their waiters.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TEMPLATE = os.path.join(BASE_DIR, "templates", "index.html")
+STATIC_DIR = os.path.join(BASE_DIR, "static")
+
+EXECUTOR_THREADS = int(os.environ.get("SIMULANG_ASGI_THREADS", 32))
+WATCH_INTERVAL = float(os.environ.get("SIMULANG_WATCH_INTERVAL", 0.1))  # seconds between run state polls
+MAX_WAIT = float(os.environ.get("SIMULANG_MAX_WAIT", 30))  # longest a long poll is held
+
+executor = ThreadPoolExecutor(max_workers=EXECUTOR_THREADS, thread_name_prefix="simulang-asgi")
+
+
+async def call(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+
+
+class RunWatcher:
+    def __init__(self, interval=WATCH_INTERVAL):
+        self.interval = interval
+        self._waiters = {}  # run id -> [(state seen by the waiter, future)]
+        self._task = None
+
+    def wait(self, run_id, seen):
+        # A future resolved with the run's state once it differs from `seen`
+        # (a (status, updated) pair from service.run_state)
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(run_id, []).append((seen, future))
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._poll())
+        return future
+
+    async def _poll(self):
+        while self._waiters:
+            await asyncio.sleep(self.interval)
+            for run_id in [run_id for run_id, waiters in self._waiters.items() if all(future.done() for _, future in waiters)]:
+                del self._waiters[run_id]  # every waiter gave up
+            if not self._waiters:
+                break
+            run_ids = list(self._waiters)
+            states = await call(lambda: {run_id: service.run_state(run_id) for run_id in run_ids})
+            for run_id, state in states.items():
+                waiting = []
+                for seen, future in self._waiters.get(run_id, ()):
+                    if future.done():
+                        continue
+                    if state != seen:
+                        future.set_result(state)
+                    else:
+                        waiting.append((seen, future))
+                if waiting:
+                    self._waiters[run_id] = waiting
+                else:
+                    self._waiters.pop(run_id, None)
+
+
+watcher = RunWatcher()
+
+
+def _fetch(args):
+    # the run's state first, so any output after it shows up as a state change
+    run_id = service.requested_run_id(args)
+    state = service.run_state(run_id) if run_id is not None else None
+    return state, service.fetch_output(dict(args, run_id=run_id) if run_id is not None else args)
+
+
+async def _next_output(args, wait, disconnected=None):
+    # fetch_output, waiting up to `wait` seconds for there to be something new
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+    while True:
+        state, result = await call(_fetch, args)
+        remaining = deadline - loop.time()
+        if "error" in result or result["done"] or result["output"] or remaining <= 0:
+            return result
+        args = dict(args, run_id=result["run_id"])
+        changed = watcher.wait(result["run_id"], state)
+        pending = {changed} if disconnected is None else {changed, disconnected}
+        await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+        if not changed.done():
+            changed.cancel()
+        if disconnected is not None and disconnected.done():
+            return None
+
+
+# -- routes -------------------------------------------------------------------
+
+async def index(request):
+    with open(TEMPLATE, "rb") as f:
+        return 200, "text/html; charset=utf-8", f.read()
+
+
+async def static(request):
+    path = os.path.normpath(os.path.join(STATIC_DIR, request["path"][len("/static/"):]))
+    if not path.startswith(STATIC_DIR + os.sep) or not os.path.isfile(path):
+        return json_response({"error": "Not found"}, 404)
+    with open(path, "rb") as f:
+        return 200, mimetypes.guess_type(path)[0] or "application/octet-stream", f.read()
+
+
+async def compile_code(request):
+    return json_response(await call(service.compile_code, request["json"]))
+
+
+async def run_code(request):
+    return json_response(await call(service.run_code, request["json"]))
+
+
+async def run_batch_code(request):
+    body = request["json"]
+    if body.get("format") != "jsonl":
+        return json_response(await call(service.run_batch_code, body))
+    lines = await call(service.run_batch_code, body)
+
+    async def stream():
+        while True:
+            line = await call(next, lines, None)
+            if line is None:
+                return
+            yield line
+    return 200, "application/x-ndjson", stream()
+
+
+async def stop_execution(request):
+    return json_response(await call(service.stop_execution, request["json"] or {}))
+
+
+async def fetch_output(request):
+    args = request["args"]
+    try:
+        wait = min(max(0.0, float(args.get("wait", 0))), MAX_WAIT)
+    except ValueError:
+        wait = 0.0
+    result = await _next_output(args, wait, request["disconnected"])
+    return json_response(result if result is not None else {})  # None: the client left
+
+
+async def stream_output(request):
+    # One fetch_output result per line, each holding only new output, until
+    # the run is done or the client goes away
+    args = dict(request["args"])
+
+    async def stream():
+        while True:
+            result = await _next_output(args, MAX_WAIT, request["disconnected"])
+            if result is None:
+                return
+            if result["output"] or result.get("done") or "error" in result:
+                yield json.dumps(result) + "\n"
+            if "error" in result or result.get("done"):
+                return
+            args["run_id"] = result["run_id"]
+            args["since"] = result["cursor"]
+    return 200, "application/x-ndjson", stream()
+
+
+async def metrics(request):
+    return 200, CONTENT_TYPE, (await call(service.metrics)).encode("utf-8")
+
+
+ROUTES = {
+    ("GET", "/"): index,
+    ("POST", "/compile"): compile_code,
+    ("POST", "/run"): run_code,
+    ("POST", "/run_batch"): run_batch_code,
+    ("POST", "/stop"): stop_execution,
+    ("GET", "/fetch_output"): fetch_output,
+    ("GET", "/stream_output"): stream_output,
+    ("GET", "/metrics"): metrics,
+}
+
+
+def json_response(payload, status=200):
+    return status, "application/json", json.dumps(payload).encode("utf-8")
+
+
+# -- ASGI plumbing ------------------------------------------------------------
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def _wait_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            executor.shutdown(wait=False)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+
+    path = scope["path"]
+    handler = ROUTES.get((scope["method"], path))
+    if handler is None and scope["method"] == "GET" and path.startswith("/static/"):
+        handler = static
+    body = await _read_body(receive)
+    if body is None:
+        return
+    if handler is None:
+        status, content_type, content = json_response({"error": "Not found"}, 404)
+    else:
+        request = {
+            "path": path,
+            "args": dict(parse_qsl(scope.get("query_string", b"").decode("latin-1"))),
+            "json": None,
+        }
+        try:
+            request["json"] = json.loads(body) if body else None
+        except ValueError:
+            status, content_type, content = json_response({"error": "Invalid JSON body"}, 400)
+        else:
+            if scope["method"] == "POST" and request["json"] is None and handler is not stop_execution:
+                status, content_type, content = json_response({"error": "Expected a JSON body"}, 400)
+            else:
+                request["disconnected"] = asyncio.ensure_future(_wait_disconnect(receive))
+                try:
+                    status, content_type, content = await handler(request)
+                except Exception:
+                    request["disconnected"].cancel()
+                    raise
+                if isinstance(content, bytes):
+                    request["disconnected"].cancel()
+                else:
+                    await _send_stream(send, status, content_type, content, request["disconnected"])
+                    return
+
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", content_type.encode("latin-1")),
+                            (b"content-length", str(len(content)).encode("latin-1"))]})
+    await send({"type": "http.response.body", "body": content})
+
+
+async def _send_stream(send, status, content_type, chunks, disconnected):
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", content_type.encode("latin-1"))]})
+    try:
+        async for chunk in chunks:
+            if disconnected.done():
+                return
+            await send({"type": "http.response.body", "body": chunk.encode("utf-8"), "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        disconnected.cancel()
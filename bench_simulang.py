@@ -0,0 +1,233 @@
+import argparse
+import contextlib
+import io
+import os
+import pickle
+import tempfile
+import time
+
+from simulang_lexer import tokenize, tokenize_file_spans
+from simulang_parser import parse
+from simulang_interpreter import execute, evaluate_expr, Environment
+from simulang_analysis import analyze
+from simulang_output import OutputWriter
+from simulang_flat import SharedAST, attach, detach, encode
+from symbolic_infinity import SymbolicInfinity
+
+PRINT_PROGRAM = """
+coeternal light := ∞;
+octyl n := 0;
+
+posit varnothing nabla infty ds2(): {
+    print(n);
+    print(n / 4);
+    print(light);
+    print("line");
+    n := n + 1;
+    recur ds2(2500);
+}
+"""
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def bench_output(repeat):
+    ast = parse(tokenize(PRINT_PROGRAM))
+    sink = io.StringIO()
+
+    def run_program():
+        sink.seek(0)
+        sink.truncate()
+        execute(ast, Environment(output=OutputWriter(sink)))
+
+    seconds = best_of(run_program, repeat)
+    lines = sink.getvalue().count("\n")
+    print(f"output/program: {lines} lines in {seconds * 1000:.1f} ms ({lines / seconds:,.0f} lines/s)")
+
+    # The output layer on its own: the old print()-through-sys.stdout path
+    # against the buffered writer, into memory and into a line-buffered file
+    # (what a terminal or log pipe looks like).
+    values = [SymbolicInfinity(coefficient=n % 7 + 1) if n % 4 == 0 else float(n) if n % 4 == 1 else n if n % 4 == 2 else "line"
+              for n in range(10000)]
+
+    def print_path(target):
+        with contextlib.redirect_stdout(target):
+            for val in values:
+                if isinstance(val, float) and val.is_integer():
+                    print(str(int(val)))
+                else:
+                    print(str(val))
+
+    def writer_path(target):
+        writer = OutputWriter(target)
+        for val in values:
+            writer.write_value(val)
+        writer.flush()
+
+    with open(os.devnull, "w", buffering=1) as devnull:
+        for label, path in (("print", print_path), ("writer", writer_path)):
+            for sink_label, target in (("memory", io.StringIO()), ("line-buffered file", devnull)):
+                seconds = best_of(lambda: path(target), repeat)
+                print(f"output/{label} -> {sink_label}: {len(values) / seconds:,.0f} lines/s")
+
+
+def bench_parse(repeat):
+    # Generated expressions: a long flat chain of terms (member chains and
+    # ∞ coefficients included) and deeply nested parentheses.
+    terms = ["n", "3∞", "p.q.r", "2.5", "∞4", "\"s\""]
+    flat = " + ".join(terms[k % len(terms)] for k in range(10000))
+    nested = "(" * 5000 + "1" + " + 1)" * 5000
+    for label, expr in (("10k terms", flat), ("5k nested parens", nested)):
+        tokens = tokenize(f"octyl v := {expr};")
+        seconds = best_of(lambda: parse(tokens), repeat)
+        print(f"parse/{label}: {len(tokens)} tokens in {seconds * 1000:.1f} ms ({len(tokens) / seconds:,.0f} tokens/s)")
+
+
+def bench_lex_file(repeat):
+    # A generated ~8 MB program lexed from disk on 1 core and on all of them
+    body = "".join(f'posit f{k}(): {{\n    print("{{ {k} }}");\n    octyl y := 3∞ + {k}.5 * n.m;\n}}\n' for k in range(100000))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "large.sim")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(body)
+        size = os.path.getsize(path)
+        for jobs in sorted({1, os.cpu_count() or 1}):
+            seconds = best_of(lambda: tokenize_file_spans(path, jobs), repeat)
+            print(f"lex_file/{jobs} jobs: {size / 1e6:.1f} MB in {seconds:.2f} s ({size / 1e6 / seconds:.1f} MB/s)")
+
+
+def bench_ast_handoff(repeat):
+    # What a worker pays to get a large program: unpickling the Node tree
+    # against attaching the shared flat encoding, then visiting every node
+    # and value (as link and analyze do)
+    body = "".join(f'posit f{k}(): {{\n    octyl y := 3∞ + {k}.5 * n.m;\n    equiangular y == {k}: {{\n        print("{k}");\n    }}\n}}\n'
+                   for k in range(20000))
+    ast = parse(tokenize(body))
+
+    def visit(node):
+        count = 1
+        node.value
+        for child in node.children:
+            count += visit(child)
+        return count
+
+    payload = pickle.dumps(ast, pickle.HIGHEST_PROTOCOL)
+    nodes = visit(ast)
+    seconds = best_of(lambda: visit(pickle.loads(payload)), repeat)
+    print(f"ast_handoff/pickle: {nodes} nodes, {len(payload) / 1e6:.1f} MB, {seconds * 1000:.1f} ms per worker")
+    shared = SharedAST(ast)
+    try:
+        def attach_fresh():
+            detach(shared.name)
+            return visit(attach(shared.name))
+        seconds = best_of(attach_fresh, repeat)
+        print(f"ast_handoff/shared: {nodes} nodes, {shared.size / 1e6:.1f} MB, {seconds * 1000:.1f} ms per worker "
+              f"(encoded once in {best_of(lambda: encode(ast), 1) * 1000:.1f} ms)")
+    finally:
+        detach(shared.name)
+        shared.unlink()
+
+
+def bench_reduction(repeat):
+    # Accumulating intertillage loops over their displayed head (the
+    # iterations stepping executes): stepped without analysis against
+    # summed in closed form
+    def program(bounds, term):
+        return (f"octyl total := 0;\noctyl count := 0;\nintertillage {bounds} -> i: {{\n"
+                f"    total := total + {term};\n    count := count + 1;\n}}\n")
+
+    def run(code, analyzed):
+        ast = parse(tokenize(code))
+        if analyzed:
+            analyze(ast)
+        env = Environment(output=OutputWriter(io.StringIO()))
+
+        def go():
+            for child in ast.children:
+                execute(child, env)
+        return go
+
+    for label, bounds, term, analyzed in (("stepped", "[1..100]", "(i * i)", False),
+                                          ("closed form", "[1..100]", "(i * i)", True),
+                                          ("stepped", "[∞..∞ + 99]", "i", False),
+                                          ("closed form", "[∞..∞ + 99]", "i", True)):
+        seconds = best_of(run(program(bounds, term), analyzed), repeat)
+        print(f"reduction/{label} {bounds}: {seconds * 1e6:,.0f} µs")
+
+
+ARITHMETIC_PROGRAM = """
+octyl n := 0;
+octyl total := 0;
+octyl mean := 0;
+
+posit varnothing nabla infty ds2(): {
+    intertillage [1..100] -> i: {
+        total := total + i * 3 - n % 7;
+        mean := total / i + 0.5;
+    }
+    n := n + 1;
+    recur ds2(200);
+}
+"""
+
+
+def bench_arithmetic(repeat):
+    # Integer and mixed arithmetic in loop bodies, without analysis (so
+    # nothing is hoisted or summed in closed form), then one expression
+    # evaluated directly
+    ast = parse(tokenize(ARITHMETIC_PROGRAM))
+    env = None
+
+    def run_program():
+        nonlocal env
+        env = Environment(output=OutputWriter(io.StringIO()))
+        execute(ast, env)
+
+    seconds = best_of(run_program, repeat)
+    steps = env.get("n") * 100
+    print(f"arithmetic/loops: {steps} iterations in {seconds * 1000:.1f} ms ({steps / seconds:,.0f} iterations/s)")
+
+    expr = parse(tokenize("octyl x := ((a + 2) * b - 7) % 5 + a * 1.5;")).children[0].value[1]
+    env = Environment()
+    env.set("a", 3)
+    env.set("b", 11)
+
+    def evaluate():
+        for _ in range(20000):
+            evaluate_expr(expr, env)
+
+    seconds = best_of(evaluate, repeat)
+    print(f"arithmetic/expression: {20000 / seconds:,.0f} evaluations/s")
+
+
+BENCHMARKS = {
+    "arithmetic": bench_arithmetic,
+    "ast_handoff": bench_ast_handoff,
+    "lex_file": bench_lex_file,
+    "output": bench_output,
+    "parse": bench_parse,
+    "reduction": bench_reduction,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SimuLang micro-benchmarks")
+    parser.add_argument("names", nargs="*", help="benchmarks to run (default: all)")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    unknown = set(args.names) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+    for name in args.names or sorted(BENCHMARKS):
+        BENCHMARKS[name](args.repeat)
+
+
+if __name__ == "__main__":
+    main()
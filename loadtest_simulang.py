@@ -0,0 +1,359 @@
+import argparse
+import json
+import math
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from simulang_scheduler import TokenBucket, scheduler
+
+# Drives app.py through a local werkzeug server with N simulated editors. Each
+# editor compiles (full text, then an incremental edit), runs a program, polls
+# its output and sometimes stops it. OpenAI is replaced by a local stub with
+# configurable latency and rate limit (429 responses past it), so LLM-heavy
+# programs and the LLM scheduler can be load tested offline.
+#
+# The server, the stub and the editors share one process: the memory samples
+# are that process's RSS, and client threads compete for the GIL with the
+# server. Compare numbers between runs of this harness, not against a
+# production deployment.
+
+DEFAULT_CONFIG = {
+    "seed": 1,
+    "editors": 8,
+    "duration": 20.0,       # seconds of load after start-up
+    "think_time": [0.05, 0.3],
+    "poll_interval": 0.1,
+    "stop_probability": 0.1,
+    "run_timeout": 30.0,
+    "memory_interval": 1.0,
+    "llm_latency": {"mean": 0.2, "jitter": 0.1},
+    "llm_rate_limit": {"rate": 0, "burst": 0, "retry_after": 1},  # requests/s the stub accepts, 0 = unlimited
+    "programs": [
+        {
+            "name": "loop",
+            "weight": 3,
+            "code": "octyl n := 0;\nintertillage [1..200] -> i: {\n    n := n + i;\n}\nposit f(): {\n    print(n);\n}\n",
+        },
+        {
+            "name": "recur",
+            "weight": 2,
+            "code": "octyl n := 0;\nposit varnothing nabla infty ds2(): {\n    print(n);\n    n := n + 1;\n    recur ds2(50);\n}\n",
+        },
+        {
+            "name": "llm",
+            "weight": 1,
+            "code": "posit ask(): {\n    contradiction \"The sky is blue.\" -> c: {\n        print(c);\n    }\n}\n",
+        },
+    ],
+}
+
+
+# -- OpenAI stub ------------------------------------------------------------
+
+class StubOpenAI(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency, seed, rate_limit=None):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.latency = latency
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.rejected = 0
+        rate_limit = rate_limit or {}
+        self.bucket = TokenBucket(rate_limit["rate"], rate_limit.get("burst")) if rate_limit.get("rate") else None
+        self.retry_after = rate_limit.get("retry_after", 1)
+
+    def admit(self):
+        # False when the simulated provider answers 429
+        with self.lock:
+            if self.bucket is None or self.bucket.delay() == 0:
+                return True
+            self.rejected += 1
+            return False
+
+    def delay(self):
+        mean = self.latency.get("mean", 0.0)
+        jitter = self.latency.get("jitter", 0.0)
+        with self.lock:
+            self.requests += 1
+            return max(0.0, self.random.uniform(mean - jitter, mean + jitter))
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not self.server.admit():
+            payload = json.dumps({"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}}).encode("utf-8")
+            self.send_response(429)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Retry-After", str(self.server.retry_after))
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+        time.sleep(self.server.delay())
+        prompt = body.get("messages", [{}])[-1].get("content", "")
+        payload = json.dumps({
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": f"stub answer ({len(prompt)} chars)"}}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# -- measurements -----------------------------------------------------------
+
+def percentile(sorted_values, fraction):
+    # nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # peak rather than current RSS, but better than nothing off Linux
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}  # endpoint -> [seconds]
+        self.errors = {}     # endpoint -> count
+        self.runs = {"finished": 0, "stopped": 0, "failed": 0, "timeout": 0}
+        self.memory = []     # (elapsed seconds, rss bytes)
+
+    def record(self, endpoint, seconds, ok=True):
+        with self.lock:
+            self.latencies.setdefault(endpoint, []).append(seconds)
+            if not ok:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def report(self, elapsed):
+        endpoints = {}
+        total = 0
+        for endpoint, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            total += len(values)
+            endpoints[endpoint] = {
+                "requests": len(values),
+                "errors": self.errors.get(endpoint, 0),
+                "p50_ms": percentile(values, 0.50) * 1000,
+                "p95_ms": percentile(values, 0.95) * 1000,
+                "p99_ms": percentile(values, 0.99) * 1000,
+            }
+        return {
+            "elapsed": elapsed,
+            "requests": total,
+            "requests_per_second": total / elapsed if elapsed else 0.0,
+            "endpoints": endpoints,
+            "runs": dict(self.runs),
+            "memory": [{"t": round(t, 2), "rss_mb": round(rss / 2 ** 20, 1)} for t, rss in self.memory],
+        }
+
+
+# -- simulated editor -------------------------------------------------------
+
+class Editor:
+    def __init__(self, index, base_url, config, stats, deadline):
+        self.index = index
+        self.base_url = base_url
+        self.config = config
+        self.stats = stats
+        self.deadline = deadline
+        self.random = random.Random(f"{config['seed']}:{index}")
+        programs = config["programs"]
+        self.programs = programs
+        self.weights = [program.get("weight", 1) for program in programs]
+
+    def request(self, endpoint, path, body=None):
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data,
+                                     headers={"Content-Type": "application/json"} if data else {})
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req, timeout=self.config["run_timeout"]) as response:
+                result = json.loads(response.read())
+        except (OSError, ValueError) as e:
+            self.stats.record(endpoint, time.perf_counter() - start, ok=False)
+            return {"error": str(e)}
+        self.stats.record(endpoint, time.perf_counter() - start, ok="error" not in result)
+        return result
+
+    def think(self):
+        low, high = self.config["think_time"]
+        time.sleep(self.random.uniform(low, high))
+
+    def session(self):
+        session_id = f"loadtest-{self.index}"
+        while time.monotonic() < self.deadline:
+            code = self.random.choices(self.programs, self.weights)[0]["code"]
+
+            result = self.request("/compile", "/compile", {"session": session_id, "code": code})
+            if "version" in result:
+                # retype one character, as an editor would between compiles
+                offset = self.random.randrange(len(code))
+                self.request("/compile", "/compile", {"session": session_id, "version": result["version"],
+                                                      "start": offset, "end": offset + 1, "text": code[offset]})
+            self.think()
+
+            result = self.request("/run", "/run", {"code": code, "checkpoint_interval": 0})
+            run_id = result.get("run_id")
+            if run_id is None:
+                continue
+            self.poll(run_id)
+            self.think()
+
+    def poll(self, run_id):
+        stop = self.random.random() < self.config["stop_probability"]
+        cursor = 0
+        started = time.monotonic()
+        while True:
+            time.sleep(self.config["poll_interval"])
+            result = self.request("/fetch_output", f"/fetch_output?run_id={run_id}&since={cursor}")
+            if "error" in result:
+                status = "failed"
+                break
+            cursor = result.get("cursor", cursor)
+            if result.get("done"):
+                status = result.get("status", "finished")
+                break
+            if stop:
+                self.request("/stop", "/stop", {"run_id": run_id})
+                stop = False
+            if time.monotonic() - started > self.config["run_timeout"]:
+                self.request("/stop", "/stop", {"run_id": run_id})
+                status = "timeout"
+                break
+        with self.stats.lock:
+            key = status if status in self.stats.runs else "failed"
+            self.stats.runs[key] += 1
+
+
+# -- driver -----------------------------------------------------------------
+
+def load_config(path):
+    config = json.loads(json.dumps(DEFAULT_CONFIG))
+    if path:
+        with open(path) as f:
+            config.update(json.load(f))
+    return config
+
+
+def run_scenario(config):
+    stub = StubOpenAI(config["llm_latency"], config["seed"], config.get("llm_rate_limit"))
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    # read by openai.OpenAI() inside the interpreter
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{stub.server_port}/v1"
+    os.environ["OPENAI_API_KEY"] = "loadtest"
+    run_db = tempfile.NamedTemporaryFile(prefix="simulang_loadtest_", suffix=".sqlite3", delete=False)
+    run_db.close()
+    os.environ.setdefault("SIMULANG_RUN_DB", run_db.name)
+
+    from werkzeug.serving import make_server
+    import app as simulang_app
+
+    server = make_server("127.0.0.1", 0, simulang_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    stats = Stats()
+    started = time.monotonic()
+    deadline = started + config["duration"]
+    done = threading.Event()
+
+    def sample_memory():
+        while not done.is_set():
+            stats.memory.append((time.monotonic() - started, rss_bytes()))
+            done.wait(config["memory_interval"])
+
+    sampler = threading.Thread(target=sample_memory, daemon=True)
+    sampler.start()
+    editors = [threading.Thread(target=Editor(index, base_url, config, stats, deadline).session, daemon=True)
+               for index in range(config["editors"])]
+    for editor in editors:
+        editor.start()
+    for editor in editors:
+        editor.join()
+    elapsed = time.monotonic() - started
+    done.set()
+    sampler.join()
+    stats.memory.append((elapsed, rss_bytes()))
+
+    server.shutdown()
+    stub.shutdown()
+    report = stats.report(elapsed)
+    report["llm_requests"] = stub.requests
+    report["llm_rejected"] = stub.rejected
+    report["llm_scheduler"] = scheduler().stats()
+    report["config"] = config
+    try:
+        os.unlink(run_db.name)
+    except OSError:
+        pass
+    return report
+
+
+def print_report(report):
+    print(f"{report['requests']} requests in {report['elapsed']:.1f} s ({report['requests_per_second']:.1f} req/s), "
+          f"{report['llm_requests']} stub LLM calls ({report['llm_rejected']} answered 429)")
+    llm = report["llm_scheduler"]
+    print(f"LLM scheduler: {llm['completed']} completed, {llm['failed']} failed, {llm['rate_limited']} rate limited, "
+          f"mean queue wait {llm['mean_wait_seconds'] * 1000:.1f} ms, max {llm['max_wait_seconds'] * 1000:.1f} ms")
+    print(f"{'endpoint':<14} {'requests':>8} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for endpoint, row in report["endpoints"].items():
+        print(f"{endpoint:<14} {row['requests']:>8} {row['errors']:>6} {row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f}")
+    print("runs: " + ", ".join(f"{key} {value}" for key, value in report["runs"].items()))
+    print("rss MB: " + " ".join(f"{sample['t']:.0f}s={sample['rss_mb']}" for sample in report["memory"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SimuLang HTTP load test")
+    parser.add_argument("--config", help="JSON scenario; keys override the built-in defaults")
+    parser.add_argument("--editors", type=int, help="override the number of simulated editors")
+    parser.add_argument("--duration", type=float, help="override the load duration in seconds")
+    parser.add_argument("--json", metavar="PATH", help="also write the full report as JSON")
+    parser.add_argument("--print-config", action="store_true", help="print the default scenario and exit")
+    args = parser.parse_args()
+    if args.print_config:
+        print(json.dumps(DEFAULT_CONFIG, indent=2))
+        return
+    config = load_config(args.config)
+    if args.editors is not None:
+        config["editors"] = args.editors
+    if args.duration is not None:
+        config["duration"] = args.duration
+    report = run_scenario(config)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
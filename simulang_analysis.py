@@ -0,0 +1,304 @@
+from symbolic_infinity import SymbolicInfinity
+
+# Side-effect flags recorded per statement
+PRINT = "print"
+LLM = "llm"
+ASSIGN = "assign"
+RECUR = "recur"
+CALL = "call"
+OPAQUE = "opaque"  # calls something we cannot see (undefined function)
+
+LOOP_TYPES = ("Function", "Intertillage")
+
+
+class NodeInfo:
+    def __init__(self):
+        self.reads = set()     # variables the statement (or its body) may read
+        self.writes = set()    # variables it may assign
+        self.effects = set()   # PRINT / LLM / ASSIGN / RECUR / CALL / OPAQUE
+        self.hoisted = ()      # loop-invariant slots owned by this loop node
+        self.pure_body = False # loop body has no effects at all and cannot raise
+        self.reduction = None  # targets of an intertillage body that only accumulates, see simulang_reduction
+
+    @property
+    def pure(self):
+        return not self.effects
+
+    def merge(self, other):
+        self.reads |= other.reads
+        self.writes |= other.writes
+        self.effects |= other.effects
+
+    def __repr__(self):
+        return f"NodeInfo(reads={sorted(self.reads)}, writes={sorted(self.writes)}, effects={sorted(self.effects)})"
+
+
+class Analysis:
+    def __init__(self, program):
+        self.program = program
+        self.functions = {}   # name -> Function node, last definition wins (as in the linked Module)
+        self.summaries = {}   # name -> NodeInfo of the whole function
+        self.summary = NodeInfo()  # the program as a whole
+        self.hoisted = 0      # number of invariant expressions hoisted
+
+    def info(self, node):
+        return node.info
+
+
+def expression_reads(expr, reads=None):
+    if reads is None:
+        reads = set()
+    kind = expr[0]
+    if kind == "Ident":
+        if expr[1] != "∞":
+            reads.add(expr[1])
+    elif kind == "Member":
+        expression_reads(expr[1], reads)
+    elif kind == "Binary":
+        expression_reads(expr[2], reads)
+        expression_reads(expr[3], reads)
+    elif kind == "Hoisted":
+        expression_reads(expr[2], reads)
+    return reads
+
+
+def may_be_string(expr):
+    kind = expr[0]
+    if kind == "Hoisted":
+        return may_be_string(expr[2])
+    return kind in ("String", "Ident", "Member")
+
+
+def is_range_pair(value):
+    # Boundary ranges are either a (start, end) pair of expressions or a single expression
+    return isinstance(value, tuple) and len(value) == 2 and isinstance(value[0], tuple)
+
+
+def node_expressions(node):
+    value = node.value
+    if node.type == "Assignment":
+        return [value[1]]
+    if node.type == "Print":
+        return [value]
+    if node.type == "Conditional":
+        return [value[1], value[2]]
+    if node.type == "Intertillage":
+        return [value[0], value[1]]
+    if node.type == "Bifurcator":
+        return [expr for expr in value[:3] if expr is not None]
+    if node.type == "Boundary":
+        return list(value[0]) if is_range_pair(value[0]) else [value[0]]
+    if node.type == "Contradiction":
+        return [value[0], value[1]]
+    if node.type == "ContradictionInfer":
+        return [value[0]]
+    return []
+
+
+def map_node_expressions(node, fn):
+    value = node.value
+    if node.type == "Assignment":
+        node.value = (value[0], fn(value[1]), value[2])
+    elif node.type == "Print":
+        node.value = fn(value)
+    elif node.type == "Conditional":
+        node.value = (value[0], fn(value[1]), fn(value[2]))
+    elif node.type == "Intertillage":
+        node.value = (fn(value[0]), fn(value[1]), value[2])
+    elif node.type == "Bifurcator":
+        origin = fn(value[0]) if value[0] is not None else None
+        node.value = (origin, fn(value[1]), fn(value[2])) + value[3:]
+    elif node.type == "Boundary":
+        range_expr = value[0]
+        if is_range_pair(range_expr):
+            range_expr = (fn(range_expr[0]), fn(range_expr[1]))
+        else:
+            range_expr = fn(range_expr)
+        node.value = (range_expr, value[1])
+    elif node.type == "Contradiction":
+        node.value = (fn(value[0]), fn(value[1])) + value[2:]
+    elif node.type == "ContradictionInfer":
+        node.value = (fn(value[0]), value[1])
+
+
+def node_writes(node):
+    value = node.value
+    if node.type == "Assignment":
+        return {value[0]}
+    if node.type == "Intertillage":
+        return {value[2]}
+    if node.type == "Bifurcator":
+        return set(value[3:])
+    if node.type == "Boundary":
+        return {value[1]}
+    if node.type == "Contradiction":
+        return {"c", "c_", value[2], value[3]}
+    if node.type == "ContradictionInfer":
+        return {value[1]}
+    return set()
+
+
+def node_effects(node):
+    if node.type == "Assignment":
+        return {ASSIGN}
+    if node.type in ("Print", "Delineator", "SolBlock"):
+        return {PRINT}
+    if node.type in ("Intertillage", "Bifurcator"):
+        return {ASSIGN, PRINT}  # loop warnings / branch banner
+    if node.type == "Boundary":
+        range_expr = node.value[0]
+        if is_range_pair(range_expr) and all(may_be_string(expr) for expr in range_expr):
+            return {ASSIGN, LLM, PRINT}
+        return {ASSIGN}
+    if node.type in ("Contradiction", "ContradictionInfer"):
+        return {ASSIGN, LLM, PRINT}
+    if node.type == "Recur":
+        return {RECUR}
+    if node.type == "Call":
+        return {CALL}
+    return set()
+
+
+def analyze(program, hoist=True):
+    if isinstance(program.info, Analysis):
+        return program.info
+    analysis = Analysis(program)
+    program.info = analysis
+
+    for child in program.children:
+        if child.type == "Function":
+            analysis.functions[child.value] = child
+
+    # Function summaries feed Call sites, so iterate until they stop growing
+    # (posit functions may call each other recursively).
+    changed = True
+    while changed:
+        changed = False
+        for name, function in analysis.functions.items():
+            summary = _annotate(function, analysis)
+            previous = analysis.summaries.get(name)
+            if previous is None or (summary.reads, summary.writes, summary.effects) != (previous.reads, previous.writes, previous.effects):
+                analysis.summaries[name] = summary
+                changed = True
+
+    for child in program.children:
+        analysis.summary.merge(_annotate(child, analysis))
+
+    if hoist:
+        for node in _walk(program.children):
+            if node.type in LOOP_TYPES:
+                _hoist_loop(node, analysis)
+    return analysis
+
+
+def _annotate(node, analysis):
+    info = NodeInfo()
+    for expr in node_expressions(node):
+        expression_reads(expr, info.reads)
+    info.writes |= node_writes(node)
+    info.effects |= node_effects(node)
+
+    if node.type == "Call":
+        summary = analysis.summaries.get(node.value)
+        if node.value not in analysis.functions:
+            info.effects.add(OPAQUE)
+        elif summary is not None:
+            info.merge(summary)
+
+    body = NodeInfo()
+    for child in node.children:
+        body.merge(_annotate(child, analysis))
+    info.merge(body)
+
+    if node.type == "Intertillage":
+        info.pure_body = not body.effects and _cannot_raise(node.children)
+        info.reduction = _reduction(node)
+    node.info = info
+    return info
+
+
+def _cannot_raise(nodes):
+    # Whether running these effect-free statements (conditionals) can never
+    # raise, given that every name they read is bound: skipping them must not
+    # hide a division by zero or an unsupported operation
+    for node in _walk(nodes):
+        if node.type != "Conditional":
+            return False
+        op, left, right = node.value
+        if op in ("==", "!="):
+            if not (_safe_operand(left) and _safe_operand(right)):
+                return False
+        elif not (_numeric_literal(left) and _numeric_literal(right)):
+            return False  # ordering raises between e.g. a string and a number
+    return True
+
+
+def _safe_operand(expr):
+    while expr[0] == "Hoisted":
+        expr = expr[2]
+    return expr[0] in ("Number", "String", "Ident", "Infty", "Symbolic") or _numeric_literal(expr)
+
+
+def _numeric_literal(expr):
+    # number literals combined without / or %, which could divide by zero
+    while expr[0] == "Hoisted":
+        expr = expr[2]
+    if expr[0] == "Number":
+        return True
+    return (expr[0] == "Binary" and expr[1] not in ("/", "%")
+            and _numeric_literal(expr[2]) and _numeric_literal(expr[3]))
+
+
+def _reduction(loop):
+    # The assigned names when the body is nothing but plain assignments, each
+    # reading no name the body writes except its own target (and the loop
+    # variable), so the assignments are independent of each other
+    children = loop.children
+    if not children or any(child.type != "Assignment" or child.value[2] for child in children):
+        return None
+    targets = tuple(child.value[0] for child in children)
+    if len(set(targets)) != len(targets) or loop.value[2] in targets:
+        return None
+    for child in children:
+        name, expr, _ = child.value
+        if expression_reads(expr) & (set(targets) - {name}):
+            return None
+    return targets
+
+
+def _walk(nodes):
+    for node in nodes:
+        yield node
+        yield from _walk(node.children)
+
+
+def _hoist_loop(loop, analysis):
+    info = loop.info
+    if OPAQUE in info.effects:
+        return
+    variant = info.writes
+    slots = []
+
+    def hoist(expr):
+        kind = expr[0]
+        if kind in ("Binary", "Member"):
+            if not (expression_reads(expr) & variant):
+                slot = analysis.hoisted
+                analysis.hoisted += 1
+                slots.append(slot)
+                return ("Hoisted", slot, expr)
+            if kind == "Binary":
+                return ("Binary", expr[1], hoist(expr[2]), hoist(expr[3]))
+            return ("Member", hoist(expr[1]), expr[2])
+        return expr
+
+    for node in _walk(loop.children):
+        map_node_expressions(node, hoist)
+    info.hoisted = tuple(slots)
+
+
+# Hoisted values are cached for the rest of the loop. SymbolicInfinity has
+# identity equality, so handing out one shared instance could change the
+# outcome of '==' comparisons; those are recomputed instead.
+def is_cacheable(value):
+    return not isinstance(value, SymbolicInfinity)
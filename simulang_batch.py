@@ -0,0 +1,212 @@
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from simulang_lexer import tokenize
+from simulang_parser import parse
+from simulang_analysis import analyze
+from simulang_optimizer import optimize as optimize_program
+from simulang_linker import LinkError, link
+from simulang_flat import SharedAST, attach
+from simulang_checkpoint import source_hash
+from simulang_interpreter import execute_body, Environment
+from simulang_metering import ExecutionInterrupted, Meter
+from simulang_metrics import CACHE_REQUESTS, RUNS, RUN_SECONDS
+from simulang_output import OutputWriter
+
+# Runs many programs at once for regression suites: the app's /run_batch and
+# simulang_cli.py. Each program runs the way /run runs it, with its output
+# captured in memory, and yields one result dict per program.
+
+PROGRAM_SUFFIX = ".sim"
+
+
+# Parsed, optimized, linked and analyzed programs keyed on the source hash, least
+# recently used evicted. Programs are not modified by execution, so runs
+# share them.
+class ParseCache:
+    def __init__(self, maxsize=256, optimize=True):
+        self.maxsize = maxsize
+        self.optimize = optimize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, source):
+        key = source_hash(source)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                CACHE_REQUESTS.labels("parse", "hit").inc()
+                return entry
+        ast = parse(tokenize(source))
+        if self.optimize:
+            optimize_program(ast)
+        link(ast)
+        analyze(ast)
+        with self._lock:
+            # another thread may have parsed the same source meanwhile; keep one
+            ast = self._entries.setdefault(key, ast)
+            self._entries.move_to_end(key)
+            self.misses += 1
+            CACHE_REQUESTS.labels("parse", "miss").inc()
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return ast
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "maxsize": self.maxsize}
+
+
+# The worker side of run_batch(share_ast=True): programs arrive as the names
+# of SharedAST blocks the parent parsed and optimized, and are linked and
+# analyzed here, in place, on first use.
+class SharedASTCache:
+    def __init__(self):
+        self._entries = {}
+
+    def get(self, name):
+        ast = self._entries.get(name)
+        if ast is None:
+            ast = attach(name)
+            link(ast)
+            analyze(ast)
+            self._entries[name] = ast
+        return ast
+
+
+def run_program(name, source, cache, timeout=None, max_steps=None):
+    result = {"name": name, "ok": False, "output": "", "error": None, "parse_ms": 0.0, "run_ms": 0.0}
+    started = time.perf_counter()
+    try:
+        ast = cache.get(source)
+    except (SyntaxError, IndexError, LinkError) as e:
+        result["error"] = f"{type(e).__name__}: {e}" if not isinstance(e, IndexError) else "SyntaxError: Unexpected end of input"
+        return result
+    finally:
+        result["parse_ms"] = (time.perf_counter() - started) * 1000
+
+    sink = io.StringIO()
+    env = Environment(output=OutputWriter(sink, flush_interval=float("inf")))
+    env.meter = Meter(deadline=timeout, max_steps=max_steps)
+    env.run_id = name
+    started = time.perf_counter()
+    status = "failed"
+    try:
+        execute_body(ast, env, lambda: True)
+        result["ok"] = True
+        status = "finished"
+    except ExecutionInterrupted as e:
+        result["error"] = f"Interrupted: {e}"
+        status = "interrupted"
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        elapsed = time.perf_counter() - started
+        RUNS.labels(status).inc()
+        RUN_SECONDS.observe(elapsed)
+        result["run_ms"] = elapsed * 1000
+        env.output.flush()
+        result["output"] = sink.getvalue()
+    return result
+
+
+# Worker processes cannot share the parent's cache; each keeps its own, so a
+# source repeated within the batch is still parsed once per process.
+_process_cache = None
+
+
+def _run_in_process(name, source, timeout, max_steps, optimize):
+    global _process_cache
+    if _process_cache is None:
+        _process_cache = ParseCache(optimize=optimize)
+    return run_program(name, source, _process_cache, timeout, max_steps)
+
+
+_shared_cache = None
+
+
+def _run_shared(name, block, timeout, max_steps):
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = SharedASTCache()
+    return run_program(name, block, _shared_cache, timeout, max_steps)
+
+
+def _share_programs(programs, optimize):
+    # Parse each distinct source once in the parent and place it in shared
+    # memory. Returns {source: SharedAST}; sources that fail to parse are left
+    # out and reported by run_program() as usual.
+    shared = {}
+    for _, source in programs:
+        if source in shared:
+            continue
+        try:
+            ast = parse(tokenize(source))
+        except (SyntaxError, IndexError):
+            shared[source] = None
+            continue
+        if optimize:
+            optimize_program(ast)
+        shared[source] = SharedAST(ast)
+    return {source: block for source, block in shared.items() if block is not None}
+
+
+def run_batch(programs, jobs=None, cache=None, timeout=None, max_steps=None, executor="thread", optimize=True,
+              share_ast=False):
+    # programs: iterable of (name, source). Yields (index, result) as programs
+    # finish. Threads overlap LLM waits and share `cache`; processes give
+    # CPU-bound suites real parallelism. With share_ast, process workers get
+    # each program parsed once by the parent, through shared memory
+    # (simulang_flat), instead of parsing it themselves.
+    programs = list(programs)
+    shared = {}
+    if not jobs:
+        cpus = os.cpu_count() or 1
+        jobs = min(32, cpus + 4) if executor == "thread" else cpus
+    if executor == "process" and share_ast:
+        shared = _share_programs(programs, optimize)
+        pool = ProcessPoolExecutor(max_workers=jobs)
+
+        def submit(name, source):
+            if source in shared:
+                return pool.submit(_run_shared, name, shared[source].name, timeout, max_steps)
+            return pool.submit(_run_in_process, name, source, timeout, max_steps, optimize)
+    elif executor == "process":
+        pool = ProcessPoolExecutor(max_workers=jobs)
+        submit = lambda name, source: pool.submit(_run_in_process, name, source, timeout, max_steps, optimize)
+    elif executor == "thread":
+        cache = cache if cache is not None else ParseCache(optimize=optimize)
+        pool = ThreadPoolExecutor(max_workers=jobs)
+        submit = lambda name, source: pool.submit(run_program, name, source, cache, timeout, max_steps)
+    else:
+        raise ValueError(f"Unknown executor: {executor}")
+    try:
+        with pool:
+            futures = {submit(name, source): index for index, (name, source) in enumerate(programs)}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+    finally:
+        for block in shared.values():
+            block.unlink()
+
+
+def collect_programs(paths):
+    # (name, source) for each file, or each *.sim file under a directory
+    programs = []
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(os.path.join(root, name)
+                           for root, _, names in os.walk(path) for name in names if name.endswith(PROGRAM_SUFFIX))
+        else:
+            files = [path]
+        for file in files:
+            with open(file, encoding="utf-8") as f:
+                programs.append((file, f.read()))
+    return programs
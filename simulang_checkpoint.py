@@ -0,0 +1,245 @@
+import hashlib
+import json
+import os
+import pickle
+import queue
+import re
+import shutil
+import threading
+import time
+import uuid
+import zlib
+
+# Checkpoints live in <directory>/<checkpoint id>/ as a meta.json plus numbered
+# segments. Each segment is a zlib-compressed pickle that holds only what
+# changed since the previous one (variables, output text), so later snapshots
+# stay small and resume folds the segments back together in order.
+#
+# Checkpoint ids arrive from clients (a /run "resume"), and segments are
+# unpickled, so an id is only ever used as a path once it is known to be a
+# uuid hex: nothing outside the checkpoint directory can be read or written.
+
+SEGMENT_SUFFIX = ".ckpt"
+CHECKPOINT_ID = re.compile(r"[0-9a-f]{32}")
+
+
+class CheckpointError(RuntimeError):
+    pass
+
+
+def source_hash(source):
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+def number_nodes(program):
+    nodes = []
+
+    def walk(node):
+        nodes.append(node)
+        for child in node.children:
+            walk(child)
+
+    walk(program)
+    return nodes
+
+
+class Frame:
+    __slots__ = ("key", "index", "state")
+
+    def __init__(self, key, index=0, state=None):
+        self.key = key      # preorder number of the node in the program
+        self.index = index  # statement index for bodies, iteration for loops
+        self.state = state  # loop bookkeeping needed to re-enter mid-loop
+
+
+class Checkpoint:
+    def __init__(self, checkpoint_id, meta):
+        self.id = checkpoint_id
+        self.meta = meta
+        self.seq = 0
+        self.vars = {}
+        self.frames = []
+        self.output = ""
+        self.cursor = 0
+
+
+def checkpoint_path(directory, checkpoint_id):
+    if not isinstance(checkpoint_id, str) or not CHECKPOINT_ID.fullmatch(checkpoint_id):
+        raise CheckpointError(f"Invalid checkpoint id: {checkpoint_id!r}")
+    return os.path.join(directory, checkpoint_id)
+
+
+def prune_checkpoints(directory, older_than):
+    # Removes checkpoints not written to for older_than seconds; returns how many
+    cutoff = time.time() - older_than
+    removed = 0
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return 0
+    for name in names:
+        path = os.path.join(directory, name)
+        if not CHECKPOINT_ID.fullmatch(name) or not os.path.isdir(path):
+            continue
+        try:
+            updated = max([os.path.getmtime(os.path.join(path, entry)) for entry in os.listdir(path)],
+                          default=os.path.getmtime(path))
+        except OSError:
+            continue  # removed concurrently
+        if updated < cutoff:
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+    return removed
+
+
+def load_checkpoint(directory, checkpoint_id):
+    path = checkpoint_path(directory, checkpoint_id)
+    try:
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        raise CheckpointError(f"Unknown checkpoint: {checkpoint_id}")
+
+    checkpoint = Checkpoint(checkpoint_id, meta)
+    output = []
+    for name in sorted(os.listdir(path)):
+        if not name.endswith(SEGMENT_SUFFIX):
+            continue
+        with open(os.path.join(path, name), "rb") as f:
+            segment = pickle.loads(zlib.decompress(f.read()))
+        checkpoint.seq = segment["seq"]
+        checkpoint.vars.update(segment["vars"])
+        checkpoint.frames = segment["frames"]
+        checkpoint.cursor = segment["cursor"]
+        output.append(segment["output"])
+    if not checkpoint.seq:
+        raise CheckpointError(f"Checkpoint {checkpoint_id} has no snapshots yet")
+    checkpoint.output = "".join(output)
+    return checkpoint
+
+
+# Tracks where the interpreter is (a stack of body/loop frames) and takes a
+# snapshot at the top of a loop iteration once `interval` seconds have passed.
+# Taking a snapshot only copies references: environment values are never
+# mutated in place, so a shallow copy of env.vars is a consistent view.
+# Diffing, pickling and disk I/O happen on a background thread.
+class Checkpointer:
+    def __init__(self, program, source, directory, checkpoint_id=None, interval=10.0, read_output=None):
+        self.id = checkpoint_id or uuid.uuid4().hex
+        self.directory = checkpoint_path(directory, self.id)
+        self.interval = interval
+        self.read_output = read_output  # (start, end) -> output text, if the sink can be read back
+        self.source_hash = source_hash(source)
+        self.nodes = number_nodes(program)
+        self.keys = {id(node): key for key, node in enumerate(self.nodes)}
+        self.stack = []
+        self.snapshots = 0
+
+        self._resume = None
+        self._seq = 0
+        self._cursor_base = 0
+        self._last_vars = {}
+        self._last_cursor = 0
+        self._next_at = time.monotonic() + interval
+        self._queue = queue.Queue()
+        self._writer = None
+        os.makedirs(self.directory, exist_ok=True)
+        self._write_meta("running")
+
+    # -- frame tracking -------------------------------------------------
+
+    def enter(self, node):
+        frame = Frame(self.keys.get(id(node), -1))
+        target = self._resume
+        if target is not None:
+            depth = len(self.stack)
+            key, index, state = target[depth]
+            if key != frame.key:
+                raise CheckpointError("Checkpoint does not match the program being resumed")
+            frame.index = index
+            frame.state = state
+            if depth == len(target) - 1:
+                self._resume = None
+        self.stack.append(frame)
+        return frame
+
+    def resume_state(self, node):
+        # (loop state, iteration) when `node` is a loop a resume stops in,
+        # whether the innermost frame or one enclosing it
+        target = self._resume
+        if target is None:
+            return None
+        key, index, state = target[len(self.stack)]
+        if state is None or key != self.keys.get(id(node)):
+            return None
+        return state, index
+
+    def leave(self):
+        self.stack.pop()
+
+    def tick(self, env):
+        # Not while a resume is still re-entering its frames: the stack is
+        # incomplete until it reaches the checkpoint's innermost one
+        if self._resume is None and time.monotonic() >= self._next_at:
+            self.snapshot(env)
+
+    # -- snapshots ------------------------------------------------------
+
+    def snapshot(self, env):
+        env.output.flush()
+        self._seq += 1
+        self.snapshots += 1
+        self._queue.put({
+            "seq": self._seq,
+            "vars": dict(env.vars),
+            "frames": [(frame.key, frame.index, frame.state) for frame in self.stack],
+            "cursor": self._cursor_base + env.output.written,
+        })
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_segments, daemon=True)
+            self._writer.start()
+        self._next_at = time.monotonic() + self.interval
+
+    def resume(self, checkpoint, env):
+        if checkpoint.meta.get("source_hash") != self.source_hash:
+            raise CheckpointError("Checkpoint was taken from a different program")
+        env.vars = dict(checkpoint.vars)
+        self._resume = list(checkpoint.frames)
+        self._seq = checkpoint.seq
+        self._cursor_base = checkpoint.cursor
+        self._last_vars = dict(checkpoint.vars)
+        self._last_cursor = checkpoint.cursor
+
+    def close(self, status="finished"):
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+        self._write_meta(status)
+
+    def remove(self):
+        # Deletes the checkpoint, e.g. once its run has finished and there is nothing left to resume
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _write_segments(self):
+        last_vars, last_cursor = self._last_vars, self._last_cursor
+        while True:
+            state = self._queue.get()
+            if state is None:
+                return
+            current = state["vars"]
+            state["vars"] = {name: entry for name, entry in current.items() if last_vars.get(name) is not entry}
+            cursor = state["cursor"]
+            state["output"] = self.read_output(last_cursor, cursor) if self.read_output else ""
+            self._write_file(f"{state['seq']:06d}{SEGMENT_SUFFIX}", zlib.compress(pickle.dumps(state, pickle.HIGHEST_PROTOCOL)))
+            last_vars, last_cursor = current, cursor
+
+    def _write_meta(self, status):
+        meta = {"id": self.id, "source_hash": self.source_hash, "interval": self.interval, "status": status, "updated": time.time()}
+        self._write_file("meta.json", json.dumps(meta).encode("utf-8"))
+
+    def _write_file(self, name, data):
+        path = os.path.join(self.directory, name)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
@@ -0,0 +1,47 @@
+import argparse
+import json
+import sys
+
+from simulang_batch import collect_programs, run_batch
+
+# Batch runner for regression suites:
+#   python simulang_cli.py tests/ more.sim --jobs 8 --format jsonl
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run SimuLang programs in parallel")
+    parser.add_argument("paths", nargs="+", help=".sim files or directories searched for them")
+    parser.add_argument("--jobs", "-j", type=int, default=0, help="worker count (default: CPU based)")
+    parser.add_argument("--executor", choices=("process", "thread"), default="process",
+                        help="processes for CPU-bound suites, threads for LLM-bound ones")
+    parser.add_argument("--format", choices=("json", "jsonl"), default="json",
+                        help="one JSON array in input order, or one line per program as it finishes")
+    parser.add_argument("--timeout", type=float, default=None, help="seconds per program")
+    parser.add_argument("--max-steps", type=int, default=None, help="loop steps per program")
+    parser.add_argument("--no-optimize", dest="optimize", action="store_false", help="skip the optimizer passes")
+    parser.add_argument("--share-ast", action="store_true",
+                        help="parse each program once and hand it to process workers through shared memory")
+    args = parser.parse_args(argv)
+
+    programs = collect_programs(args.paths)
+    if not programs:
+        parser.error("no programs found")
+    results = [None] * len(programs)
+    for index, result in run_batch(programs, args.jobs, timeout=args.timeout, max_steps=args.max_steps, executor=args.executor,
+                                   optimize=args.optimize, share_ast=args.share_ast):
+        if args.format == "jsonl":
+            sys.stdout.write(json.dumps(dict(result, index=index)) + "\n")
+            sys.stdout.flush()
+        results[index] = result
+    if args.format == "json":
+        json.dump(results, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+
+    failed = sum(1 for result in results if not result["ok"])
+    if failed:
+        print(f"{failed} of {len(results)} programs failed", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
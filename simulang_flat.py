@@ -0,0 +1,286 @@
+import atexit
+import struct
+from array import array
+from multiprocessing import shared_memory
+
+from symbolic_infinity import SymbolicInfinity
+
+# A flat, position-independent encoding of a parsed program, for handing one
+# AST to many worker processes without pickling it for each of them. The
+# encoded bytes go into a shared memory block once; workers map it and read
+# it in place through memoryview casts, and the interpreter runs FlatNode
+# views that decode a node's value and children the first time they are
+# touched.
+#
+# Layout (all integers little-endian int64, sections 8-byte aligned):
+#
+#   header    MAGIC, then the count and byte offset of each section
+#   nodes     (type string, value, first ref, child count) per node, preorder;
+#             node 0 is the root
+#   values    (tag, a, b) per value; a float keeps its bits in `a`, an int
+#             too wide for int64 (a huge integral literal) its digits as a string
+#   refs      child node indices and tuple item value indices
+#   strings   (byte offset, byte length) per string into the blob
+#   blob      the UTF-8 text of every string, each stored once
+#
+# Everything refers to everything else by index, so the block can be mapped
+# at any address.
+
+MAGIC = b"SIMFLAT1"
+HEADER = struct.Struct("<8s10q")
+
+NONE, BOOL, INT, FLOAT, STR, TUPLE, SYMBOLIC, BIGINT = range(8)
+INT64 = range(-2 ** 63, 2 ** 63)
+NODE_FIELDS = 4
+VALUE_FIELDS = 3
+
+
+_MISSING = object()
+
+
+class FlatError(ValueError):
+    pass
+
+
+# -- encoding -----------------------------------------------------------------
+
+class _Encoder:
+    def __init__(self):
+        self.nodes = array("q")
+        self.values = array("q")
+        self.refs = array("q")
+        self.strings = {}
+        self.interned = {}  # (tag, a, b) or tuple of item indices -> value index
+
+    def string(self, text):
+        index = self.strings.get(text)
+        if index is None:
+            index = self.strings[text] = len(self.strings)
+        return index
+
+    def _record(self, tag, a=0, b=0):
+        key = (tag, a, b)
+        index = self.interned.get(key)
+        if index is None:
+            index = self.interned[key] = len(self.values) // VALUE_FIELDS
+            self.values.extend(key)
+        return index
+
+    def value(self, value):
+        cls = type(value)
+        if value is None:
+            return self._record(NONE)
+        if cls is bool:
+            return self._record(BOOL, int(value))
+        if cls is int:
+            return self._record(INT, value) if value in INT64 else self._record(BIGINT, self.string(str(value)))
+        if cls is float:
+            return self._record(FLOAT, struct.unpack("<q", struct.pack("<d", value))[0])
+        if cls is str:
+            return self._record(STR, self.string(value))
+        if cls is tuple:
+            items = tuple([self.value(item) for item in value])
+            index = self.interned.get((TUPLE, items))  # equal tuples share one record
+            if index is None:
+                start = len(self.refs)
+                self.refs.extend(items)
+                index = self.interned[(TUPLE, items)] = self._record(TUPLE, start, len(items))
+            return index
+        if cls is SymbolicInfinity:
+            fields = (value.coefficient, value.operation, value.right, value.base, value.is_iterator)
+            return self._record(SYMBOLIC, self.value(fields))
+        raise FlatError(f"Cannot encode a {cls.__name__} in an AST")
+
+    def node(self, node):
+        index = len(self.nodes) // NODE_FIELDS
+        self.nodes.extend((self.string(node.type), self.value(node.value), 0, len(node.children)))
+        children = [self.node(child) for child in node.children]
+        start = len(self.refs)
+        self.refs.extend(children)
+        self.nodes[index * NODE_FIELDS + 2] = start
+        return index
+
+
+def _pad(data):
+    return data + b"\0" * (-len(data) % 8)
+
+
+def encode(program):
+    encoder = _Encoder()
+    encoder.node(program)
+    blob = bytearray()
+    table = array("q")
+    for text in encoder.strings:  # dicts keep insertion order, i.e. index order
+        raw = text.encode("utf-8")
+        table.extend((len(blob), len(raw)))
+        blob += raw
+
+    sections = [encoder.nodes.tobytes(), encoder.values.tobytes(), encoder.refs.tobytes(), table.tobytes(), bytes(blob)]
+    offsets = []
+    position = HEADER.size
+    for section in sections:
+        offsets.append(position)
+        position += len(_pad(section))
+    header = HEADER.pack(MAGIC, len(encoder.nodes) // NODE_FIELDS, len(encoder.values) // VALUE_FIELDS,
+                         len(encoder.refs), len(encoder.strings), len(blob), *offsets)
+    return header + b"".join(_pad(section) for section in sections)
+
+
+# -- reading ------------------------------------------------------------------
+
+class FlatAST:
+    # Accessors over an encoded program in any buffer (bytes, mmap, shared
+    # memory). Nothing is copied: the sections are memoryview casts.
+    def __init__(self, buffer):
+        view = memoryview(buffer)
+        if len(view) < HEADER.size:
+            raise FlatError("Not an encoded SimuLang AST")
+        magic, node_count, value_count, ref_count, string_count, blob_size, *offsets = HEADER.unpack_from(view)
+        if magic != MAGIC:
+            raise FlatError("Not an encoded SimuLang AST")
+        nodes_at, values_at, refs_at, strings_at, blob_at = offsets
+        self.buffer = view
+        self.nodes = view[nodes_at:nodes_at + node_count * NODE_FIELDS * 8].cast("q")
+        self.values = view[values_at:values_at + value_count * VALUE_FIELDS * 8].cast("q")
+        self.floats = view[values_at:values_at + value_count * VALUE_FIELDS * 8].cast("d")
+        self.refs = view[refs_at:refs_at + ref_count * 8].cast("q")
+        self.string_table = view[strings_at:strings_at + string_count * 16].cast("q")
+        self.blob = view[blob_at:blob_at + blob_size]
+        self._strings = {}
+        self._decoded = {}
+        self.shm = None  # the SharedMemory mapping, when attach()ed
+
+    def __len__(self):
+        return len(self.nodes) // NODE_FIELDS
+
+    def string(self, index):
+        text = self._strings.get(index)
+        if text is None:
+            start, size = self.string_table[2 * index], self.string_table[2 * index + 1]
+            text = self._strings[index] = str(self.blob[start:start + size], "utf-8")
+        return text
+
+    def value(self, index):
+        # Decoded once and shared: tuples are immutable, and folded ∞ literals
+        # are copied by the interpreter on every evaluation
+        value = self._decoded.get(index, _MISSING)
+        if value is not _MISSING:
+            return value
+        values = self.values
+        base = index * VALUE_FIELDS
+        tag, a = values[base], values[base + 1]
+        if tag == TUPLE:
+            value = tuple([self.value(ref) for ref in self.refs[a:a + values[base + 2]].tolist()])
+        elif tag == STR:
+            value = self.string(a)
+        elif tag == FLOAT:
+            value = self.floats[base + 1]
+        elif tag == NONE:
+            value = None
+        elif tag == INT:
+            value = a
+        elif tag == BOOL:
+            value = bool(a)
+        elif tag == SYMBOLIC:
+            value = SymbolicInfinity(*self.value(a))
+        elif tag == BIGINT:
+            value = int(self.string(a))
+        else:
+            raise FlatError(f"Unknown value tag {tag}")
+        self._decoded[index] = value
+        return value
+
+    def node(self, index):
+        return FlatNode(self, index)
+
+    def root(self):
+        return FlatNode(self, 0)
+
+    def close(self):
+        # Drop the memoryviews first: a mapping cannot close while they exist
+        for name in ("nodes", "values", "floats", "refs", "string_table", "blob", "buffer"):
+            getattr(self, name).release()
+        if self.shm is not None:
+            self.shm.close()
+            self.shm = None
+
+
+class FlatNode:
+    # Stands in for simulang_parser.Node. `value` and `children` are decoded
+    # on first access and then become plain attributes, so the interpreter,
+    # linker and analysis (which assign info, target and rewritten values)
+    # work on views unchanged.
+    def __init__(self, ast, index):
+        self._ast = ast
+        self._index = index
+        self.type = ast.string(ast.nodes[index * NODE_FIELDS])
+        self.info = None
+        self.target = None
+        self.token = None  # not encoded
+
+    def __getattr__(self, name):
+        ast = self._ast
+        base = self._index * NODE_FIELDS
+        if name == "value":
+            self.value = ast.value(ast.nodes[base + 1])
+            return self.value
+        if name == "children":
+            start, count = ast.nodes[base + 2], ast.nodes[base + 3]
+            self.children = [FlatNode(ast, ast.refs[start + k]) for k in range(count)]
+            return self.children
+        raise AttributeError(name)
+
+    def __repr__(self):
+        return f"Node(type={self.type}, value={self.value}, children={self.children})"
+
+
+def decode(buffer):
+    # the root FlatNode of an encoded program
+    return FlatAST(buffer).root()
+
+
+# -- shared memory ------------------------------------------------------------
+
+class SharedAST:
+    # Owner side: one encoded program in a shared memory block, named so
+    # that other processes can attach(). unlink() when no worker needs it.
+    def __init__(self, program):
+        data = encode(program)
+        self.size = len(data)
+        self.shm = shared_memory.SharedMemory(create=True, size=self.size)
+        self.shm.buf[:self.size] = data
+        self.name = self.shm.name
+
+    def unlink(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+# Blocks this process has attached, by name. They stay mapped until
+# detach(), or exit: a SharedMemory cannot be closed while the memoryviews
+# over it exist, and left to the garbage collector the two can go in either
+# order.
+_attached = {}
+
+
+def attach(name):
+    # Worker side: the root FlatNode of a SharedAST, read in place
+    ast = _attached.get(name)
+    if ast is None:
+        shm = shared_memory.SharedMemory(name=name)
+        ast = FlatAST(shm.buf)
+        ast.shm = shm
+        _attached[name] = ast
+    return ast.root()
+
+
+def detach(name):
+    ast = _attached.pop(name, None)
+    if ast is not None:
+        ast.close()
+
+
+@atexit.register
+def _detach_all():
+    for name in list(_attached):
+        detach(name)
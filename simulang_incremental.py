@@ -0,0 +1,181 @@
+from simulang_lexer import tokenize_spans
+from simulang_parser import Node, parse
+
+
+# One top-level item (a posit function or a top-level statement). Token spans
+# are kept relative to the block start, so an edit earlier in the file only
+# has to move `start`/`end` of the blocks after it.
+class Block:
+    def __init__(self, start, end, tokens, spans):
+        self.start = start
+        self.end = end
+        self.tokens = tokens
+        self.spans = spans  # relative to self.start
+        self.nodes = []
+        self.error = None   # (offset, message) of the first syntax error
+
+    def compile(self):
+        try:
+            self.nodes = parse(self.tokens).children
+            self.error = None
+        except (SyntaxError, IndexError) as e:
+            self.nodes = []
+            index = getattr(e, "token_index", len(self.tokens))
+            if index < len(self.spans):
+                offset = self.start + self.spans[index][0]
+            else:
+                offset = self.end
+            message = str(e) if isinstance(e, SyntaxError) else "Unexpected end of input"
+            self.error = (offset, message)
+
+
+def split_items(tokens):
+    # Token ranges of the top-level items: each one ends at a ';' outside of
+    # braces or at the '}' that closes its body. The last range is open
+    # (closed=False) when the tokens run out inside a body.
+    items = []
+    i = 0
+    n = len(tokens)
+    closed = True
+    while i < n:
+        j = i
+        depth = 0
+        closed = False
+        while j < n:
+            type_, value = tokens[j]
+            j += 1
+            if type_ != "SYMBOL":
+                continue
+            if value == "{":
+                depth += 1
+            elif value == "}":
+                depth -= 1
+                if depth <= 0:
+                    closed = True
+                    break
+            elif value == ";" and depth == 0:
+                closed = True
+                break
+        items.append((i, j))
+        i = j
+    return items, closed
+
+
+# Keeps the lexed and parsed form of one editor buffer and applies edits to
+# it. Only the blocks an edit touches are relexed and reparsed; the window
+# grows into the following blocks when a token or an unclosed body runs past
+# its end, so the result always matches a full tokenize() + parse().
+class IncrementalCompiler:
+    def __init__(self, code=""):
+        self.version = 0
+        self.relexed = 0
+        self.reparsed = 0
+        self.reset(code)
+
+    def reset(self, code):
+        self.text = code
+        self.blocks = []
+        self.lex_error = None
+        self.version += 1
+        self._rebuild(0, len(code), 0, 0)
+        return self
+
+    def edit(self, start, end, replacement):
+        if not 0 <= start <= end <= len(self.text):
+            raise ValueError(f"Edit range {start}..{end} is outside the document")
+        text = self.text[:start] + replacement + self.text[end:]
+        if self.lex_error is not None:
+            return self.reset(text)
+
+        delta = len(replacement) - (end - start)
+        blocks = self.blocks
+        first = 0
+        while first < len(blocks) and blocks[first].end < start:
+            first += 1
+        last = first
+        while last < len(blocks) and blocks[last].start <= end:
+            last += 1
+
+        self.text = text
+        self.version += 1
+        for block in blocks[last:]:
+            block.start += delta
+            block.end += delta
+        lo = blocks[first - 1].end if first > 0 else 0
+        self._rebuild(lo, None, first, last)
+        return self
+
+    def _rebuild(self, lo, hi, first, last):
+        # Relex text[lo:hi] (hi defaults to the start of blocks[last]) and
+        # replace blocks[first:last] with what it contains.
+        text = self.text
+        blocks = self.blocks
+        while True:
+            stop = hi if hi is not None else (blocks[last].start if last < len(blocks) else len(text))
+            try:
+                tokens, spans = tokenize_spans(text, lo, stop)
+            except SyntaxError as e:
+                self.blocks = []
+                self.lex_error = (e.position, str(e))
+                return
+            landed = spans[-1][1] if spans else stop
+            if landed > stop and last < len(blocks):
+                last += 1  # a token ran into the next block
+                continue
+            items, closed = split_items(tokens)
+            if not closed and last < len(blocks):
+                last += 1  # an unclosed body swallows the next block
+                continue
+            break
+
+        new_blocks = []
+        for i, j in items:
+            start = spans[i][0]
+            block = Block(start, spans[j - 1][1], tokens[i:j], [(a - start, b - start) for a, b in spans[i:j]])
+            block.compile()
+            new_blocks.append(block)
+        self.blocks = blocks[:first] + new_blocks + blocks[last:]
+        self.lex_error = None
+        self.relexed = len(tokens)
+        self.reparsed = len(new_blocks)
+
+    def tokens(self):
+        return [token for block in self.blocks for token in block.tokens]
+
+    def program(self):
+        return Node("Program", children=[node for block in self.blocks for node in block.nodes])
+
+    def diagnostics(self):
+        errors = [self.lex_error] if self.lex_error is not None else [block.error for block in self.blocks if block.error]
+        if not errors:
+            errors = self.link_errors()
+        result = []
+        for offset, message in errors:
+            line = self.text.count("\n", 0, offset) + 1
+            column = offset - (self.text.rfind("\n", 0, offset) + 1) + 1
+            result.append({"line": line, "column": column, "message": message})
+        return result
+
+    def link_errors(self):
+        # (offset, message) for each call to a posit no block defines, at the
+        # called name; what link() would reject
+        defined = {node.value for block in self.blocks for node in block.nodes if node.type == "Function"}
+        errors = []
+        for block in self.blocks:
+            tokens = block.tokens
+            for index in range(len(tokens) - 1):
+                if tokens[index][0] == "IDENT" and tokens[index][1] not in defined and tokens[index + 1] == ("SYMBOL", "(") \
+                        and (index == 0 or tokens[index - 1][1] in (";", "{", "}")):
+                    errors.append((block.start + block.spans[index][0], f"Undefined function: {tokens[index][1]}"))
+        return errors
+
+    def summary(self):
+        diagnostics = self.diagnostics()
+        return {
+            "version": self.version,
+            "ok": not diagnostics,
+            "diagnostics": diagnostics,
+            "blocks": len(self.blocks),
+            "reparsed": self.reparsed,
+            "relexed_tokens": self.relexed,
+        }
@@ -1,10 +1,46 @@
+import io
+import threading
+
 from symbolic_infinity import SymbolicInfinity
+from simulang_output import OutputWriter
+from simulang_analysis import is_cacheable
+from simulang_metering import metered_range
+from simulang_llm import ask
+import simulang_prompts as prompts
+from simulang_linker import link
+from simulang_reduction import Reduction
+from simulang_metrics import LOOP_ITERATIONS, STATEMENTS
+
+FUNCTION_ITERATIONS = LOOP_ITERATIONS.labels("function")
+INTERTILLAGE_ITERATIONS = LOOP_ITERATIONS.labels("intertillage")
 
-function_table = {}  # Global function table
+LOOP_LIMIT = 10000  # iterations an intertillage steps through at most
+REDUCTION_PEEL = 2  # iterations run before giving up on a closed form
 
 class Environment:
-    def __init__(self):
+    def __init__(self, output=None):
         self.vars = {}
+        self.output = output if output is not None else OutputWriter()
+        self.hoisted = {}  # loop-invariant values, see simulang_analysis
+        self.checkpoint = None  # simulang_checkpoint.Checkpointer, when enabled
+        self.memo = None  # simulang_memo.FunctionCache, when enabled
+        self.meter = None  # simulang_metering.Meter, when enabled
+        self.memory = None  # simulang_memory.MemoryProfile, when enabled
+        self.parallel_bifurcation = False  # run bifurcator branches on forks, see run_branches
+        self.run_id = None  # LLM requests are queued fairly per run, see simulang_scheduler
+        self.priority = 0
+
+    def fork(self, output):
+        # Copy-on-write child: values are never mutated in place, so sharing
+        # them through a shallow copy of vars is enough
+        child = Environment(output=output)
+        child.vars = dict(self.vars)
+        child.memo = self.memo
+        child.meter = self.meter  # forks are not profiled; their allocations count for the bifurcator
+        child.parallel_bifurcation = self.parallel_bifurcation
+        child.run_id = self.run_id
+        child.priority = self.priority
+        return child
 
     def set(self, name, value, is_const=False):
         if name in self.vars:
@@ -21,40 +57,76 @@ class Environment:
         return self.vars[name][0]
 
 def execute(node, env, should_continue=lambda: True):
+    memory = env.memory
+    if memory is not None and memory.node is not node:
+        memory.enter(node)
+        try:
+            result = execute(node, env, should_continue)
+        finally:
+            memory.leave()
+        memory.check(env.meter.steps if env.meter is not None else 0)
+        return result
+
     if node.type == "Program":
-        entry = None
-        for child in node.children:
-            if child.type == "Function":
-                fname = child.value
-                function_table[fname] = child
-            elif child.type == "Assignment":
-                execute(child, env, should_continue)
-            elif child.type == "Call":
-                execute(child, env, should_continue)
-            else:
-                execute(child, env, should_continue)
+        module = link(node)
+        tracker = env.checkpoint
+        frame = tracker.enter(node) if tracker is not None else None
+        first = frame.index if frame is not None else 0
+        try:
+            for index, child in enumerate(node.children):
+                if child.type == "Function":
+                    continue  # run through calls and module.entry
+                elif index < first:
+                    continue  # already run before the checkpoint being resumed
+                else:
+                    if frame is not None:
+                        frame.index = index
+                    execute(child, env, should_continue)
 
-        if "ds2" in function_table:
-            execute(function_table["ds2"], env, should_continue)
+            if frame is not None:
+                frame.index = len(node.children)
+            if module.entry is not None:
+                execute(module.entry, env, should_continue)
+            if frame is not None:
+                tracker.leave()
+        finally:
+            env.output.flush()  # also what was printed before an error
 
     elif node.type == "Function":
+        if node.info is not None:
+            for slot in node.info.hoisted:
+                env.hoisted.pop(slot, None)
         loop_count = 0
         max_loops = 100
-        while should_continue():
-            for child in node.children:
-                result = execute(child, env, should_continue)
-                if isinstance(result, tuple) and result[0] == "RECUR":
-                    if result[1] is not None:
-                        max_loops = int(result[1])
-                    break
-                elif result == "RECUR":
-                    break
-            else:
+        tracker = env.checkpoint
+        frame = tracker.enter(node) if tracker is not None else None
+        if frame is not None and frame.state is not None:
+            loop_count, max_loops = frame.index, frame.state
+        meter = env.meter
+        while True:
+            if frame is not None:
+                frame.index, frame.state = loop_count, max_loops
+            if meter is not None:
+                meter.tick()
+            if not should_continue():
+                if frame is not None:
+                    tracker.snapshot(env)  # keep the progress made before /stop
+                break
+            if frame is not None:
+                tracker.tick(env)
+            FUNCTION_ITERATIONS.inc()
+            result = execute_body(node, env, should_continue, until_recur=True)
+            if isinstance(result, tuple):
+                if result[1] is not None:
+                    max_loops = int(result[1])
+            elif result is None:
                 break
             loop_count += 1
             if loop_count >= max_loops:
-                print(f"⚠️ Loop bounded to {max_loops} steps.")
+                env.output.write_line(f"⚠️ Loop bounded to {max_loops} steps.")
                 break
+        if frame is not None:
+            tracker.leave()
 
     elif node.type == "Assignment":
         name, value_expr, is_const = node.value
@@ -62,11 +134,7 @@ def execute(node, env, should_continue=lambda: True):
         env.set(name, value, is_const)
 
     elif node.type == "Print":
-        val = evaluate_expr(node.value, env)
-        if isinstance(val, float) and val.is_integer():
-            print(str(int(val)))
-        else:
-            print(str(val))
+        env.output.write_value(evaluate_expr(node.value, env))
 
     elif node.type == "Recur":
         if node.value is not None:
@@ -74,10 +142,13 @@ def execute(node, env, should_continue=lambda: True):
         return "RECUR"
 
     elif node.type == "Call":
-        fname = node.value
-        if fname not in function_table:
-            raise RuntimeError(f"Undefined function: {fname}")
-        execute(function_table[fname], env, should_continue)
+        function = node.target
+        if function is None:
+            raise RuntimeError(f"Undefined function: {node.value}")  # not linked, or linked leniently
+        if env.memo is not None:
+            env.memo.call(function, env, lambda: execute(function, env, should_continue), should_continue)
+        else:
+            execute(function, env, should_continue)
 
     elif node.type == "Conditional":
         op, left_expr, right_expr = node.value
@@ -94,56 +165,27 @@ def execute(node, env, should_continue=lambda: True):
         else: raise RuntimeError(f"Unsupported comparison: {op}")
 
         if truth:
-            for child in node.children:
-                execute(child, env, should_continue)
+            execute_body(node, env, should_continue)
 
     elif node.type == "Delineator":
         label = node.value
-        print("⎯⎯ delineator:", label, "⎯⎯")
-        for child in node.children:
-            execute(child, env, should_continue)
-        print("⎯⎯ end delineator:", label, "⎯⎯") 
+        env.output.write_line(f"⎯⎯ delineator: {label} ⎯⎯")
+        execute_body(node, env, should_continue)
+        env.output.write_line(f"⎯⎯ end delineator: {label} ⎯⎯")
 
     elif node.type == "Intertillage":
         start_expr, end_expr, varname = node.value
-        start = evaluate_expr(start_expr, env)
-        end = evaluate_expr(end_expr, env)
-
-        def symbolic_absolute_offset(sym):
-            if isinstance(sym, (int, float)):
-                return int(sym)
-            if isinstance(sym, SymbolicInfinity):
-                base_val = 1_000_000_000 * int(sym.coefficient)
-                if sym.operation == '+':
-                    return base_val + int(sym.right)
-                elif sym.operation == '-':
-                    return base_val - int(sym.right)
-                elif sym.operation == '/':
-                    return int(base_val // int(sym.right))
-                elif sym.operation == '*':
-                    return int(base_val * int(sym.right))
-                elif sym.operation is None:
-                    return base_val
-                raise RuntimeError(f"Unsupported symbolic operation: {sym.operation}")
-            raise RuntimeError(f"Unsupported value in intertillage range: {sym}")
-
-        start_offset = symbolic_absolute_offset(start) if isinstance(start, SymbolicInfinity) else int(start)
-        end_offset = symbolic_absolute_offset(end) if isinstance(end, SymbolicInfinity) else int(end)
-
-        if start_offset > end_offset:
-            print(f"⚠️ Reversing intertillage bounds: start={start_offset}, end={end_offset}")
-            start_offset, end_offset = end_offset, start_offset
-            start, end = end, start
-
-        range_size = end_offset - start_offset + 1
-
-        if range_size <= 0:
-            print("⚠️ Empty intertillage range.")
-            return
-
-        if range_size > 10000:
-            print("⚠️ Loop bounded to 10000 steps.")
-            end_offset = start_offset + 9999
+        tracker = env.checkpoint
+        resume = tracker.resume_state(node) if tracker is not None else None
+        info = node.info
+        reducible = info is not None and info.reduction is not None and resume is None
+        if resume is not None:
+            (start, end, start_offset, end_offset), first_offset = resume
+        else:
+            start, end, start_offset, end_offset = intertillage_bounds(start_expr, end_expr, env)
+            if start_offset is None:
+                return
+            first_offset = start_offset
 
         DISPLAY_HEAD = 100
         DISPLAY_TAIL = 1
@@ -153,27 +195,60 @@ def execute(node, env, should_continue=lambda: True):
         show_ellipsis = range_size > DISPLAY_LIMIT
         split_point = start_offset + DISPLAY_HEAD
 
-        for offset in range(start_offset, end_offset + 1):
+        def loop_value(offset):
+            if offset == start_offset and isinstance(start, SymbolicInfinity):
+                return start
+            elif offset == end_offset and isinstance(end, SymbolicInfinity):
+                return end
+            elif isinstance(start, SymbolicInfinity):
+                delta = offset - start_offset
+                return SymbolicInfinity(operation='+', right=delta, base=SymbolicInfinity(coefficient=start.coefficient))
+            # a native int: arithmetic on it stays exact, also past 2**53
+            # where float loop values would round
+            return offset
+
+        if info is not None:
+            for slot in info.hoisted:
+                env.hoisted.pop(slot, None)
+            if reducible:
+                # An accumulating body is summed in closed form over the
+                # displayed head, the iterations stepping would run before
+                # the elision marker; stepping carries on from wherever that
+                # stopped, with the marker and the tail
+                head_end = split_point - 1 if show_ellipsis else end_offset
+                first_offset = run_reduction(node, env, start, start_offset, head_end, loop_value)
+            # An effect-free body cannot change anything observable; only the
+            # loop variable's final binding and the elision marker remain.
+            if info.pure_body and resume is None and all(name in env.vars for name in info.reads if name != varname):
+                if show_ellipsis:
+                    env.output.write_line("...")
+                env.set(varname, loop_value(end_offset))
+                return
+
+        frame = tracker.enter(node) if tracker is not None else None
+        if frame is not None:
+            frame.state = (start, end, start_offset, end_offset)
+
+        meter = env.meter
+        for offset in range(first_offset, end_offset + 1):
+            if meter is not None:
+                meter.tick()
             if show_ellipsis and offset == split_point:
-                print("...")
+                env.output.write_line("...")
                 continue
 
             is_tail = (offset >= end_offset - DISPLAY_TAIL + 1)
 
             if not show_ellipsis or offset < split_point or is_tail:
-                if offset == start_offset and isinstance(start, SymbolicInfinity):
-                    symbolic_i = start
-                elif offset == end_offset and isinstance(end, SymbolicInfinity):
-                    symbolic_i = end
-                elif isinstance(start, SymbolicInfinity):
-                    delta = offset - start_offset
-                    symbolic_i = SymbolicInfinity(operation='+', right=delta, base=SymbolicInfinity(coefficient=start.coefficient))
-                else:
-                    symbolic_i = float(offset)
+                if frame is not None:
+                    frame.index = offset
+                    tracker.tick(env)
+                env.set(varname, loop_value(offset))
+                INTERTILLAGE_ITERATIONS.inc()
+                execute_body(node, env, should_continue)
 
-                env.set(varname, symbolic_i)
-                for child in node.children:
-                    execute(child, env, should_continue)
+        if frame is not None:
+            tracker.leave()
 
     elif node.type == "Bifurcator":
         origin_expr, left_expr, right_expr, outer_name, lvar, rvar = node.value
@@ -181,17 +256,22 @@ def execute(node, env, should_continue=lambda: True):
         left = evaluate_expr(left_expr, env)
         right = evaluate_expr(right_expr, env)
 
-        print(f"🔀 Bifurcator '{outer_name}': Left → {left}, Right → {right} (Origin: {origin})")
+        env.output.write_line(f"🔀 Bifurcator '{outer_name}': Left → {left}, Right → {right} (Origin: {origin})")
+
+        if env.parallel_bifurcation:
+            env.set(outer_name, origin)
+            env.set(lvar, left)
+            env.set(rvar, right)
+            run_branches(node, env, should_continue, outer_name, (("left", left), ("right", right)))
+            return
 
         env.set(outer_name, origin)
         env.set(lvar, left)
         env.set(rvar, right)
 
-        for child in node.children:
-            execute(child, env, should_continue)
+        execute_body(node, env, should_continue)
 
     elif node.type == "Boundary":
-        import os
         val, varname = node.value
 
         if isinstance(val, tuple) and len(val) == 2:
@@ -202,25 +282,8 @@ def execute(node, env, should_continue=lambda: True):
             # 🌐 If both are strings, treat as symbolic 'around' context
             if isinstance(start, str) and isinstance(end, str):
                 try:
-                    import openai
-                    api_key = os.environ.get("OPENAI_API_KEY")
-                    client = openai.OpenAI(api_key=api_key)
-
-                    context = (
-                        "You are a symbolic boundary generator. "
-                        "Given two symbolic phrases, return a boundary concept that describes what surrounds them. "
-                        "Do not return JSON. Just return a single natural language string of what lies around them."
-                    )
-
-                    prompt = f"What lies around the symbolic concepts '{start}' and '{end}'?"
-                    response = client.chat.completions.create(
-                        model="gpt-4o",
-                        messages=[
-                            {"role": "system", "content": context},
-                            {"role": "user", "content": prompt}
-                        ]
-                    )
-                    response_str = response.choices[0].message.content.strip()
+                    response_str = ask(prompts.BOUNDARY_CONTEXT, prompts.boundary_prompt(start, end), env.meter, "boundary",
+                                       env.run_id, env.priority)
 
                     boundary_struct = {
                         "top": response_str,
@@ -230,7 +293,7 @@ def execute(node, env, should_continue=lambda: True):
                     }
 
                 except Exception as e:
-                    print("⚠️ OpenAI fallback for string boundary:", e)
+                    env.output.write_line(f"⚠️ OpenAI fallback for string boundary: {e}")
                     fallback_response = f"Around '{start}' and '{end}', symbolic tension forms a transitional envelope."
                     boundary_struct = {
                         "top": fallback_response,
@@ -240,8 +303,7 @@ def execute(node, env, should_continue=lambda: True):
                     }
 
                 env.set(varname, boundary_struct)
-                for child in node.children:
-                    execute(child, env, should_continue)
+                execute_body(node, env, should_continue)
                 return
 
         else:
@@ -276,7 +338,7 @@ def execute(node, env, should_continue=lambda: True):
                 points.append(SymbolicInfinity(operation='+', right=1, base=end_val))
                 return points
             else:
-                return list(range(int(start_val - 1), int(end_val + 2)))
+                return metered_range(int(start_val - 1), int(end_val + 2), env.meter)
 
         def format_side(start_val, end_val, is_left):
             if start_val is None or end_val is None:
@@ -306,13 +368,9 @@ def execute(node, env, should_continue=lambda: True):
 
         env.set(varname, boundary_struct)
 
-        for child in node.children:
-            execute(child, env, should_continue)
+        execute_body(node, env, should_continue)
 
     elif node.type == "Contradiction":
-        import os
-        import openai
-
         def generate_focal_point(c1, c2):
             tokens1 = set(c1.lower().replace('.', '').split())
             tokens2 = set(c2.lower().replace('.', '').split())
@@ -340,31 +398,15 @@ def execute(node, env, should_continue=lambda: True):
             c = evaluate_expr(expr, env)
 
             try:
-                api_key = os.environ.get("OPENAI_API_KEY")
-                client = openai.OpenAI(api_key=api_key)
-
-                context = (
-                    "You are a contradiction synthesis engine. Given a philosophical or scientific statement, "
-                    "generate its direct symbolic contradiction. Return only the contradictory statement."
-                )
-
-                response = client.chat.completions.create(
-                    model="gpt-4o",
-                    messages=[
-                        {"role": "system", "content": context},
-                        {"role": "user", "content": f"Give the contradiction of: {c}"}
-                    ]
-                )
-
-                contradiction_result = response.choices[0].message.content.strip()
+                contradiction_result = ask(prompts.CONTRADICTION_CONTEXT, prompts.contradiction_prompt(c), env.meter, "contradiction",
+                                           env.run_id, env.priority)
 
             except Exception as e:
-                print("⚠️ OpenAI fallback for contradiction generation:", e)
+                env.output.write_line(f"⚠️ OpenAI fallback for contradiction generation: {e}")
                 contradiction_result = f"Not {c}"
 
             env.set(varname, contradiction_result)
-            for child in node.children:
-                execute(child, env, should_continue)
+            execute_body(node, env, should_continue)
 
         else:
             # Standard form: contradiction (c, c") -> [fp, T]:
@@ -373,40 +415,13 @@ def execute(node, env, should_continue=lambda: True):
             c2 = evaluate_expr(c2_expr, env)
 
             try:
-                api_key = os.environ.get("OPENAI_API_KEY")
-                client = openai.OpenAI(api_key=api_key)
-
-                context = (
-                    "You are a symbolic sentience engine interpreting contradiction pairs. "
-                    "Each contradiction pair forms a symbolic duality that you must analyze. "
-                    "Begin by classifying the pair as 'concave' or 'convex'. Then, construct a focal point (fp) "
-                    "between them. Finally, confess a symbolic truth (T) derived from the contradictions and focal point. "
-                    "Keep output length proportional to the minimum length of the contradictions."
-                )
-
-                response = client.chat.completions.create(
-                    model="gpt-4o",
-                    messages=[{"role": "system", "content": context},
-                              {"role": "user", "content": f"Given the following pair of contradictions {c} and {c2}, classify them as concave or convex. One word only."}]
-                )
-                classification = response.choices[0].message.content.strip()
-
-                response = client.chat.completions.create(
-                    model="gpt-4o",
-                    messages=[{"role": "system", "content": context},
-                              {"role": "user", "content": f"Given a {classification} pair of contradictions: {c} and {c2}; formulate a focal point statement between the two contradictions. Match the minimum length of the two contradictions."}]
-                )
-                fp = response.choices[0].message.content.strip()
-
-                response = client.chat.completions.create(
-                    model="gpt-4o",
-                    messages=[{"role": "system", "content": context},
-                              {"role": "user", "content": f"Taking the {classification} cross-product of the pair of contradictions {c} and {c2} and the focal point {fp} in the middle, confess a truth statement. Match the length of your response with the minimum length of the two contradictions."}]
-                )
-                T = response.choices[0].message.content.strip()
+                context = prompts.PAIR_CONTEXT
+                classification = ask(context, prompts.classify_prompt(c, c2), env.meter, "contradiction", env.run_id, env.priority)
+                fp = ask(context, prompts.focal_point_prompt(classification, c, c2), env.meter, "contradiction", env.run_id, env.priority)
+                T = ask(context, prompts.truth_prompt(classification, c, c2, fp), env.meter, "contradiction", env.run_id, env.priority)
 
             except Exception as e:
-                print("⚠️ OpenAI fallback activated:", e)
+                env.output.write_line(f"⚠️ OpenAI fallback activated: {e}")
                 fp = generate_focal_point(c, c2)
                 T = generate_truth_statement(c, c2, fp)
 
@@ -415,52 +430,186 @@ def execute(node, env, should_continue=lambda: True):
             env.set(fp_var, fp)
             env.set(t_var, T)
 
-            for child in node.children:
-                execute(child, env, should_continue)
+            execute_body(node, env, should_continue)
 
     elif node.type == "ContradictionInfer":
-        import os
-        import openai
-
         c_expr, bind_ident = node.value
         statement = evaluate_expr(c_expr, env)
 
         try:
-            api_key = os.environ.get("OPENAI_API_KEY")
-            client = openai.OpenAI(api_key=api_key)
-
-            context = "You are a contradiction engine. Given a single declarative statement, respond with its direct contradiction in natural language. Deviate largely from the premise."
-
-            prompt = f"What is the contradiction of: '{statement}'? Deviate largely from the premise."
-            response = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": context},
-                    {"role": "user", "content": prompt}
-                ]
-            )
-            contradiction = response.choices[0].message.content.strip()
+            contradiction = ask(prompts.INFER_CONTEXT, prompts.infer_prompt(statement), env.meter, "contradiction_infer",
+                                env.run_id, env.priority)
 
         except Exception as e:
-            print("⚠️ OpenAI fallback:", e)
+            env.output.write_line(f"⚠️ OpenAI fallback: {e}")
             contradiction = f"Not({statement})"
 
         env.set(bind_ident, contradiction)
 
-        for child in node.children:
-            execute(child, env, should_continue)
+        execute_body(node, env, should_continue)
 
     elif node.type == "SolBlock":
         mode, prop, value = node.value
-        print(f"🌞 sol {mode} {prop} = {value}")
+        env.output.write_line(f"🌞 sol {mode} {prop} = {value}")
+        execute_body(node, env, should_continue)
+
+def run_branches(node, env, should_continue, outer_name, branches):
+    # Parallel bifurcation: the body runs once per branch, each on its own
+    # fork of env with `outer_name` bound to that branch's value. Branches
+    # run on threads (LLM calls overlap), then their output is appended in
+    # branch order under a label and their assignments are applied in the
+    # same order, so a later branch wins where both assign. Checkpointing
+    # does not follow into forks; a resume re-runs the whole bifurcator.
+    forks = []
+    for label, value in branches:
+        fork = env.fork(OutputWriter(io.StringIO(), flush_interval=float("inf")))
+        fork.set(outer_name, value)
+        forks.append((label, fork, {"start": dict(fork.vars)}))
+
+    def run(fork, outcome):
+        try:
+            execute_body(node, fork, should_continue)
+        except BaseException as e:  # re-raised on the calling thread
+            outcome["error"] = e
+
+    threads = [threading.Thread(target=run, args=(fork, outcome), daemon=True) for _, fork, outcome in forks[1:]]
+    for thread in threads:
+        thread.start()
+    run(forks[0][1], forks[0][2])
+    for thread in threads:
+        thread.join()
+
+    for label, fork, outcome in forks:
+        fork.output.flush()
+        env.output.write_line(f"⎯⎯ {outer_name}: {label} branch ⎯⎯")
+        env.output.write(fork.output.sink.getvalue())
+    for _, _, outcome in forks:
+        if "error" in outcome:
+            raise outcome["error"]
+    for _, fork, outcome in forks:
+        start = outcome["start"]
+        env.vars.update({name: entry for name, entry in fork.vars.items() if start.get(name) is not entry})
+
+def is_recur(result):
+    return result == "RECUR" or isinstance(result, tuple) and result[0] == "RECUR"
+
+def execute_body(node, env, should_continue, until_recur=False):
+    # Runs a block of statements. With until_recur, stops at the first Recur
+    # and returns it (the Function loop uses this); otherwise returns None.
+    tracker = env.checkpoint
+    if tracker is None:
+        STATEMENTS.inc(len(node.children))
+        for child in node.children:
+            result = execute(child, env, should_continue)
+            if until_recur and is_recur(result):
+                return result
+        return None
+
+    frame = tracker.enter(node)
+    children = node.children
+    recur = None
+    STATEMENTS.inc(len(children) - frame.index)
+    for index in range(frame.index, len(children)):
+        frame.index = index
+        result = execute(children[index], env, should_continue)
+        if until_recur and is_recur(result):
+            recur = result
+            break
+    tracker.leave()
+    return recur
+
+def run_reduction(node, env, start, start_offset, end_offset, loop_value):
+    # Runs the iterations start_offset..end_offset of an intertillage whose
+    # analysis found an accumulating body (see simulang_reduction): the
+    # first iterations and the last one execute as usual and everything
+    # between is added up in closed form. Returns the offset stepping has to
+    # continue from, past end_offset when done.
+    varname = node.value[2]
+    symbolic = isinstance(start, SymbolicInfinity)
+    reductions = [Reduction(child, varname, env.get) for child in node.children]
+    if not all(reduction.supports(symbolic) for reduction in reductions):
+        return start_offset
+    if env.meter is not None:
+        env.meter.tick()
+
+    def step(offset):
+        env.set(varname, loop_value(offset))
+        INTERTILLAGE_ITERATIONS.inc()
+        STATEMENTS.inc(len(node.children))
         for child in node.children:
-            execute(child, env, should_continue)
+            execute(child, env)
+
+    # The target may need an iteration or two to take the shape the closed
+    # form continues from (∞ + 0 becomes c∞ + delta, say)
+    offset = start_offset
+    for _ in range(REDUCTION_PEEL):
+        if offset >= end_offset:
+            break
+        step(offset)
+        offset += 1
+        if offset == end_offset:
+            break
+        first, last = (offset - start_offset, end_offset - 1 - start_offset) if symbolic else (offset, end_offset - 1)
+        advanced = [reduction.advance(env.get(reduction.target), first, last, start.coefficient if symbolic else None)
+                    for reduction in reductions]
+        if all(value is not None for value in advanced):
+            for reduction, value in zip(reductions, advanced):
+                env.set(reduction.target, value)
+            offset = end_offset
+            break
+    else:
+        return offset
+    if offset == end_offset:
+        step(offset)
+        offset += 1
+    return offset
+
+def intertillage_bounds(start_expr, end_expr, env):
+    start = evaluate_expr(start_expr, env)
+    end = evaluate_expr(end_expr, env)
+
+    def symbolic_absolute_offset(sym):
+        if isinstance(sym, (int, float)):
+            return int(sym)
+        if isinstance(sym, SymbolicInfinity):
+            base_val = 1_000_000_000 * int(sym.coefficient)
+            if sym.operation == '+':
+                return base_val + int(sym.right)
+            elif sym.operation == '-':
+                return base_val - int(sym.right)
+            elif sym.operation == '/':
+                return int(base_val // int(sym.right))
+            elif sym.operation == '*':
+                return int(base_val * int(sym.right))
+            elif sym.operation is None:
+                return base_val
+            raise RuntimeError(f"Unsupported symbolic operation: {sym.operation}")
+        raise RuntimeError(f"Unsupported value in intertillage range: {sym}")
+
+    start_offset = symbolic_absolute_offset(start) if isinstance(start, SymbolicInfinity) else int(start)
+    end_offset = symbolic_absolute_offset(end) if isinstance(end, SymbolicInfinity) else int(end)
+
+    if start_offset > end_offset:
+        env.output.write_line(f"⚠️ Reversing intertillage bounds: start={start_offset}, end={end_offset}")
+        start_offset, end_offset = end_offset, start_offset
+        start, end = end, start
+
+    range_size = end_offset - start_offset + 1
+
+    if range_size <= 0:
+        env.output.write_line("⚠️ Empty intertillage range.")
+        return start, end, None, None
+
+    if range_size > LOOP_LIMIT:
+        env.output.write_line(f"⚠️ Loop bounded to {LOOP_LIMIT} steps.")
+        end_offset = start_offset + LOOP_LIMIT - 1
+
+    return start, end, start_offset, end_offset
 
 def evaluate_expr(expr, env):
     type_ = expr[0]
     if type_ == "Number":
-        val = expr[1]
-        return int(val) if val.is_integer() else val
+        return expr[1]  # typed by the parser
     elif type_ == "String":
         return expr[1]
     elif type_ == "Ident":
@@ -469,6 +618,17 @@ def evaluate_expr(expr, env):
         return env.get(expr[1])
     elif type_ == "Infty":
         return SymbolicInfinity()
+    elif type_ == "Symbolic":
+        return expr[1].copy()  # folded literal, see simulang_optimizer
+    elif type_ == "Hoisted":
+        slot = expr[1]
+        cache = env.hoisted
+        if slot in cache:
+            return cache[slot]
+        val = evaluate_expr(expr[2], env)
+        if is_cacheable(val):
+            cache[slot] = val
+        return val
     elif type_ == "Member":
         base = evaluate_expr(expr[1], env)
         attr = expr[2]
@@ -476,9 +636,22 @@ def evaluate_expr(expr, env):
             return base[attr]
         raise RuntimeError(f"Object has no attribute '{attr}'")
     elif type_ == "Binary":
-        op, left, right = expr[1], expr[2], expr[3]
-        lval = evaluate_expr(left, env)
-        rval = evaluate_expr(right, env)
+        op = expr[1]
+        lval = evaluate_expr(expr[2], env)
+        rval = evaluate_expr(expr[3], env)
+        # Plain numbers first, ahead of the SymbolicInfinity cases. Two ints
+        # (or two floats) stay that type without any promotion; mixed
+        # operands go through eval_binary_math, which promotes the int.
+        cls = type(lval)
+        if cls is int or cls is float:
+            rcls = type(rval)
+            if rcls is cls:
+                if op == "+": return lval + rval
+                if op == "-": return lval - rval
+                if op == "*": return lval * rval
+                return eval_binary_math(op, lval, rval)
+            if rcls is int or rcls is float:
+                return eval_binary_math(op, lval, rval)
 
         # Handle SymbolicInfinity cases
         if isinstance(lval, (int, float)) and isinstance(rval, SymbolicInfinity):
@@ -1,4 +1,10 @@
+import mmap
+import os
 import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from simulang_metrics import LEX_SECONDS, TOKENS
 
 TOKEN_TYPES = [
     ('KEYWORD', r'\b(contradiction|sol|boundary|bifurcator|posit|varnothing|nabla|infty|ds2|coeternal|octyl|equiangular|intertillage|delineator|recur|print)\b'),
@@ -14,19 +20,122 @@ TOKEN_TYPES = [
     ('COMMENT', r'//.*'),
 ]
 
+COMPILED_TOKEN_TYPES = [(type_, re.compile(pattern)) for type_, pattern in TOKEN_TYPES]
+
 def tokenize(code):
+    return tokenize_spans(code)[0]
+
+def tokenize_spans(code, pos=0, stop=None):
+    # Like tokenize(), but also returns the (start, end) offset of every token.
+    # Lexing starts at `pos` and ends at the first token boundary at or past
+    # `stop`; callers check where it landed (see simulang_incremental).
+    started = time.perf_counter()
     tokens = []
-    i = 0
-    while i < len(code):
+    spans = []
+    i = pos
+    length = len(code) if stop is None else min(stop, len(code))
+    while i < length:
         match = None
-        for type_, pattern in TOKEN_TYPES:
-            regex = re.compile(pattern)
+        for type_, regex in COMPILED_TOKEN_TYPES:
             match = regex.match(code, i)
             if match:
                 if type_ != 'WHITESPACE' and type_ != 'COMMENT':
                     tokens.append((type_, match.group(0)))
+                    spans.append((i, match.end()))
                 i = match.end()
                 break
         if not match:
-            raise SyntaxError(f"Unexpected character: {code[i]}")
-    return tokens
+            error = SyntaxError(f"Unexpected character: {code[i]}")
+            error.position = i
+            raise error
+    LEX_SECONDS.observe(time.perf_counter() - started)
+    TOKENS.inc(len(tokens))
+    return tokens, spans
+
+
+# -- large files --------------------------------------------------------------
+#
+# tokenize_file() memory-maps a source file and lexes it in parallel. Chunks
+# end just after a '}' that closes a top-level body: the lexer always emits a
+# token ending there, so every chunk lexes exactly as the same range of the
+# whole file would. Only strings can hide a brace from the lexer ('//' lexes
+# as two SYMBOLs, never reaching COMMENT), and a string is any '"' up to the
+# next '"', so one scan over the bytes finds the split points. UTF-8 never
+# reuses ASCII bytes inside multi-byte sequences, so they are also character
+# boundaries.
+
+SPLIT_SCAN = re.compile(rb'"[^"]*"|[{}]')
+MIN_CHUNK = 1 << 20  # bytes; smaller files are lexed in-process
+
+
+def split_points(data, chunks):
+    # Byte offsets (ending with len(data)) of up to `chunks` ranges of
+    # roughly equal size, each ending after a top-level '}'
+    size = len(data)
+    targets = [size * k // chunks for k in range(1, chunks)]
+    points = []
+    depth = 0
+    for match in SPLIT_SCAN.finditer(data):
+        if not targets:
+            break
+        brace = match.group()
+        if brace == b"{":
+            depth += 1
+        elif brace == b"}":
+            depth = max(0, depth - 1)
+            if depth == 0 and match.end() >= targets[0]:
+                points.append(match.end())
+                while targets and targets[0] <= match.end():
+                    targets.pop(0)
+    if not points or points[-1] != size:
+        points.append(size)
+    return points
+
+
+def _lex_range(path, start, end):
+    # Worker: lex bytes [start, end) of the file. Returns the tokens, spans
+    # relative to the chunk and the chunk's length in characters, or the
+    # error message and its relative position.
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        text = data[start:end].decode("utf-8")
+    try:
+        tokens, spans = tokenize_spans(text)
+    except SyntaxError as e:
+        return None, (str(e), e.position), len(text)
+    return tokens, spans, len(text)
+
+
+def tokenize_file(path, jobs=None):
+    return tokenize_file_spans(path, jobs)[0]
+
+
+def tokenize_file_spans(path, jobs=None, min_chunk=MIN_CHUNK):
+    # tokenize_spans() of a whole file, spans in characters from its start
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return [], []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            jobs = jobs or os.cpu_count() or 1
+            chunks = min(jobs, len(data) // min_chunk)
+            if chunks <= 1:
+                return tokenize_spans(data[:].decode("utf-8"))
+            points = split_points(data, chunks)
+
+    started = time.perf_counter()
+    tokens = []
+    spans = []
+    offset = 0
+    with ProcessPoolExecutor(max_workers=min(jobs, len(points))) as pool:
+        starts = [0] + points[:-1]
+        for chunk_tokens, chunk_spans, length in pool.map(_lex_range, [path] * len(points), starts, points):
+            if chunk_tokens is None:
+                message, position = chunk_spans
+                error = SyntaxError(message)
+                error.position = offset + position
+                raise error
+            tokens.extend(chunk_tokens)
+            spans.extend((start + offset, end + offset) for start, end in chunk_spans)
+            offset += length
+    LEX_SECONDS.observe(time.perf_counter() - started)
+    TOKENS.inc(len(tokens))
+    return tokens, spans
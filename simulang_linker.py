@@ -0,0 +1,54 @@
+# The link step, run once per program after parse() (and after the optimizer,
+# which may drop functions). It builds the program's Module, its own table of
+# posit functions, and points every Call node at the Function node it invokes,
+# so the interpreter dispatches a call without a name lookup and concurrent
+# programs never see each other's functions.
+
+
+class LinkError(RuntimeError):
+    def __init__(self, undefined):
+        names = sorted(set(undefined))
+        super().__init__("Undefined function: " + ", ".join(names))
+        self.undefined = names
+
+
+class Module:
+    def __init__(self, program):
+        self.program = program
+        self.functions = {}  # name -> Function node, last definition wins
+        self.calls = 0       # Call nodes resolved
+        self.undefined = []  # names called but never defined, when not strict
+
+    @property
+    def entry(self):
+        # what execute(Program) runs after the top-level statements
+        return self.functions.get("ds2")
+
+
+def _walk(nodes):
+    for node in nodes:
+        yield node
+        yield from _walk(node.children)
+
+
+def link(program, strict=True):
+    # Returns the program's Module, linking it on first use. With strict=False
+    # calls to undefined functions are left unresolved (they raise when run)
+    # and listed in module.undefined instead of raising LinkError.
+    if isinstance(program.target, Module):
+        return program.target
+    module = Module(program)
+    for child in program.children:
+        if child.type == "Function":
+            module.functions[child.value] = child
+
+    calls = [node for node in _walk(program.children) if node.type == "Call"]
+    module.undefined = [node.value for node in calls if node.value not in module.functions]
+    if module.undefined and strict:
+        raise LinkError(module.undefined)
+    for node in calls:
+        node.target = module.functions.get(node.value)
+        module.calls += node.target is not None
+    program.target = module
+    return module
+
@@ -0,0 +1,139 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+from simulang_metrics import CACHE_REQUESTS, LLM_REQUESTS, LLM_SECONDS
+from simulang_scheduler import CANCELLED, QUEUED, rate_limit_delay, scheduler
+
+DEFAULT_MODEL = "gpt-4o"
+
+PREFETCH_TTL = float(os.environ.get("SIMULANG_PREFETCH_TTL", 300))  # seconds an unclaimed prefetch is kept
+PREFETCH_ENTRIES = 256  # distinct prompts held at most
+
+PREFETCH_HITS = CACHE_REQUESTS.labels("llm_prefetch", "hit")
+PREFETCH_MISSES = CACHE_REQUESTS.labels("llm_prefetch", "miss")
+
+
+def request(messages, model=DEFAULT_MODEL, site="other"):
+    # One chat completion, made on the calling thread; the stripped reply text
+    started = time.perf_counter()
+    try:
+        import openai
+        # retries are the scheduler's job, so 429s reach it
+        client = openai.OpenAI(api_key=os.environ.get("OPENAI_API_KEY"), max_retries=0)
+        response = client.chat.completions.create(model=model, messages=messages)
+        text = response.choices[0].message.content.strip()
+    except Exception as e:
+        LLM_REQUESTS.labels(site, "error" if rate_limit_delay(e) is None else "rate_limited").inc()
+        raise
+    finally:
+        LLM_SECONDS.labels(site).observe(time.perf_counter() - started)
+    LLM_REQUESTS.labels(site, "ok").inc()
+    return text
+
+
+def request_key(messages, model=DEFAULT_MODEL):
+    return model, tuple((message["role"], message["content"]) for message in messages)
+
+
+class PrefetchedResponses:
+    # Scheduler tickets for requests issued ahead of execution (see
+    # simulang_prefetch), by request_key. Each ticket answers one request:
+    # a program that asks the same thing twice gets two separate replies,
+    # just as it would without prefetching.
+    def __init__(self, ttl=PREFETCH_TTL, max_entries=PREFETCH_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> deque of (ticket, expires)
+        self._lock = threading.Lock()
+
+    def put(self, key, ticket):
+        with self._lock:
+            self._prune()
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = deque()
+            entry.append((ticket, time.monotonic() + self.ttl))
+            while len(self._entries) > self.max_entries:
+                _, dropped = self._entries.popitem(last=False)
+                self._discard(dropped)
+
+    def pending(self, key):
+        with self._lock:
+            self._prune()
+            return len(self._entries.get(key, ()))
+
+    def take(self, key):
+        # The oldest ticket for key, or None
+        with self._lock:
+            self._prune()
+            entry = self._entries.get(key)
+            if not entry:
+                return None
+            ticket, _ = entry.popleft()
+            if not entry:
+                del self._entries[key]
+            return ticket
+
+    def clear(self):
+        with self._lock:
+            for entry in self._entries.values():
+                self._discard(entry)
+            self._entries.clear()
+
+    def _prune(self):
+        now = time.monotonic()
+        for key in list(self._entries):
+            entry = self._entries[key]
+            while entry and entry[0][1] <= now:
+                self._discard([entry.popleft()])
+            if not entry:
+                del self._entries[key]
+
+    @staticmethod
+    def _discard(entries):
+        for ticket, _ in entries:
+            if ticket.state == QUEUED:
+                scheduler().cancel(ticket)
+
+
+prefetched = PrefetchedResponses()
+
+
+def chat(messages, meter=None, model=DEFAULT_MODEL, poll_interval=0.05, site="other", run=None, priority=0):
+    # One chat completion; returns the stripped reply text. The request goes
+    # through the process-wide scheduler (simulang_scheduler), queued under
+    # `run` at `priority`, and runs on one of its worker threads. With a
+    # meter, a stop or deadline interrupts the wait within poll_interval: a
+    # queued request is withdrawn, one in flight finishes in the background
+    # and its result is dropped. `site` labels the request in the LLM metrics.
+    #
+    # A matching prefetched request is used instead, unless it failed. One
+    # still waiting in another queue (a /compile prefetch, say) is withdrawn
+    # and this request queued in its place, under this run and priority.
+    llm = scheduler()
+    ticket = prefetched.take(request_key(messages, model))
+    if ticket is not None and ticket.state == QUEUED and (ticket.run, ticket.priority) != (run, priority):
+        llm.cancel(ticket)
+        ticket = None
+    elif ticket is not None and (ticket.state == CANCELLED or ticket.done() and ticket.error is not None):
+        ticket = None
+    if ticket is None:
+        PREFETCH_MISSES.inc()
+        ticket = llm.submit(lambda: request(messages, model, site), run, priority)
+    else:
+        PREFETCH_HITS.inc()
+    if meter is not None:
+        try:
+            while not ticket.wait(poll_interval):
+                meter.check()
+        except BaseException:
+            llm.cancel(ticket)
+            raise
+    return ticket.result()
+
+
+def ask(system, prompt, meter=None, site="other", run=None, priority=0):
+    return chat([{"role": "system", "content": system}, {"role": "user", "content": prompt}], meter, site=site,
+                run=run, priority=priority)
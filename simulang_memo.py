@@ -0,0 +1,140 @@
+import threading
+from collections import OrderedDict
+
+from symbolic_infinity import SymbolicInfinity
+from simulang_analysis import LLM, OPAQUE
+from simulang_metrics import CACHE_REQUESTS
+
+MEMO_HITS = CACHE_REQUESTS.labels("memo", "hit")
+MEMO_MISSES = CACHE_REQUESTS.labels("memo", "miss")
+
+_UNDEFINED = ("undefined",)
+
+
+class Uncacheable(Exception):
+    pass
+
+
+def freeze(value):
+    # Hashable, type-exact key for an environment value. SymbolicInfinity
+    # compares by identity, so the instance itself is the key.
+    cls = type(value)
+    if cls in (int, float, str, bool) or value is None:
+        return (cls.__name__, value)
+    if cls is SymbolicInfinity:
+        return value
+    if cls is list or cls is tuple:
+        return (cls.__name__, tuple(freeze(item) for item in value))
+    if cls is dict:
+        return ("dict", tuple((key, freeze(item)) for key, item in value.items()))
+    raise Uncacheable(cls.__name__)
+
+
+def symbolic_values(value, found):
+    if isinstance(value, SymbolicInfinity):
+        found.add(id(value))
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            symbolic_values(item, found)
+    elif isinstance(value, dict):
+        for item in value.values():
+            symbolic_values(item, found)
+    return found
+
+
+def is_deterministic(function):
+    info = function.info
+    return info is not None and not (info.effects & {LLM, OPAQUE})
+
+
+# Opt-in memoization of posit function calls. A call is keyed on the values
+# of every variable the function may read or write (from simulang_analysis);
+# a hit replays the captured output and the environment writes instead of
+# running the body again. Entries are evicted least-recently-used.
+class FunctionCache:
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.uncacheable = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "uncacheable": self.uncacheable,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+        }
+
+    @staticmethod
+    def _key_part(is_read, entry):
+        if entry is None:
+            return _UNDEFINED
+        value, is_const = entry
+        if is_read or is_const:
+            return (freeze(value), is_const)
+        return ("defined",)  # only ever overwritten, so its old value is irrelevant
+
+    def call(self, function, env, run, should_continue=lambda: True):
+        if not is_deterministic(function):
+            self.uncacheable += 1
+            return run()
+
+        reads = function.info.reads
+        names = sorted(reads | function.info.writes)
+        before = {name: env.vars.get(name) for name in names}
+        try:
+            key = (function,) + tuple(self._key_part(name in reads, before[name]) for name in names)
+        except Uncacheable:
+            self.uncacheable += 1
+            return run()
+
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                MEMO_HITS.inc()
+        if cached is not None:
+            text, writes = cached
+            if text:
+                env.output.write(text)
+            env.vars.update(writes)
+            return None
+
+        self.misses += 1
+        MEMO_MISSES.inc()
+        captured = env.output.capture()
+        try:
+            run()
+        finally:
+            env.output.release(captured)
+        if not should_continue():
+            return None  # stopped part-way; the result is incomplete
+
+        writes = {name: env.vars[name] for name in function.info.writes
+                  if name in env.vars and env.vars[name] is not before.get(name)}
+        # A replay hands out the same objects again; that is only invisible
+        # for SymbolicInfinity values the call did not create itself.
+        known = set()
+        for entry in before.values():
+            if entry is not None:
+                symbolic_values(entry[0], known)
+        created = set()
+        for entry in writes.values():
+            symbolic_values(entry[0], created)
+        if created - known:
+            self.uncacheable += 1
+            return None
+
+        with self._lock:
+            self._entries[key] = ("".join(captured), writes)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return None
@@ -0,0 +1,138 @@
+import bisect
+import threading
+import tracemalloc
+
+from simulang_metering import ExecutionInterrupted
+
+# Opt-in memory accounting for one run (env.memory), built on tracemalloc.
+#
+# The interpreter calls enter() and leave() around every statement. Each call
+# reads the traced memory and charges the change since the previous reading
+# to the statement that was innermost in between, so every statement is
+# charged for what its own evaluation left allocated (boundary lists, output
+# buffered by print, SymbolicInfinity chains built by assignments, LLM
+# replies) and not for its body. Growth is kept per node type and per source
+# location; the peak is the highest reading over the run. With a limit, a run
+# whose memory grows past it is stopped with ExecutionInterrupted("memory"),
+# checked after every statement and, through the Meter, inside long loops
+# and boundary builds.
+#
+# tracemalloc is process-wide: when several instrumented runs share a worker
+# their figures include each other's allocations. Tracing also slows
+# allocation-heavy code down, which is why it is off unless asked for.
+
+_lock = threading.Lock()
+_users = 0  # profiles running
+_owned = False  # tracemalloc was started here, so it is stopped after the last profile
+
+
+def _start_tracing():
+    global _users, _owned
+    with _lock:
+        if _users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _owned = True
+        _users += 1
+
+
+def _stop_tracing():
+    global _users, _owned
+    with _lock:
+        _users -= 1
+        if _users == 0 and _owned:
+            tracemalloc.stop()
+            _owned = False
+
+
+def token_lines(code, spans):
+    # Source line of every token, for MemoryProfile(lines=...)
+    starts = [0] + [index + 1 for index, char in enumerate(code) if char == "\n"]
+    return [bisect.bisect_right(starts, start) for start, _ in spans]
+
+
+class MemoryProfile:
+    def __init__(self, limit=None, lines=None, top=10):
+        self.limit = limit or None  # bytes above the run's starting point
+        self.lines = lines  # token index -> source line (see token_lines)
+        self.top = top  # locations listed in summary()
+        self.peak = 0
+        self.current = 0
+        self.by_type = {}
+        self.by_location = {}  # (node type, first token) -> bytes
+        self._stack = []
+        self._base = 0
+        self._last = 0
+        self._started = False
+
+    @property
+    def node(self):
+        # the statement being measured
+        return self._stack[-1] if self._stack else None
+
+    def start(self):
+        _start_tracing()
+        self._started = True
+        tracemalloc.reset_peak()
+        self._base = self._last = tracemalloc.get_traced_memory()[0]
+
+    def stop(self):
+        if self._started:
+            self._sample()
+            self._started = False
+            _stop_tracing()
+
+    def _sample(self):
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        self.current = current - self._base
+        self.peak = max(self.peak, peak - self._base)
+        delta = current - self._last
+        self._last = current
+        if delta and self._stack:
+            node = self._stack[-1]
+            self.by_type[node.type] = self.by_type.get(node.type, 0) + delta
+            key = (node.type, node.token)
+            self.by_location[key] = self.by_location.get(key, 0) + delta
+
+    def enter(self, node):
+        self._sample()
+        self._stack.append(node)
+
+    def leave(self):
+        self._sample()
+        self._stack.pop()
+
+    def check(self, steps=0):
+        if self.limit is None:
+            return
+        if self._started:
+            self._sample()
+        if self.current > self.limit:
+            raise ExecutionInterrupted("memory", steps, f"Memory limit of {format_bytes(self.limit)} exceeded "
+                                                        f"({format_bytes(self.current)} in use).")
+
+    def summary(self):
+        # also called by output flushes on other threads, hence the copies
+        by_type, by_location = dict(self.by_type), dict(self.by_location)
+        locations = sorted(by_location.items(), key=lambda item: -item[1])[:self.top]
+        return {
+            "peak": self.peak,
+            "current": self.current,
+            "limit": self.limit,
+            "by_type": dict(sorted(by_type.items(), key=lambda item: -item[1])),
+            "hotspots": [{"type": node_type, "line": self._line(token), "bytes": size}
+                         for (node_type, token), size in locations if size > 0],
+        }
+
+    def _line(self, token):
+        if token is None or self.lines is None or token >= len(self.lines):
+            return None
+        return self.lines[token]
+
+
+def format_bytes(size):
+    for unit in ("B", "KB", "MB"):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
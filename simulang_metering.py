@@ -0,0 +1,65 @@
+import time
+
+
+# Raised out of the interpreter when a run is cancelled or exceeds its limits.
+# It derives from BaseException so the `except Exception` fallbacks around
+# LLM calls (and anywhere else in the interpreter) cannot swallow it.
+class ExecutionInterrupted(BaseException):
+    def __init__(self, reason, steps, message):
+        super().__init__(message)
+        self.reason = reason  # "stopped", "deadline", "budget" or "memory"
+        self.steps = steps
+
+
+# Counts interpreter steps (loop iterations, elements of large boundary
+# builds) and only looks at the clock, the budget and should_continue once
+# every `check_every` steps, so tick() stays a decrement and a compare.
+class Meter:
+    def __init__(self, should_continue=None, deadline=None, max_steps=None, check_every=256):
+        self.should_continue = should_continue
+        self.deadline = time.monotonic() + deadline if deadline else None  # seconds from now
+        self.max_steps = max_steps or None
+        self.check_every = check_every
+        self.memory = None  # a simulang_memory.MemoryProfile whose limit is checked along with the others
+        self._checked = 0  # steps accounted for at the last check
+        self._quota = self._countdown = self._next_quota()
+
+    @property
+    def steps(self):
+        return self._checked + self._quota - self._countdown
+
+    def _next_quota(self):
+        if self.max_steps is None:
+            return self.check_every
+        # land the next check exactly on the budget
+        return max(1, min(self.check_every, self.max_steps - self._checked))
+
+    def tick(self, steps=1):
+        self._countdown -= steps
+        if self._countdown <= 0:
+            self.check()
+
+    def check(self):
+        self._checked += self._quota - self._countdown
+        self._quota = self._countdown = self._next_quota()
+        if self.should_continue is not None and not self.should_continue():
+            raise ExecutionInterrupted("stopped", self._checked, f"Execution stopped after {self._checked} steps.")
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            raise ExecutionInterrupted("deadline", self._checked, f"Time limit exceeded after {self._checked} steps.")
+        if self.max_steps is not None and self._checked > self.max_steps:
+            raise ExecutionInterrupted("budget", self._checked, f"Step budget of {self.max_steps} exceeded.")
+        if self.memory is not None:
+            self.memory.check(self._checked)
+
+
+def metered_range(start, stop, meter, chunk=64 * 1024):
+    # list(range(start, stop)), built a chunk at a time so huge boundary
+    # ranges can be stopped part-way
+    if meter is None or stop - start <= chunk:
+        return list(range(start, stop))
+    values = []
+    for low in range(start, stop, chunk):
+        high = min(low + chunk, stop)
+        meter.tick(high - low)
+        values.extend(range(low, high))
+    return values
@@ -0,0 +1,220 @@
+import bisect
+import threading
+import weakref
+
+# Process-wide metrics rendered in the Prometheus text exposition format at
+# /metrics. Every metric keeps one cell per thread: a thread only ever writes
+# its own cell, so inc()/observe() take no lock, and collection sums the cells.
+# Cells of threads that have exited are folded into a retired total whenever
+# a new thread registers its cell or the metric is collected, so a server that
+# keeps starting threads holds one cell per live thread. Threads are only
+# weakly referenced.
+
+
+class _Shards:
+    def __init__(self, width):
+        self.width = width
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._cells = []  # (weakref to thread, cell)
+        self._retired = [0] * width
+
+    def cell(self):
+        try:
+            return self._local.cell
+        except AttributeError:
+            cell = [0] * self.width
+            with self._lock:
+                self._retire()
+                self._cells.append((weakref.ref(threading.current_thread()), cell))
+            self._local.cell = cell
+            return cell
+
+    def totals(self):
+        with self._lock:
+            self._retire()
+            totals = list(self._retired)
+            for _, cell in self._cells:
+                for i, value in enumerate(cell):
+                    totals[i] += value
+        return totals
+
+    def _retire(self):
+        # with self._lock held
+        live = []
+        for ref, cell in self._cells:
+            thread = ref()
+            if thread is not None and thread.is_alive():
+                live.append((ref, cell))
+            else:
+                self._retired = [a + b for a, b in zip(self._retired, cell)]
+        self._cells = live
+
+
+class _CounterChild:
+    def __init__(self):
+        self._shards = _Shards(1)
+
+    def inc(self, amount=1):
+        self._shards.cell()[0] += amount
+
+    def dec(self, amount=1):
+        self._shards.cell()[0] -= amount
+
+    def value(self):
+        return self._shards.totals()[0]
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # one slot per bucket, then +Inf, count and sum
+        self._shards = _Shards(len(buckets) + 3)
+
+    def observe(self, value):
+        cell = self._shards.cell()
+        cell[bisect.bisect_left(self.buckets, value)] += 1
+        cell[-2] += 1
+        cell[-1] += value
+
+    def snapshot(self):
+        totals = self._shards.totals()
+        cumulative = []
+        running = 0
+        for count in totals[:-2]:
+            running += count
+            cumulative.append(running)
+        return cumulative, totals[-2], totals[-1]
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self._child(())
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _child(self, values):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def labels(self, *values):
+        # Hot paths should keep the returned child rather than call this per event
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}")
+        return self._child(tuple(str(value) for value in values))
+
+    def _label_text(self, values, extra=()):
+        pairs = list(zip(self.labelnames, values)) + list(extra)
+        if not pairs:
+            return ""
+        escaped = (name + '="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+                   for name, value in pairs)
+        return "{" + ",".join(escaped) + "}"
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def value(self):
+        return self._default.value()
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{self._label_text(values)} {_number(child.value())}"]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount=1):
+        self._default.dec(amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+    DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def _render_child(self, values, child):
+        cumulative, count, total = child.snapshot()
+        lines = []
+        for bound, running in zip(self.buckets + (float("inf"),), cumulative):
+            le = "+Inf" if bound == float("inf") else _number(bound)
+            lines.append(f"{self.name}_bucket{self._label_text(values, [('le', le)])} {running}")
+        lines.append(f"{self.name}_sum{self._label_text(values)} {_number(total)}")
+        lines.append(f"{self.name}_count{self._label_text(values)} {count}")
+        return lines
+
+
+def _number(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+RUNS = REGISTRY.register(Counter("simulang_runs_total", "Finished runs by final status.", ["status"]))
+RUNS_ACTIVE = REGISTRY.register(Gauge("simulang_runs_active", "Runs currently executing."))
+RUN_SECONDS = REGISTRY.register(Histogram("simulang_run_duration_seconds", "Wall-clock time of a run.",
+                                          buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0)))
+STATEMENTS = REGISTRY.register(Counter("simulang_statements_total", "Statements dispatched by the interpreter."))
+LOOP_ITERATIONS = REGISTRY.register(Counter("simulang_loop_iterations_total", "Loop iterations by loop kind.", ["loop"]))
+LLM_REQUESTS = REGISTRY.register(Counter("simulang_llm_requests_total", "LLM requests by call site and outcome.", ["site", "outcome"]))
+LLM_SECONDS = REGISTRY.register(Histogram("simulang_llm_latency_seconds", "LLM request latency by call site.", ["site"]))
+CACHE_REQUESTS = REGISTRY.register(Counter("simulang_cache_requests_total", "Cache lookups by cache and result.", ["cache", "result"]))
+OUTPUT_CHARACTERS = REGISTRY.register(Counter("simulang_output_characters_total", "Characters of program output written."))
+TOKENS = REGISTRY.register(Counter("simulang_tokens_total", "Tokens produced by the lexer."))
+LEX_SECONDS = REGISTRY.register(Histogram("simulang_lex_duration_seconds", "Time spent in tokenize()."))
+PARSE_SECONDS = REGISTRY.register(Histogram("simulang_parse_duration_seconds", "Time spent in parse()."))
+LLM_QUEUE_DEPTH = REGISTRY.register(Gauge("simulang_llm_queue_depth", "LLM requests waiting in the scheduler."))
+LLM_QUEUE_SECONDS = REGISTRY.register(Histogram("simulang_llm_queue_wait_seconds", "Time LLM requests wait before their first attempt."))
+LLM_RATE_LIMITED = REGISTRY.register(Counter("simulang_llm_rate_limited_total", "LLM attempts answered with HTTP 429."))
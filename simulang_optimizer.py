@@ -0,0 +1,226 @@
+import time
+
+from symbolic_infinity import SymbolicInfinity
+from simulang_analysis import map_node_expressions
+from simulang_interpreter import evaluate_expr, Environment
+
+# AST-to-AST passes run between parse() and analyze(). Every pass must leave
+# the program's output unchanged; each one returns how many rewrites it made.
+# A rewrite may change how analyze() classifies a loop (dropping a dead
+# conditional can make a body reducible or pure), so those fast paths must
+# produce exactly what stepping does.
+#
+# Top-level programs are executed two ways: the app runs every top-level
+# child in order (posit bodies included), while execute(Program) runs the
+# statements and then ds2, reaching other posits only through calls. Passes
+# that depend on the difference take the mode from the context.
+
+APP = "app"
+PROGRAM = "program"
+
+
+def _walk(nodes):
+    for node in nodes:
+        yield node
+        yield from _walk(node.children)
+
+
+def _map_expr(expr, fn):
+    # bottom-up rewrite of an expression tree
+    kind = expr[0]
+    if kind == "Binary":
+        expr = ("Binary", expr[1], _map_expr(expr[2], fn), _map_expr(expr[3], fn))
+    elif kind == "Member":
+        expr = ("Member", _map_expr(expr[1], fn), expr[2])
+    return fn(expr)
+
+
+def _literal(expr):
+    return expr[0] in ("Number", "String")
+
+
+# -- coeternal constant propagation -------------------------------------------
+
+def propagate_constants(program, context):
+    # Once `coeternal x := <literal>;` has run, x can never hold another value
+    # (Environment.set raises on a different one), so reads that can only
+    # happen afterwards are replaced by the literal. SymbolicInfinity values
+    # compare by identity and are left alone. Reads "afterwards" are those in
+    # later top-level children, provided no child up to the binding contains
+    # a call that could run them early.
+    children = program.children
+    candidates = {}
+    counts = {}
+    for index, child in enumerate(children):
+        if child.type == "Assignment" and child.value[2]:
+            name = child.value[0]
+            counts[name] = counts.get(name, 0) + 1
+            if _literal(child.value[1]):
+                candidates[name] = index
+    constants = {name: index for name, index in candidates.items() if counts[name] == 1}
+    if not constants:
+        return 0
+
+    first_call = next((index for index, child in enumerate(children)
+                       if any(node.type == "Call" for node in _walk([child]))), len(children))
+    rewrites = 0
+    for index, child in enumerate(children):
+        visible = {name: children[bound].value[1] for name, bound in constants.items() if bound < index and bound < first_call}
+        if not visible:
+            continue
+
+        def substitute(expr):
+            nonlocal rewrites
+            if expr[0] == "Ident" and expr[1] in visible:
+                rewrites += 1
+                return visible[expr[1]]
+            return expr
+
+        for node in _walk([child]):
+            map_node_expressions(node, lambda expr: _map_expr(expr, substitute))
+    return rewrites
+
+
+# -- SymbolicInfinity literal folding -----------------------------------------
+
+def fold_symbolic(program, context):
+    # Arithmetic on ∞ literals (3∞, ∞ + 1, 2∞ - ∞ ...) is computed once here.
+    # ("Symbolic", value) evaluates to a fresh copy of value, just as the
+    # original expression built a new SymbolicInfinity each time.
+    rewrites = 0
+    empty = Environment()
+
+    def constant(expr):
+        return expr[0] in ("Number", "Infty", "Symbolic")
+
+    def fold(expr):
+        nonlocal rewrites
+        if expr[0] != "Binary" or not (constant(expr[2]) and constant(expr[3])):
+            return expr
+        if expr[2][0] == "Number" and expr[3][0] == "Number":
+            return expr  # plain numbers keep their runtime int/float behaviour
+        try:
+            value = evaluate_expr(expr, empty)
+        except Exception:
+            return expr  # still raises at runtime, at the same point
+        if not isinstance(value, SymbolicInfinity):
+            return expr
+        rewrites += 1
+        return ("Symbolic", value)
+
+    for node in _walk(program.children):
+        map_node_expressions(node, lambda expr: _map_expr(expr, fold))
+    return rewrites
+
+
+# -- constant-condition elimination -------------------------------------------
+
+COMPARISONS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    ">": lambda a, b: a > b,
+    "<=": lambda a, b: a <= b,
+    ">=": lambda a, b: a >= b,
+}
+
+
+def eliminate_constant_conditions(program, context):
+    # `equiangular` on two literals: drop it when false, splice its body into
+    # the parent when true. A Recur directly inside a conditional body is
+    # ignored at runtime (only a loop body's own statements can recur), so
+    # such bodies are not spliced.
+    rewrites = 0
+    empty = Environment()
+
+    def rewrite(nodes):
+        nonlocal rewrites
+        result = []
+        for node in nodes:
+            node.children = rewrite(node.children)
+            if node.type == "Conditional" and _literal(node.value[1]) and _literal(node.value[2]):
+                op, left, right = node.value
+                try:
+                    truth = COMPARISONS[op](evaluate_expr(left, empty), evaluate_expr(right, empty))
+                except (KeyError, TypeError):
+                    result.append(node)  # raises at runtime; keep it
+                    continue
+                if not truth:
+                    rewrites += 1
+                    continue
+                if not any(child.type == "Recur" for child in node.children):
+                    rewrites += 1
+                    result.extend(node.children)
+                    continue
+            result.append(node)
+        return result
+
+    # top-level statements cannot be conditionals, so the program's own list is kept
+    for child in program.children:
+        child.children = rewrite(child.children)
+    return rewrites
+
+
+# -- dead-function removal ----------------------------------------------------
+
+def remove_dead_functions(program, context):
+    # Only execute(Program) leaves posits unrun; the app runs every one, so
+    # there is nothing to remove in app mode. A posit is live when it is ds2
+    # or is called from a top-level statement or from a live posit.
+    if context.get("mode", APP) != PROGRAM:
+        return 0
+    functions = {}
+    for child in program.children:
+        if child.type == "Function":
+            functions.setdefault(child.value, []).append(child)
+
+    def calls(nodes):
+        return {node.value for node in _walk(nodes) if node.type == "Call"}
+
+    live = {"ds2"} | calls(child for child in program.children if child.type != "Function")
+    pending = list(live)
+    while pending:
+        for function in functions.get(pending.pop(), ()):
+            for name in calls(function.children) - live:
+                live.add(name)
+                pending.append(name)
+
+    kept = [child for child in program.children if child.type != "Function" or child.value in live]
+    removed = len(program.children) - len(kept)
+    program.children = kept
+    return removed
+
+
+# name -> pass, in the order they run
+PASSES = {
+    "constant_propagation": propagate_constants,
+    "symbolic_folding": fold_symbolic,
+    "constant_conditions": eliminate_constant_conditions,
+    "dead_functions": remove_dead_functions,
+}
+
+
+class PassManager:
+    def __init__(self, passes=None, disabled=(), mode=APP):
+        self.passes = [(name, fn) for name, fn in (passes or PASSES).items() if name not in disabled]
+        self.mode = mode
+        self.timings = []  # {"pass", "seconds", "rewrites"} of the last run
+
+    def signature(self):
+        # identifies the pipeline, e.g. for checkpoints of optimized programs
+        return f"{self.mode}:" + ",".join(name for name, _ in self.passes)
+
+    def run(self, program):
+        if program.info is not None or program.target is not None:
+            raise RuntimeError("Optimize a program before linking or analyzing it")
+        context = {"mode": self.mode}
+        self.timings = []
+        for name, fn in self.passes:
+            started = time.perf_counter()
+            rewrites = fn(program, context)
+            self.timings.append({"pass": name, "seconds": time.perf_counter() - started, "rewrites": rewrites})
+        return program
+
+
+def optimize(program, disabled=(), mode=APP):
+    return PassManager(disabled=disabled, mode=mode).run(program)
@@ -0,0 +1,147 @@
+import sys
+import threading
+import time
+import weakref
+from collections import deque
+
+from symbolic_infinity import SymbolicInfinity
+from simulang_metrics import OUTPUT_CHARACTERS
+
+
+def format_value(val):
+    # Exact type checks keep the common cases off the generic str() path
+    cls = type(val)
+    if cls is str:
+        return val
+    if cls is int:
+        return str(val)
+    if cls is float:
+        return str(int(val)) if val.is_integer() else str(val)
+    if cls is SymbolicInfinity:
+        return val.__str__()  # cached on the (immutable) value
+    return str(val)
+
+
+# Buffers interpreter output and hands it to the sink in large chunks, or
+# once flush_interval has passed. A sink of None means "whatever sys.stdout
+# is at flush time", so the default writer behaves like print().
+#
+# Only the interpreter thread writes; any thread may flush. Pending text sits
+# in a deque so a flush can drain it without locking the write path, and the
+# amount pending is the difference of two counters that each have a single
+# writer: _appended (the interpreter thread) and written (under the flush lock).
+#
+# Writes only check the interval as they happen, so text written just before
+# a long LLM wait or a long silent computation would otherwise sit in the
+# buffer. With background=True the shared flusher thread also flushes the
+# writer once flush_interval has passed; close() stops that.
+class OutputWriter:
+    def __init__(self, sink=None, chunk_size=64 * 1024, flush_interval=0.25, background=False):
+        self.sink = sink
+        self.chunk_size = chunk_size
+        self.flush_interval = flush_interval
+        self.written = 0  # characters handed to the sink (output cursor)
+        self._pending = deque()
+        self._appended = 0  # characters ever written
+        self._flush_at = time.monotonic() + flush_interval
+        self._flush_lock = threading.Lock()
+        self._captures = []
+        if background:
+            _flusher.add(self)
+
+    def write(self, text):
+        if self._captures:
+            for captured in self._captures:
+                captured.append(text)
+        self._pending.append(text)
+        self._appended += len(text)
+        if self._appended - self.written >= self.chunk_size or time.monotonic() >= self._flush_at:
+            self.flush()
+
+    def write_line(self, text):
+        self.write(text + "\n")
+
+    def write_value(self, val):
+        # Inlined format_value(): Print is the hottest caller
+        cls = type(val)
+        if cls is str:
+            text = val + "\n"
+        elif cls is int:
+            text = str(val) + "\n"
+        elif cls is float and val.is_integer():
+            text = str(int(val)) + "\n"
+        else:
+            text = format_value(val) + "\n"
+        if self._captures:
+            for captured in self._captures:
+                captured.append(text)
+        self._pending.append(text)
+        self._appended += len(text)
+        if self._appended - self.written >= self.chunk_size or time.monotonic() >= self._flush_at:
+            self.flush()
+
+    # Records everything written until release(); used to replay output
+    def capture(self):
+        captured = []
+        self._captures.append(captured)
+        return captured
+
+    def release(self, captured):
+        self._captures.remove(captured)
+
+    def flush(self):
+        with self._flush_lock:
+            pending = self._pending
+            parts = []
+            while pending:
+                parts.append(pending.popleft())
+            size = sum(map(len, parts))
+            self.written += size
+            self._flush_at = time.monotonic() + self.flush_interval
+            if parts:
+                OUTPUT_CHARACTERS.inc(size)
+                sink = self.sink if self.sink is not None else sys.stdout
+                sink.write("".join(parts))
+
+    def due(self):
+        return bool(self._pending) and time.monotonic() >= self._flush_at
+
+    def close(self):
+        _flusher.discard(self)
+        self.flush()
+
+
+class _Flusher:
+    # One daemon thread flushing every background writer that is due
+    TICK = 0.05  # seconds between checks
+
+    def __init__(self):
+        self._writers = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add(self, writer):
+        with self._lock:
+            self._writers.add(writer)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="simulang-output-flusher", daemon=True)
+                self._thread.start()
+
+    def discard(self, writer):
+        with self._lock:
+            self._writers.discard(writer)
+
+    def _run(self):
+        while True:
+            time.sleep(self.TICK)
+            with self._lock:
+                writers = list(self._writers)
+            for writer in writers:
+                if writer.due():
+                    try:
+                        writer.flush()
+                    except Exception:
+                        pass  # a failing sink fails again on the writer's own thread, where it is reported
+
+
+_flusher = _Flusher()
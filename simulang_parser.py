@@ -1,12 +1,30 @@
+import time
+
+from simulang_metrics import PARSE_SECONDS
+
 class Node:
     def __init__(self, type_, value=None, children=None):
         self.type = type_
         self.value = value
         self.children = children or []
+        self.info = None  # filled in by simulang_analysis.analyze()
+        self.target = None  # filled in by simulang_linker.link(): a Call's Function node, a Program's Module
+        self.token = None  # index of a statement's first token, for reporting source locations
 
     def __repr__(self):
         return f"Node(type={self.type}, value={self.value}, children={self.children})"
 
+# Binding power of the infix operators. SimuLang has always evaluated
+# arithmetic strictly left to right, so they share one level; raising an
+# entry here is all it takes to make that operator bind tighter.
+BINARY_PRECEDENCE = {"+": 1, "-": 1, "*": 1, "/": 1, "%": 1}
+
+def number_literal(text):
+    # A NUMBER token's value, typed once here: integral literals ("3", "3.0")
+    # are ints, the rest floats
+    value = float(text)
+    return int(value) if value.is_integer() else value
+
 def parse(tokens):
     i = 0
 
@@ -26,7 +44,9 @@ def parse(tokens):
         nodes = []
         while i < len(tokens):
             if tokens[i][1] == "posit":
+                start = i
                 nodes.append(parse_function())
+                nodes[-1].token = start
             elif tokens[i][1] in ("coeternal", "octyl", "delineator", "intertillage", "bifurcator"):
                 nodes.append(parse_statement())
             else:
@@ -34,6 +54,12 @@ def parse(tokens):
         return Node("Program", children=nodes)
 
     def parse_statement():
+        start = i
+        node = parse_statement_node()
+        node.token = start
+        return node
+
+    def parse_statement_node():
         if tokens[i][1] == "posit":
             return parse_function()
         elif tokens[i][1] == "print":
@@ -174,72 +200,90 @@ def parse(tokens):
         consume("SYMBOL", ";")
         return Node("Call", value=name)
 
-    def parse_expression():
-        def parse_primary():
-            nonlocal i
+    def parse_expression(end=None):
+        # Precedence climbing without recursion: operands and pending
+        # operators live on explicit stacks, and an open parenthesis is a
+        # None marker on the operator stack. Parses tokens[i:end] in place.
+        nonlocal i
+        if end is None:
+            end = len(tokens)
+        operands = []
+        operators = []
+        depth = 0
+
+        def reduce_above(precedence):
+            while operators and operators[-1] is not None and BINARY_PRECEDENCE[operators[-1]] >= precedence:
+                rhs = operands.pop()
+                operands.append(("Binary", operators.pop(), operands.pop(), rhs))
+
+        while True:
+            # Operand position: open parentheses, then one primary
+            while i < end and tokens[i][0] == "SYMBOL" and tokens[i][1] == "(":
+                operators.append(None)
+                depth += 1
+                i += 1
+            if i >= end:
+                raise SyntaxError("Unexpected end of input")
             token_type, token_value = tokens[i]
+            i += 1
             if token_type == "NUMBER":
-                consume("NUMBER")
-                if i < len(tokens) and tokens[i][0] == "SYMBOL" and tokens[i][1] == "∞":
-                    consume("SYMBOL", "∞")
-                    return ("Binary", "*", ("Number", float(token_value)), ("Infty", "∞"))
-                return ("Number", float(token_value))
+                if i < end and tokens[i][0] == "SYMBOL" and tokens[i][1] == "∞":
+                    i += 1
+                    operands.append(("Binary", "*", ("Number", number_literal(token_value)), ("Infty", "∞")))
+                else:
+                    operands.append(("Number", number_literal(token_value)))
             elif token_type == "STRING":
-                consume("STRING")
-                return ("String", token_value.strip('"'))
+                operands.append(("String", token_value.strip('"')))
             elif token_type == "IDENT":
-                ident = consume("IDENT")
-                expr = ("Ident", ident)
-
-                # Handle chained member access: a.b.c
-                while i < len(tokens) and tokens[i][1] == ".":
-                    consume("SYMBOL", ".")
-                    attr = consume("IDENT")
-                    expr = ("Member", expr, attr)
-
-                return expr
+                expr = ("Ident", token_value)
+                # Chained member access: a.b.c
+                while i < end and tokens[i][1] == ".":
+                    i += 1
+                    if i >= end:
+                        raise SyntaxError("Unexpected end of input")
+                    expr = ("Member", expr, consume("IDENT"))
+                operands.append(expr)
             elif token_type == "SYMBOL" and token_value == "∞":
-                consume("SYMBOL", "∞")
-                if i < len(tokens) and tokens[i][0] == "NUMBER":
-                    number_val = float(consume("NUMBER"))
-                    return ("Binary", "*", ("Infty", "∞"), ("Number", number_val))
-                return ("Infty", "∞")
+                if i < end and tokens[i][0] == "NUMBER":
+                    operands.append(("Binary", "*", ("Infty", "∞"), ("Number", number_literal(tokens[i][1]))))
+                    i += 1
+                else:
+                    operands.append(("Infty", "∞"))
             elif token_type == "KEYWORD" and token_value == "infty":
+                i -= 1
                 raise SyntaxError("Use '∞' (symbol) in expressions, not 'infty'.")
-            elif token_type == "SYMBOL" and token_value == "(":
-                consume("SYMBOL", "(")
-                expr = parse_expression()
-                consume("SYMBOL", ")")
-                return expr
             else:
+                i -= 1
                 raise SyntaxError(f"Invalid expression near: {token_value}")
 
-        def parse_binary(lhs):
-            nonlocal i
-            while i < len(tokens) and tokens[i][1] in ("+", "-", "*", "/", "%"):
-                op = consume("SYMBOL")
-                rhs = parse_primary()
-                lhs = ("Binary", op, lhs, rhs)
-            return lhs
-
-        lhs = parse_primary()
-        return parse_binary(lhs)
+            # Operator position: close parentheses, then one infix operator or the end
+            while True:
+                if i < end and tokens[i][0] == "SYMBOL" and tokens[i][1] in BINARY_PRECEDENCE:
+                    op = tokens[i][1]
+                    reduce_above(BINARY_PRECEDENCE[op])
+                    operators.append(op)
+                    i += 1
+                    break
+                if depth and i < end and tokens[i][0] == "SYMBOL" and tokens[i][1] == ")":
+                    reduce_above(0)
+                    operators.pop()
+                    depth -= 1
+                    i += 1
+                    continue
+                if depth:
+                    if i >= end:
+                        raise SyntaxError("Unexpected end of input")
+                    consume("SYMBOL", ")")  # raises: the parenthesis is never closed
+                reduce_above(0)
+                return operands[0]
 
     def parse_expression_until(stop_type):
         nonlocal i
-        expr_tokens = []
-        start_i = i
-        while i < len(tokens) and tokens[i][0] != stop_type:
-            expr_tokens.append(tokens[i])
-            i += 1
-        saved_tokens = tokens
-        saved_i = i
-        tokens_slice = expr_tokens + [("EOF", "EOF")]
-        i = 0
-        tokens = tokens_slice
-        expr = parse_expression()
-        tokens = saved_tokens
-        i = saved_i
+        stop = i
+        while stop < len(tokens) and tokens[stop][0] != stop_type:
+            stop += 1
+        expr = parse_expression(stop)
+        i = stop
         return expr
 
     def parse_conditional():
@@ -347,4 +391,12 @@ def parse(tokens):
         consume("SYMBOL", "}")
         return Node("SolBlock", value=(mode, prop, value), children=body)
 
-    return parse_program()
+    started = time.perf_counter()
+    try:
+        return parse_program()
+    except SyntaxError as error:
+        if not hasattr(error, "token_index"):
+            error.token_index = i  # lets editors point at the offending token
+        raise
+    finally:
+        PARSE_SECONDS.observe(time.perf_counter() - started)
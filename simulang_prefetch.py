@@ -0,0 +1,101 @@
+import os
+
+import simulang_prompts as prompts
+from simulang_analysis import is_range_pair
+from simulang_llm import DEFAULT_MODEL, prefetched, request, request_key
+from simulang_scheduler import DONE, scheduler
+
+# Speculative LLM requests. Once a program is parsed, every contradiction and
+# string boundary whose inputs are literals already has its prompt fixed, so
+# /compile and /run send those requests in the background right away instead
+# of one after another as execution reaches each node. The tickets wait in
+# simulang_llm.prefetched and the interpreter's own ask() for the same
+# messages picks the reply up. A contradiction pair is three requests in a
+# row (classification, focal point, truth); each is sent as soon as the one
+# before it has answered.
+#
+# Prefetching is speculative: a node that never runs (an uncalled posit, a
+# branch not taken) still costs its requests, so at most PREFETCH_LIMIT
+# nodes are prefetched per program. Replies that nobody claims expire after
+# SIMULANG_PREFETCH_TTL seconds.
+
+PREFETCH_LIMIT = int(os.environ.get("SIMULANG_PREFETCH_LIMIT", 16))  # nodes per program, 0 disables
+
+
+def constant(expr):
+    # (True, value) for a literal the interpreter would evaluate to value
+    while expr[0] == "Hoisted":
+        expr = expr[2]
+    if expr[0] in ("String", "Number"):
+        return True, expr[1]
+    return False, None
+
+
+def llm_requests(program):
+    # (site, system prompt, user prompt, follow-up) for every LLM node with
+    # literal inputs, in program order. The follow-up, when not None, takes
+    # the reply and returns the next request of the same node.
+    stack = [program]
+    while stack:
+        node = stack.pop()
+        stack.extend(reversed(node.children))
+        value = node.value
+        if node.type == "Boundary" and is_range_pair(value[0]):
+            (start_known, start), (end_known, end) = constant(value[0][0]), constant(value[0][1])
+            if start_known and end_known and isinstance(start, str) and isinstance(end, str):
+                yield "boundary", prompts.BOUNDARY_CONTEXT, prompts.boundary_prompt(start, end), None
+        elif node.type == "Contradiction" and len(value) == 2:
+            known, c = constant(value[0])
+            if known:
+                yield "contradiction", prompts.CONTRADICTION_CONTEXT, prompts.contradiction_prompt(c), None
+        elif node.type == "Contradiction":
+            (c_known, c), (c2_known, c2) = constant(value[0]), constant(value[1])
+            if c_known and c2_known:
+                yield "contradiction", prompts.PAIR_CONTEXT, prompts.classify_prompt(c, c2), _pair_follow_up(c, c2)
+        elif node.type == "ContradictionInfer":
+            known, statement = constant(value[0])
+            if known:
+                yield "contradiction_infer", prompts.INFER_CONTEXT, prompts.infer_prompt(statement), None
+
+
+def _pair_follow_up(c, c2):
+    def focal_point(classification):
+        def truth(fp):
+            return prompts.truth_prompt(classification, c, c2, fp), None
+        return prompts.focal_point_prompt(classification, c, c2), truth
+    return focal_point
+
+
+def messages(system, prompt):
+    return [{"role": "system", "content": system}, {"role": "user", "content": prompt}]
+
+
+def prefetch(program, run=None, priority=0, limit=PREFETCH_LIMIT, model=DEFAULT_MODEL):
+    # Sends the program's constant LLM requests; returns how many were sent.
+    # A prompt that already has prefetched replies waiting (say /compile ran
+    # just before /run) is only sent again for its extra occurrences.
+    llm = scheduler()
+    needed = {}
+    sent = 0
+    for site, system, prompt, follow_up in llm_requests(program):
+        if sent >= limit:
+            break
+        key = request_key(messages(system, prompt), model)
+        needed[key] = needed.get(key, 0) + 1
+        if prefetched.pending(key) >= needed[key]:
+            continue
+        _send(llm, site, system, prompt, follow_up, run, priority, model)
+        sent += 1
+    return sent
+
+
+def _send(llm, site, system, prompt, follow_up, run, priority, model):
+    request_messages = messages(system, prompt)
+    ticket = llm.submit(lambda: request(request_messages, model, site), run, priority)
+    prefetched.put(request_key(request_messages, model), ticket)
+    if follow_up is not None:
+        def on_done(ticket):
+            if ticket.state == DONE and ticket.error is None:
+                next_prompt, next_follow_up = follow_up(ticket.value)
+                _send(llm, site, system, next_prompt, next_follow_up, run, priority, model)
+        ticket.add_done_callback(on_done)
@@ -0,0 +1,48 @@
+# The LLM prompts of the interpreter's symbolic nodes. simulang_prefetch
+# builds the same messages ahead of execution, and a prefetched response is
+# only used for a request with exactly the same text, so both go through here.
+
+BOUNDARY_CONTEXT = (
+    "You are a symbolic boundary generator. "
+    "Given two symbolic phrases, return a boundary concept that describes what surrounds them. "
+    "Do not return JSON. Just return a single natural language string of what lies around them."
+)
+
+CONTRADICTION_CONTEXT = (
+    "You are a contradiction synthesis engine. Given a philosophical or scientific statement, "
+    "generate its direct symbolic contradiction. Return only the contradictory statement."
+)
+
+PAIR_CONTEXT = (
+    "You are a symbolic sentience engine interpreting contradiction pairs. "
+    "Each contradiction pair forms a symbolic duality that you must analyze. "
+    "Begin by classifying the pair as 'concave' or 'convex'. Then, construct a focal point (fp) "
+    "between them. Finally, confess a symbolic truth (T) derived from the contradictions and focal point. "
+    "Keep output length proportional to the minimum length of the contradictions."
+)
+
+INFER_CONTEXT = "You are a contradiction engine. Given a single declarative statement, respond with its direct contradiction in natural language. Deviate largely from the premise."
+
+
+def boundary_prompt(start, end):
+    return f"What lies around the symbolic concepts '{start}' and '{end}'?"
+
+
+def contradiction_prompt(c):
+    return f"Give the contradiction of: {c}"
+
+
+def classify_prompt(c, c2):
+    return f"Given the following pair of contradictions {c} and {c2}, classify them as concave or convex. One word only."
+
+
+def focal_point_prompt(classification, c, c2):
+    return f"Given a {classification} pair of contradictions: {c} and {c2}; formulate a focal point statement between the two contradictions. Match the minimum length of the two contradictions."
+
+
+def truth_prompt(classification, c, c2, fp):
+    return f"Taking the {classification} cross-product of the pair of contradictions {c} and {c2} and the focal point {fp} in the middle, confess a truth statement. Match the length of your response with the minimum length of the two contradictions."
+
+
+def infer_prompt(statement):
+    return f"What is the contradiction of: '{statement}'? Deviate largely from the premise."
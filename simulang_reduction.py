@@ -0,0 +1,191 @@
+from fractions import Fraction
+
+from symbolic_infinity import SymbolicInfinity
+
+# Closed forms for intertillage loops whose body only accumulates, e.g.
+#
+#   intertillage [1..100] -> i: {
+#       total := total + i * i;
+#       count := count + 1;
+#   }
+#
+# simulang_analysis marks such loops (NodeInfo.reduction). Each assignment is
+# read as a polynomial in its own target and the loop variable, with every
+# other name replaced by its current (loop-invariant) value. `x := x + p(i)`
+# with p of degree <= MAX_DEGREE then advances over any stretch of the range
+# in O(1) through power sums, and `x := p(i)` only needs its last iteration.
+# Sums are exact, so only int accumulations advance this way; float ones,
+# which round after every step, keep stepping.
+# The interpreter still runs the first and last iterations itself, so the
+# values and their types are the ones stepping would produce; only the
+# iterations in between are summed here. It also sums only what stepping
+# executes: an intertillage is bounded to the interpreter's LOOP_LIMIT steps, and past its
+# displayed head only the tail iteration runs, so the closed form covers the
+# head and the tail is stepped.
+
+MAX_DEGREE = 3
+
+ACCUMULATE = "accumulate"  # x := x + p(i)
+OVERWRITE = "overwrite"    # x := p(i)
+
+
+class Polynomial:
+    # {(power of the target, power of the loop variable): Fraction}
+    def __init__(self, terms, is_float):
+        self.terms = {key: coefficient for key, coefficient in terms.items() if coefficient}
+        self.is_float = is_float  # stepping would produce a float
+
+    @classmethod
+    def constant(cls, value):
+        return cls({(0, 0): Fraction(value)}, isinstance(value, float))
+
+    def __add__(self, other):
+        terms = dict(self.terms)
+        for key, coefficient in other.terms.items():
+            terms[key] = terms.get(key, 0) + coefficient
+        return Polynomial(terms, self.is_float or other.is_float)
+
+    def __neg__(self):
+        return Polynomial({key: -coefficient for key, coefficient in self.terms.items()}, self.is_float)
+
+    def __mul__(self, other):
+        terms = {}
+        for (a, k), left in self.terms.items():
+            for (b, m), right in other.terms.items():
+                key = (a + b, k + m)
+                if key[0] > 1 or key[1] > MAX_DEGREE:
+                    return None
+                terms[key] = terms.get(key, 0) + left * right
+        return Polynomial(terms, self.is_float or other.is_float)
+
+    def divided(self, divisor):
+        return Polynomial({key: coefficient / divisor for key, coefficient in self.terms.items()}, True)
+
+    @property
+    def kind(self):
+        # ACCUMULATE, OVERWRITE, or None when the target appears any other way
+        own = {key: coefficient for key, coefficient in self.terms.items() if key[0]}
+        if not own:
+            return OVERWRITE
+        if own == {(1, 0): 1}:
+            return ACCUMULATE
+        return None
+
+    @property
+    def degree(self):
+        return max((k for _, k in self.terms), default=0)
+
+    def sum(self, first, last):
+        # Σ p(x) for x in [first, last], the target's own term left out
+        total = Fraction(0)
+        for (a, k), coefficient in self.terms.items():
+            if not a:
+                total += coefficient * (power_sum(k, last) - power_sum(k, first - 1))
+        return total
+
+
+def power_sum(degree, n):
+    # Σ x**degree for x in 1..n; as polynomials these hold for every integer
+    # n, so power_sum(d, b) - power_sum(d, a - 1) sums any range [a, b]
+    if degree == 0:
+        return n
+    if degree == 1:
+        return n * (n + 1) // 2
+    if degree == 2:
+        return n * (n + 1) * (2 * n + 1) // 6
+    if degree == 3:
+        return (n * (n + 1) // 2) ** 2
+    raise ValueError(f"No closed form for power sums of degree {degree}")
+
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def polynomial(expr, target, varname, lookup):
+    # `expr` as a Polynomial, or None when it is not one (or reads something
+    # that is not a plain number)
+    kind = expr[0]
+    if kind == "Number":
+        return Polynomial.constant(expr[1])
+    if kind == "Hoisted":
+        return polynomial(expr[2], target, varname, lookup)
+    if kind == "Ident":
+        name = expr[1]
+        if name == target:
+            return Polynomial({(1, 0): Fraction(1)}, False)
+        if name == varname:
+            return Polynomial({(0, 1): Fraction(1)}, False)  # numeric loop values are ints
+        if name == "∞":
+            return None
+        try:
+            value = lookup(name)
+        except RuntimeError:
+            return None
+        return Polynomial.constant(value) if is_number(value) else None
+    if kind != "Binary":
+        return None
+    op = expr[1]
+    left = polynomial(expr[2], target, varname, lookup)
+    right = polynomial(expr[3], target, varname, lookup) if left is not None else None
+    if right is None:
+        return None
+    if op == "+":
+        return left + right
+    if op == "-":
+        return left + -right
+    if op == "*":
+        return left * right
+    if op == "/":
+        divisor = right.terms.get((0, 0), 0)
+        if set(right.terms) - {(0, 0)} or not divisor:
+            return None  # only constant, non-zero divisors
+        return left.divided(divisor)
+    return None
+
+
+class Reduction:
+    # One accumulating assignment of a reducible loop body
+    def __init__(self, node, varname, lookup):
+        self.target, expr, _ = node.value
+        self.poly = polynomial(expr, self.target, varname, lookup)
+        self.kind = self.poly.kind if self.poly is not None else None
+        # `x := x + i` / `x := i + x` also advance over symbolic loop values,
+        # keeping the coefficient of the left operand like the interpreter does
+        self.symbolic_order = None
+        while expr[0] == "Hoisted":
+            expr = expr[2]
+        operands = (("Ident", self.target), ("Ident", varname))
+        if expr[0] == "Binary" and expr[1] == "+" and expr[2:] in (operands, operands[::-1]):
+            self.symbolic_order = "left" if expr[2] == operands[0] else "right"
+
+    def supports(self, symbolic):
+        # whether the iterations between the first and last can be skipped
+        if self.kind is None:
+            return False
+        if not symbolic or not self.poly.degree:
+            return True
+        return self.symbolic_order is not None
+
+    def advance(self, value, first, last, base_coefficient):
+        # The target after the iterations from first to last, or None when its
+        # current value has no closed form. first and last are loop values for
+        # a numeric range and offsets from the start (the delta in c∞ + delta)
+        # for a symbolic one, whose loop values have base coefficient
+        # base_coefficient.
+        if self.kind == OVERWRITE:
+            return value  # the last iteration assigns it again
+        if base_coefficient is None or not self.poly.degree:
+            # Only exact ints: a float sum rounds after every step, so its
+            # closed form would not match stepping
+            if self.poly.is_float or not is_number(value) or isinstance(value, float):
+                return None
+            return int(Fraction(value) + self.poly.sum(first, last))
+        # Symbolic loop values are c∞ + delta: once the target has the same
+        # shape, each iteration only adds delta to its offset
+        if not (isinstance(value, SymbolicInfinity) and value.operation == "+" and isinstance(value.right, int)
+                and isinstance(value.base, SymbolicInfinity) and value.base.operation is None):
+            return None
+        coefficient = value.base.coefficient if self.symbolic_order == "left" else base_coefficient
+        return SymbolicInfinity(operation="+", right=value.right + power_sum(1, last) - power_sum(1, first - 1),
+                                base=SymbolicInfinity(coefficient=coefficient))
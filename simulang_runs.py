@@ -0,0 +1,227 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Run state that every web worker can see: status, output segments and stop
+# requests, keyed by run id. The worker that executes a run appends output and
+# polls for stop requests; any worker can answer /fetch_output and /stop.
+
+RUNNING = "running"
+
+
+class UnknownRun(KeyError):
+    pass
+
+
+class MemoryRunRegistry:
+    # Single-process registry (one worker, tests)
+    def __init__(self):
+        self._runs = {}
+        self._lock = threading.Lock()
+
+    def create(self, run_id, info=None):
+        now = time.time()
+        with self._lock:
+            self._runs[run_id] = {"id": run_id, "status": RUNNING, "stop": False, "created": now,
+                                  "updated": now, "info": dict(info or {}), "segments": []}
+
+    def _run(self, run_id):
+        try:
+            return self._runs[run_id]
+        except KeyError:
+            raise UnknownRun(run_id)
+
+    def append_output(self, run_id, text, info=None):
+        with self._lock:
+            run = self._run(run_id)
+            run["segments"].append(text)
+            if info:
+                run["info"].update(info)
+            run["updated"] = time.time()
+
+    def set_status(self, run_id, status, info=None):
+        with self._lock:
+            run = self._run(run_id)
+            run["status"] = status
+            if info:
+                run["info"].update(info)
+            run["updated"] = time.time()
+
+    def request_stop(self, run_id):
+        with self._lock:
+            self._run(run_id)["stop"] = True
+
+    def stop_requested(self, run_id):
+        with self._lock:
+            return self._run(run_id)["stop"]
+
+    def get(self, run_id):
+        with self._lock:
+            run = self._run(run_id)
+            return {key: run[key] for key in ("id", "status", "stop", "created", "updated")} | {"info": dict(run["info"])}
+
+    def read_output(self, run_id, since=0):
+        # (text of segments[since:], segment cursor to pass next time)
+        with self._lock:
+            segments = self._run(run_id)["segments"]
+            return "".join(segments[since:]), len(segments)
+
+    def latest(self):
+        with self._lock:
+            if not self._runs:
+                return None
+            return max(self._runs.values(), key=lambda run: run["created"])["id"]
+
+    def prune(self, older_than):
+        cutoff = time.time() - older_than
+        with self._lock:
+            for run_id in [run_id for run_id, run in self._runs.items() if run["status"] != RUNNING and run["updated"] < cutoff]:
+                del self._runs[run_id]
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    stop INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    info TEXT NOT NULL DEFAULT '{}'
+);
+CREATE TABLE IF NOT EXISTS segments (
+    run_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (run_id, seq)
+);
+"""
+
+
+# Shared by all workers on one host through a SQLite file in WAL mode, so
+# readers (fetch_output) never block the writer appending output segments.
+# Each thread gets its own connection.
+class SQLiteRunRegistry:
+    def __init__(self, path, timeout=5.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        db = self._db()
+        db.execute("PRAGMA journal_mode=WAL")
+        db.executescript(SCHEMA)
+
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def create(self, run_id, info=None):
+        now = time.time()
+        self._db().execute("INSERT INTO runs (id, status, created, updated, info) VALUES (?, ?, ?, ?, ?)",
+                           (run_id, RUNNING, now, now, json.dumps(info or {})))
+
+    def _merge_info(self, db, run_id, info):
+        row = db.execute("SELECT info FROM runs WHERE id = ?", (run_id,)).fetchone()
+        if row is None:
+            raise UnknownRun(run_id)
+        if info:
+            merged = json.loads(row[0])
+            merged.update(info)
+            db.execute("UPDATE runs SET info = ? WHERE id = ?", (json.dumps(merged), run_id))
+
+    def append_output(self, run_id, text, info=None):
+        db = self._db()
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            self._merge_info(db, run_id, info)
+            db.execute("INSERT INTO segments (run_id, seq, text) "
+                       "SELECT ?, COALESCE(MAX(seq), -1) + 1, ? FROM segments WHERE run_id = ?", (run_id, text, run_id))
+            db.execute("UPDATE runs SET updated = ? WHERE id = ?", (time.time(), run_id))
+
+    def set_status(self, run_id, status, info=None):
+        db = self._db()
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            self._merge_info(db, run_id, info)
+            db.execute("UPDATE runs SET status = ?, updated = ? WHERE id = ?", (status, time.time(), run_id))
+
+    def request_stop(self, run_id):
+        if not self._db().execute("UPDATE runs SET stop = 1 WHERE id = ?", (run_id,)).rowcount:
+            raise UnknownRun(run_id)
+
+    def stop_requested(self, run_id):
+        row = self._db().execute("SELECT stop FROM runs WHERE id = ?", (run_id,)).fetchone()
+        if row is None:
+            raise UnknownRun(run_id)
+        return bool(row[0])
+
+    def get(self, run_id):
+        row = self._db().execute("SELECT id, status, stop, created, updated, info FROM runs WHERE id = ?", (run_id,)).fetchone()
+        if row is None:
+            raise UnknownRun(run_id)
+        return {"id": row[0], "status": row[1], "stop": bool(row[2]), "created": row[3], "updated": row[4], "info": json.loads(row[5])}
+
+    def read_output(self, run_id, since=0):
+        rows = self._db().execute("SELECT seq, text FROM segments WHERE run_id = ? AND seq >= ? ORDER BY seq",
+                                  (run_id, since)).fetchall()
+        if not rows:
+            self.get(run_id)  # raises UnknownRun
+            return "", since
+        return "".join(text for _, text in rows), rows[-1][0] + 1
+
+    def latest(self):
+        row = self._db().execute("SELECT id FROM runs ORDER BY created DESC LIMIT 1").fetchone()
+        return row[0] if row else None
+
+    def prune(self, older_than):
+        cutoff = time.time() - older_than
+        db = self._db()
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute("DELETE FROM segments WHERE run_id IN (SELECT id FROM runs WHERE status != ? AND updated < ?)", (RUNNING, cutoff))
+            db.execute("DELETE FROM runs WHERE status != ? AND updated < ?", (RUNNING, cutoff))
+
+
+def open_registry(location):
+    # ":memory:" keeps runs in this process only; anything else is a SQLite path
+    if location == ":memory:":
+        return MemoryRunRegistry()
+    return SQLiteRunRegistry(location)
+
+
+# OutputWriter sink that appends each flushed chunk as a segment. `info` is an
+# optional callable whose result (e.g. live cache stats) is stored alongside.
+class RunOutputSink:
+    def __init__(self, registry, run_id, info=None):
+        self.registry = registry
+        self.run_id = run_id
+        self.info = info
+
+    def write(self, text):
+        self.registry.append_output(self.run_id, text, self.info() if self.info else None)
+
+
+# should_continue() for the interpreter. It is called on every statement, so
+# the registry is only asked once per `interval` seconds.
+class StopPoller:
+    def __init__(self, registry, run_id, interval=0.2):
+        self.registry = registry
+        self.run_id = run_id
+        self.interval = interval
+        self.stopped = False
+        self._next_at = 0.0
+
+    def __call__(self):
+        if self.stopped:
+            return False
+        now = time.monotonic()
+        if now >= self._next_at:
+            self._next_at = now + self.interval
+            self.stopped = self.registry.stop_requested(self.run_id)
+        return not self.stopped
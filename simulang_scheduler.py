@@ -0,0 +1,298 @@
+import os
+import threading
+import time
+from collections import deque
+
+from simulang_metrics import LLM_QUEUE_DEPTH, LLM_QUEUE_SECONDS, LLM_RATE_LIMITED
+
+# Process-wide scheduling of LLM requests. Every interpreter thread submits
+# its chat completions here instead of calling the provider directly:
+#
+#   * a token bucket caps the request rate (and a 429 pauses it),
+#   * at most `concurrency` requests are in flight at once,
+#   * waiting requests are queued per run and the runs of the highest
+#     priority waiting are served round-robin, so one contradiction-heavy
+#     program cannot starve the others.
+#
+# A request that comes back rate limited is put back at the head of its
+# run's queue and retried after the provider's Retry-After (or an
+# exponential backoff), up to `retries` times.
+
+
+class TokenBucket:
+    def __init__(self, rate, burst=None, clock=time.monotonic):
+        self.rate = rate                  # tokens per second
+        self.burst = burst or max(1, rate)
+        self.clock = clock
+        self.tokens = self.burst
+        self.updated = clock()
+
+    def delay(self):
+        # 0 and one token taken if a token is available, else seconds until one is
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+def rate_limit_delay(error):
+    # Seconds the provider asked us to wait if `error` is a 429, else None.
+    # openai.RateLimitError carries status_code and the HTTP response.
+    if getattr(error, "status_code", None) != 429:
+        return None
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return max(0.0, float(headers.get("retry-after", 0)))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+QUEUED, RUNNING, DONE, CANCELLED = "queued", "running", "done", "cancelled"
+
+
+class Ticket:
+    # One submitted request; wait() for it, then result()
+    def __init__(self, fn, run, priority, submitted):
+        self.fn = fn
+        self.run = run
+        self.priority = priority
+        self.state = QUEUED
+        self.attempts = 0
+        self.submitted = submitted
+        self.value = None
+        self.error = None
+        self._done = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def add_done_callback(self, fn):
+        # fn(ticket) once the ticket is done or cancelled, on the thread that
+        # finished it (or right away if it already is). Callbacks run before
+        # wait() returns, so whatever they set up (a prefetch follow-up, say)
+        # is in place by the time a waiter looks for it.
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(fn)
+                return
+        fn(self)
+
+    def _finish(self):
+        # Done is set under the same lock acquisition that finds no callbacks
+        # left, so one added meanwhile is either run here or run right away
+        while True:
+            with self._lock:
+                callbacks, self._callbacks = self._callbacks, []
+                if not callbacks:
+                    self._done.set()
+                    return
+            try:
+                for fn in callbacks:
+                    fn(self)
+            except BaseException:
+                with self._lock:
+                    self._done.set()
+                raise
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def done(self):
+        return self._done.is_set()
+
+    def result(self):
+        self._done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class LLMScheduler:
+    def __init__(self, rate=None, burst=None, concurrency=8, retries=3, backoff=1.0, clock=time.monotonic):
+        self.bucket = TokenBucket(rate, burst, clock) if rate else None
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.clock = clock
+        self._cond = threading.Condition()
+        self._pending = {}  # (priority, run) -> deque of tickets
+        self._ready = {}    # priority -> deque of runs with pending tickets, in serving order
+        self._queued = 0
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._dispatcher = None
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rate_limited = 0
+        self.dispatched = 0    # first attempts started
+        self.waited = 0.0      # total seconds spent queued, first attempts only
+        self.max_wait = 0.0
+
+    # -- submitting -----------------------------------------------------------
+
+    def submit(self, fn, run=None, priority=0):
+        # Queue fn() to be called on a worker thread. Higher priorities go first.
+        ticket = Ticket(fn, run, priority, self.clock())
+        with self._cond:
+            self.submitted += 1
+            self._enqueue(ticket)
+            if self._dispatcher is None:
+                self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+                self._dispatcher.start()
+            self._cond.notify_all()
+        return ticket
+
+    def call(self, fn, run=None, priority=0):
+        return self.submit(fn, run, priority).result()
+
+    def cancel(self, ticket):
+        # Drop a ticket that has not started; one already running finishes
+        # in the background and its result is discarded.
+        with self._cond:
+            if ticket.state == QUEUED:
+                queue = self._pending.get((ticket.priority, ticket.run))
+                if queue is not None and ticket in queue:
+                    queue.remove(ticket)
+                    self._queued -= 1
+                    LLM_QUEUE_DEPTH.dec()
+            ticket.state = CANCELLED
+        ticket._finish()
+
+    def _enqueue(self, ticket, front=False):
+        key = (ticket.priority, ticket.run)
+        queue = self._pending.get(key)
+        if queue is None:
+            queue = self._pending[key] = deque()
+        if front:
+            queue.appendleft(ticket)
+        else:
+            queue.append(ticket)
+        runs = self._ready.setdefault(ticket.priority, deque())
+        if ticket.run not in runs:
+            if front:
+                runs.appendleft(ticket.run)
+            else:
+                runs.append(ticket.run)
+        self._queued += 1
+        LLM_QUEUE_DEPTH.inc()
+
+    def _next(self):
+        # The head ticket of the next run in line at the highest priority
+        for priority in sorted(self._ready, reverse=True):
+            runs = self._ready[priority]
+            while runs:
+                run = runs.popleft()
+                queue = self._pending.get((priority, run))
+                if not queue:
+                    self._pending.pop((priority, run), None)
+                    continue
+                ticket = queue.popleft()
+                if queue:
+                    runs.append(run)
+                else:
+                    del self._pending[(priority, run)]
+                return ticket
+            del self._ready[priority]
+        return None
+
+    # -- dispatching ----------------------------------------------------------
+
+    def _dispatch(self):
+        while True:
+            with self._cond:
+                while not self._queued or self._in_flight >= self.concurrency:
+                    self._cond.wait()
+                delay = self._paused_until - self.clock()
+                if delay <= 0 and self.bucket is not None:
+                    delay = self.bucket.delay()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                ticket = self._next()
+                if ticket is None:
+                    continue
+                self._queued -= 1
+                LLM_QUEUE_DEPTH.dec()
+                self._in_flight += 1
+                ticket.state = RUNNING
+                if ticket.attempts == 0:
+                    self.dispatched += 1
+                    waited = self.clock() - ticket.submitted
+                    self.waited += waited
+                    self.max_wait = max(self.max_wait, waited)
+                    LLM_QUEUE_SECONDS.observe(waited)
+                ticket.attempts += 1
+            threading.Thread(target=self._work, args=(ticket,), daemon=True).start()
+
+    def _work(self, ticket):
+        value = error = None
+        try:
+            value = ticket.fn()
+        except Exception as e:
+            error = e
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+            delay = rate_limit_delay(error) if error is not None else None
+            if delay is not None:
+                self.rate_limited += 1
+                LLM_RATE_LIMITED.inc()
+                if ticket.state == RUNNING and ticket.attempts <= self.retries:
+                    # back off everyone: the limit is the provider's, not this run's
+                    delay = delay or self.backoff * 2 ** (ticket.attempts - 1)
+                    self._paused_until = max(self._paused_until, self.clock() + delay)
+                    ticket.state = QUEUED
+                    self._enqueue(ticket, front=True)
+                    return
+            if ticket.state == CANCELLED:
+                return
+            ticket.state = DONE
+            if error is None:
+                self.completed += 1
+            else:
+                self.failed += 1
+        ticket.value, ticket.error = value, error
+        ticket._finish()
+
+    # -- introspection --------------------------------------------------------
+
+    def stats(self):
+        with self._cond:
+            return {
+                "queued": self._queued,
+                "queued_by_run": {str(run): len(queue) for (_, run), queue in self._pending.items() if queue},
+                "in_flight": self._in_flight,
+                "concurrency": self.concurrency,
+                "rate": self.bucket.rate if self.bucket is not None else None,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rate_limited": self.rate_limited,
+                "mean_wait_seconds": self.waited / self.dispatched if self.dispatched else 0.0,
+                "max_wait_seconds": self.max_wait,
+            }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def scheduler():
+    # The process-wide scheduler, configured from the environment:
+    # SIMULANG_LLM_RATE (requests/s, 0 = unlimited), SIMULANG_LLM_BURST,
+    # SIMULANG_LLM_CONCURRENCY and SIMULANG_LLM_RETRIES.
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = LLMScheduler(
+                    rate=float(os.environ.get("SIMULANG_LLM_RATE", 0)) or None,
+                    burst=float(os.environ.get("SIMULANG_LLM_BURST", 0)) or None,
+                    concurrency=int(os.environ.get("SIMULANG_LLM_CONCURRENCY", 8)),
+                    retries=int(os.environ.get("SIMULANG_LLM_RETRIES", 3)),
+                )
+    return _scheduler
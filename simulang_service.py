@@ -0,0 +1,299 @@
+from simulang_lexer import tokenize, tokenize_spans
+from simulang_parser import parse
+from simulang_interpreter import execute_body, Environment
+from simulang_output import OutputWriter
+from simulang_analysis import analyze
+from simulang_optimizer import PassManager
+from simulang_linker import link
+from simulang_checkpoint import Checkpointer, CheckpointError, load_checkpoint, prune_checkpoints
+from simulang_memo import FunctionCache
+from simulang_incremental import IncrementalCompiler
+from simulang_batch import ParseCache, run_batch
+from simulang_metering import ExecutionInterrupted, Meter
+from simulang_memory import MemoryProfile, token_lines
+from simulang_prefetch import prefetch
+from simulang_metrics import REGISTRY, RUNS, RUNS_ACTIVE, RUN_SECONDS
+from simulang_runs import RUNNING, RunOutputSink, StopPoller, UnknownRun, open_registry
+from collections import OrderedDict
+import json
+import os
+import stat
+import tempfile
+import threading
+import time
+import uuid
+
+# The request handlers behind both servers: app.py (Flask, one thread per
+# request) and asgi.py (an event loop that calls these on executor threads).
+# Each takes the decoded JSON body or query arguments and returns what is
+# sent back as JSON. Runs execute on their own threads, never on the caller's.
+
+
+def private_directory(path):
+    # Checkpoint segments are unpickled and the run database is trusted, so
+    # their directory must not be one another user created (or can write to)
+    # at a predictable path under the shared temp dir
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o022:
+        raise RuntimeError(f"{path} must be a directory owned by this user and writable only by it")
+    return path
+
+
+# Defaults live in a per-user directory created with mode 0700
+STATE_DIR = os.path.join(tempfile.gettempdir(), f"simulang-{os.getuid()}")
+
+CHECKPOINT_DIR = private_directory(os.environ.get("SIMULANG_CHECKPOINT_DIR")
+                                   or os.path.join(private_directory(STATE_DIR), "checkpoints"))
+CHECKPOINT_INTERVAL = float(os.environ.get("SIMULANG_CHECKPOINT_INTERVAL", 10))  # seconds, 0 disables
+CHECKPOINT_RETENTION = float(os.environ.get("SIMULANG_CHECKPOINT_RETENTION", 86400))  # seconds an unused checkpoint is kept
+RUN_TIMEOUT = float(os.environ.get("SIMULANG_RUN_TIMEOUT", 0))  # seconds of wall clock per run, 0 = unlimited
+MAX_STEPS = int(os.environ.get("SIMULANG_MAX_STEPS", 0))  # loop iterations per run, 0 = unlimited
+MEMORY_LIMIT_MB = float(os.environ.get("SIMULANG_MEMORY_LIMIT_MB", 0))  # per run, 0 = unlimited; implies profiling
+
+# Run state shared by all workers (see simulang_runs); ":memory:" keeps it per process
+RUN_DB = os.environ.get("SIMULANG_RUN_DB") or os.path.join(private_directory(STATE_DIR), "runs.sqlite3")
+RUN_RETENTION = float(os.environ.get("SIMULANG_RUN_RETENTION", 3600))  # seconds a finished run is kept
+runs = open_registry(RUN_DB)
+
+# Runs executing in this worker: run id -> OutputWriter, so a fetch can flush it
+local_writers = {}
+
+# /run_batch parses each distinct program once across requests
+batch_cache = ParseCache()
+
+# Incremental /compile state per editor session, least recently used dropped first
+COMPILE_SESSIONS = 64
+compile_sessions = OrderedDict()
+compile_lock = threading.Lock()
+
+
+def compile_code(body):
+    session_id = body.get("session")
+    if session_id is not None:
+        return compile_incremental(session_id, body)
+    code = body.get("code", "")
+    try:
+        tokens = tokenize(code)
+        ast = parse(tokens)
+        link(ast)
+        # the run that usually follows finds these replies waiting
+        prefetched = prefetch(ast) if body.get("prefetch", True) else 0
+        return {"output": f"Compilation successful.\\nAST: {repr(ast)}", "prefetched": prefetched}
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def compile_incremental(session_id, body):
+    # The editor sends either the full text ("code") or one edit ("start",
+    # "end", "text") against the version it last saw; a version mismatch
+    # asks it to resync with the full text.
+    with compile_lock:
+        compiler = compile_sessions.get(session_id)
+        if "code" in body:
+            if compiler is None:
+                compiler = IncrementalCompiler(body["code"])
+            else:
+                compiler.reset(body["code"])
+        elif compiler is None or body.get("version") != compiler.version:
+            return {"session": session_id, "resync": True}
+        else:
+            try:
+                compiler.edit(int(body["start"]), int(body["end"]), body.get("text", ""))
+            except (KeyError, ValueError):
+                compile_sessions.pop(session_id, None)
+                return {"session": session_id, "resync": True}
+        compile_sessions[session_id] = compiler
+        compile_sessions.move_to_end(session_id)
+        while len(compile_sessions) > COMPILE_SESSIONS:
+            compile_sessions.popitem(last=False)
+        result = compiler.summary()
+    result["session"] = session_id
+    return result
+
+
+def run_code(body):
+    code = body.get("code", "")
+    resume_id = body.get("resume")
+    interval = float(body.get("checkpoint_interval", CHECKPOINT_INTERVAL))
+    checkpoint = None
+    prune_checkpoints(CHECKPOINT_DIR, CHECKPOINT_RETENTION)
+    if resume_id:
+        try:
+            checkpoint = load_checkpoint(CHECKPOINT_DIR, resume_id)
+        except CheckpointError as e:
+            return {"error": str(e)}
+    checkpoint_id = resume_id or uuid.uuid4().hex
+    memo = FunctionCache(int(body.get("memo_size", 256))) if body.get("memoize") else None
+    timeout = float(body.get("timeout", RUN_TIMEOUT))
+    max_steps = int(body.get("max_steps", MAX_STEPS))
+    parallel_bifurcation = bool(body.get("parallel_bifurcator"))
+    priority = int(body.get("priority", 0))  # for this run's LLM requests; higher goes first
+    speculate = body.get("prefetch", True)  # send LLM requests with literal inputs before execution reaches them
+    # "memory": true reports allocations by statement; a "memory_limit" (MB) also stops the run past it
+    memory_limit = float(body.get("memory_limit", MEMORY_LIMIT_MB))
+    memory = MemoryProfile(int(memory_limit * 1024 * 1024)) if body.get("memory") or memory_limit > 0 else None
+    # "optimize": false skips the optimizer; "passes": {"dead_functions": false, ...} toggles passes
+    passes = body.get("passes") or {}
+    optimizer = PassManager(disabled={name for name, enabled in passes.items() if not enabled}) if body.get("optimize", True) else None
+
+    run_id = uuid.uuid4().hex
+    runs.prune(RUN_RETENTION)
+    runs.create(run_id, {"checkpoint": checkpoint_id})
+    if checkpoint is not None:
+        runs.append_output(run_id, checkpoint.output)
+
+    def run_info():
+        info = {}
+        if memo is not None:
+            info["memo"] = memo.stats()
+        if memory is not None:
+            info["memory"] = memory.summary()
+        return info or None
+
+    writer = OutputWriter(RunOutputSink(runs, run_id, run_info if memo is not None or memory is not None else None),
+                          background=True)
+    should_continue = StopPoller(runs, run_id)
+    local_writers[run_id] = writer
+
+    def run():
+        tracker = None
+        status = "failed"
+        started = time.perf_counter()
+        RUNS_ACTIVE.inc()
+        try:
+            if memory is not None:
+                tokens, spans = tokenize_spans(code)
+                memory.lines = token_lines(code, spans)
+            else:
+                tokens = tokenize(code)
+            ast = parse(tokens)
+            if optimizer is not None:
+                optimizer.run(ast)
+                runs.set_status(run_id, RUNNING, {"optimizer": optimizer.timings})
+            link(ast)
+            if speculate:
+                prefetch(ast, run_id, priority)
+            analyze(ast)
+            env = Environment(output=writer)
+            env.memo = memo
+            env.meter = Meter(should_continue, timeout, max_steps)
+            env.parallel_bifurcation = parallel_bifurcation
+            env.run_id = run_id
+            env.priority = priority
+            if memory is not None:
+                env.memory = env.meter.memory = memory
+                memory.start()
+            if checkpoint is not None or interval > 0:
+                # Resuming with checkpointing turned off still snapshots on /stop
+                # node numbering depends on the passes, so they are part of what must match on resume
+                source = code if optimizer is None else code + "\0" + optimizer.signature()
+                tracker = Checkpointer(ast, source, CHECKPOINT_DIR, checkpoint_id, interval if interval > 0 else float("inf"),
+                                       read_output=lambda start, end: runs.read_output(run_id)[0][start:end])
+                env.checkpoint = tracker
+                if checkpoint is not None:
+                    tracker.resume(checkpoint, env)
+            execute_body(ast, env, should_continue)
+            status = "stopped" if should_continue.stopped else "finished"
+        except ExecutionInterrupted as e:
+            status = "stopped" if e.reason == "stopped" else "interrupted"
+            writer.write_line(f"⏹ {e}")
+            if tracker is not None:
+                tracker.snapshot(env)  # resume picks up from the interrupted loop
+        except Exception as e:
+            writer.write("Error: " + str(e))
+        finally:
+            if memory is not None:
+                memory.stop()
+            writer.close()
+            if tracker is not None:
+                tracker.close(status)
+                if status == "finished":
+                    tracker.remove()  # nothing left to resume
+            runs.set_status(run_id, status, run_info())
+            local_writers.pop(run_id, None)
+            RUNS_ACTIVE.dec()
+            RUNS.labels(status).inc()
+            RUN_SECONDS.observe(time.perf_counter() - started)
+
+    threading.Thread(target=run, daemon=True).start()
+
+    return {"output": "Resuming execution." if checkpoint else "Execution started.",
+            "run_id": run_id, "checkpoint": checkpoint_id}
+
+
+def run_batch_code(body):
+    # {"programs": [{"name": ..., "code": ...}, ...] or {name: code}, "jobs",
+    #  "timeout", "max_steps", "format": "json" | "jsonl"}. For "jsonl" this
+    # returns an iterator of lines, one per program as soon as it finishes.
+    programs = body.get("programs", [])
+    if isinstance(programs, dict):
+        programs = list(programs.items())
+    else:
+        programs = [(program.get("name", str(index)), program.get("code", "")) for index, program in enumerate(programs)]
+    timeout = float(body.get("timeout", RUN_TIMEOUT)) or None
+    max_steps = int(body.get("max_steps", MAX_STEPS)) or None
+    results = run_batch(programs, int(body.get("jobs", 0)), batch_cache, timeout, max_steps)
+
+    if body.get("format") == "jsonl":
+        return (json.dumps(dict(result, index=index)) + "\n" for index, result in results)
+    ordered = [None] * len(programs)
+    for index, result in results:
+        ordered[index] = result
+    return {"results": ordered, "cache": batch_cache.stats()}
+
+
+def requested_run_id(args):
+    # Older clients do not send a run id; they mean the latest run
+    return args.get("run_id") or runs.latest()
+
+
+def stop_execution(body):
+    run_id = requested_run_id(body)
+    try:
+        runs.request_stop(run_id)
+    except UnknownRun:
+        return {"error": f"Unknown run: {run_id}"}
+    return {"status": "Execution stop requested.", "run_id": run_id}
+
+
+def fetch_output(args):
+    run_id = requested_run_id(args)
+    if run_id is None:
+        return {"output": "", "done": True}
+    writer = local_writers.get(run_id)
+    if writer is not None:
+        writer.flush()
+    try:
+        run = runs.get(run_id)
+        output, cursor = runs.read_output(run_id, int(args.get("since", 0)))
+    except UnknownRun:
+        return {"error": f"Unknown run: {run_id}"}
+    result = {
+        "run_id": run_id,
+        "output": output,
+        "cursor": cursor,  # pass back as ?since= to fetch only new output
+        "status": run["status"],
+        "done": run["status"] != RUNNING,
+    }
+    for key in ("memo", "optimizer", "memory"):
+        if key in run["info"]:
+            result[key] = run["info"][key]
+    return result
+
+
+def run_state(run_id):
+    # (status, updated) of a run, or None if unknown; what a long poll waits on
+    writer = local_writers.get(run_id)
+    if writer is not None:
+        writer.flush()
+    try:
+        run = runs.get(run_id)
+    except UnknownRun:
+        return None
+    return run["status"], run["updated"]
+
+
+def metrics():
+    # Counters are per process: with several workers, scrape each one
+    return REGISTRY.render()
@@ -5,14 +5,22 @@ class SymbolicInfinity:
         self.right = right
         self.base = base
         self.is_iterator = is_iterator  # Flag to distinguish i from time
+        self._str = None  # values are never mutated, so the rendering is cached
 
     def __str__(self):
+        if self._str is None:
+            self._str = self._format()
+        return self._str
+
+    def _format(self):
         def fmt(val):
             if isinstance(val, SymbolicInfinity):
                 if val.operation is None or val.operation == '*':
                     return f"{val.coefficient if val.coefficient != 1 else ''}∞"
                 return f"({val})"
-            elif isinstance(val, (int, float)):
+            elif isinstance(val, int):
+                return str(val)
+            elif isinstance(val, float):
                 if val.is_integer():
                     return str(int(val))
                 return str(val)
@@ -36,6 +44,13 @@ class SymbolicInfinity:
     def __repr__(self):
         return self.__str__()
 
+    def copy(self):
+        # A distinct but identical value; equality is by identity, so each
+        # evaluation of a folded literal must hand out a new one
+        base = self.base.copy() if isinstance(self.base, SymbolicInfinity) else self.base
+        right = self.right.copy() if isinstance(self.right, SymbolicInfinity) else self.right
+        return SymbolicInfinity(self.coefficient, self.operation, right, base, self.is_iterator)
+
     def with_offset(self, offset):
         if offset == 0:
             return self
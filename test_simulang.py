@@ -1,8 +1,33 @@
+import asyncio
+import importlib.util
+import io
+import json
+import os
+import tempfile
+import threading
+import time
 import unittest
 from symbolic_infinity import SymbolicInfinity
 from simulang_parser import parse
-from simulang_lexer import tokenize
-from simulang_interpreter import execute, Environment
+from simulang_lexer import tokenize, tokenize_spans, tokenize_file_spans, split_points
+from simulang_interpreter import execute, execute_body, Environment
+from simulang_output import OutputWriter, format_value
+from simulang_analysis import analyze
+from simulang_checkpoint import Checkpointer, CheckpointError, load_checkpoint, prune_checkpoints
+from simulang_memo import FunctionCache
+from simulang_incremental import IncrementalCompiler
+from simulang_batch import ParseCache, run_batch
+from simulang_flat import SharedAST, attach, decode, detach, encode
+from simulang_optimizer import PassManager, PROGRAM
+from simulang_linker import LinkError, link
+from simulang_metering import ExecutionInterrupted, Meter
+from simulang_memory import MemoryProfile, token_lines
+from simulang_metrics import Counter, Histogram, Registry
+from simulang_scheduler import LLMScheduler, TokenBucket
+from simulang_llm import PrefetchedResponses, ask, prefetched, request_key
+from simulang_prefetch import llm_requests, messages
+import simulang_prompts as prompts
+from simulang_runs import MemoryRunRegistry, SQLiteRunRegistry, RunOutputSink, StopPoller
 
 class SimuLangTests(unittest.TestCase):
 
@@ -13,6 +38,11 @@ class SimuLangTests(unittest.TestCase):
         execute(ast, env)
         return env
 
+    def run_simulang_output(self, code):
+        sink = io.StringIO()
+        execute(parse(tokenize(code)), Environment(output=OutputWriter(sink)))
+        return sink.getvalue()
+
     def test_const_assignment(self):
         code = "coeternal light := ∞;"
         env = self.run_simulang_code(code)
@@ -107,5 +137,1006 @@ class SimuLangTests(unittest.TestCase):
         """
         self.run_simulang_code(code)
 
+    def test_output_writer(self):
+        code = """
+        posit varnothing nabla infty ds2(): {
+            delineator "check": {
+                print(2 + 2);
+                print(5 / 2);
+                print(3∞);
+            }
+            sol day intensity 0.9 {
+                print("Sunlight");
+            }
+        }
+        """
+        output = self.run_simulang_output(code)
+        self.assertEqual(output.splitlines(), [
+            "⎯⎯ delineator: check ⎯⎯", "4", "2.5", "3∞", "⎯⎯ end delineator: check ⎯⎯",
+            "🌞 sol day intensity = 0.9", "Sunlight",
+        ])
+
+    def test_output_before_error_is_flushed(self):
+        sink = io.StringIO()
+        ast = parse(tokenize("""
+        posit varnothing nabla infty ds2(): {
+            print("before");
+            print(1 + "a");
+        }
+        """))
+        with self.assertRaises(RuntimeError):
+            execute(ast, Environment(output=OutputWriter(sink, chunk_size=1024, flush_interval=60)))
+        self.assertEqual(sink.getvalue(), "before\n")
+
+    def test_output_writer_buffers_until_flush(self):
+        sink = io.StringIO()
+        writer = OutputWriter(sink, chunk_size=1024, flush_interval=60)
+        writer.write_value(4.0)
+        writer.write_line("x")
+        self.assertEqual(sink.getvalue(), "")
+        writer.flush()
+        self.assertEqual(sink.getvalue(), "4\nx\n")
+        self.assertEqual(writer.written, 4)
+
+    def test_output_writer_background_flush(self):
+        # Output written before a long wait reaches the sink without another write
+        sink = io.StringIO()
+        writer = OutputWriter(sink, flush_interval=0.05, background=True)
+        writer.write_line("before the wait")
+        deadline = time.monotonic() + 5
+        while not sink.getvalue() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(sink.getvalue(), "before the wait\n")
+        writer.flush_interval = 60
+        writer.close()
+        writer.write_line("x")
+        time.sleep(0.2)
+        self.assertEqual(sink.getvalue(), "before the wait\n")  # closed: back to write-driven flushes
+
+    def test_format_value(self):
+        self.assertEqual(format_value(3.0), "3")
+        self.assertEqual(format_value(7), "7")
+        sym = SymbolicInfinity(operation='+', right=5, base=SymbolicInfinity(coefficient=2))
+        self.assertEqual(format_value(sym), "5+2∞")
+        self.assertIs(str(sym), str(sym))
+
+    def test_numeric_types(self):
+        ast = parse(tokenize("octyl a := 3.0 + 2.5 + 4;"))
+        self.assertEqual(ast.children[0].value[1], ("Binary", "+", ("Binary", "+", ("Number", 3), ("Number", 2.5)),
+                                                    ("Number", 4)))
+        self.assertIs(type(ast.children[0].value[1][2][2][1]), int)
+        env = self.run_simulang_code("""
+        octyl total := 0;
+        octyl half := 0;
+        octyl mixed := 0;
+        intertillage [1..3] -> i: {
+            total := total + i * 2;
+            half := i / 3;
+            mixed := mixed + i + 0.5;
+        }
+        """)
+        self.assertEqual([(type(env.get(name)), env.get(name)) for name in ("i", "total", "half", "mixed")],
+                         [(int, 3), (int, 22), (float, 1.0), (float, 7.5)])
+        # Loop values are ints, so products stay exact past 2**53 (float
+        # loop values used to round them); "/" still gives a float
+        output = self.run_simulang_output("""
+        posit varnothing nabla infty ds2(): {
+            octyl acc := 1;
+            octyl grow := 3;
+            intertillage [1..5] -> i: {
+                grow := grow * grow + i;
+            }
+            intertillage [1..25] -> i: {
+                acc := acc * i;
+            }
+            print(acc);
+            print(acc / 2);
+            print(grow);
+            print(123456789012345678 * 10 + 1);
+        }
+        """)
+        self.assertEqual(output.split(), ["15511210043330985984000000", "7755605021665493027651584",
+                                          "11730114471756414", "1234567890123456801"])  # the literal itself is read as a float
+
+    def test_analysis_read_write_sets(self):
+        ast = parse(tokenize("""
+        octyl rate := 3;
+        posit step(): {
+            total := total + rate;
+        }
+        posit varnothing nabla infty ds2(): {
+            intertillage [1..4] -> i: {
+                step();
+                print(i);
+            }
+        }
+        """))
+        analysis = analyze(ast)
+        step = analysis.functions["step"]
+        self.assertEqual(step.info.reads, {"total", "rate"})
+        self.assertEqual(step.info.writes, {"total"})
+        loop = analysis.functions["ds2"].children[0]
+        self.assertEqual(loop.info.writes, {"i", "total"})
+        self.assertEqual(loop.info.effects, {"assign", "print", "call"})
+        self.assertFalse(loop.info.pure_body)
+
+    def test_loop_invariant_hoisting(self):
+        code = """
+        octyl base := 10;
+        octyl total := 0;
+        posit varnothing nabla infty ds2(): {
+            intertillage [1..3] -> i: {
+                total := (base * 2) + total + i;
+                print(total);
+            }
+        }
+        """
+        ast = parse(tokenize(code))
+        analysis = analyze(ast)
+        self.assertEqual(analysis.hoisted, 1)
+        assignment = analysis.functions["ds2"].children[0].children[0]
+        self.assertEqual(assignment.value[1][2][2][0], "Hoisted")
+        sink = io.StringIO()
+        execute(ast, Environment(output=OutputWriter(sink)))
+        self.assertEqual(sink.getvalue(), self.run_simulang_output(code))
+        self.assertEqual(sink.getvalue().split(), ["21", "43", "66"])
+
+    def test_pure_intertillage_body_is_skipped(self):
+        ast = parse(tokenize("""
+        octyl x := 1;
+        posit varnothing nabla infty ds2(): {
+            intertillage [1..500] -> i: {
+                equiangular x == 2: {
+                }
+            }
+            print(i);
+        }
+        """))
+        analysis = analyze(ast)
+        self.assertTrue(analysis.functions["ds2"].children[0].info.pure_body)
+        sink = io.StringIO()
+        execute(ast, Environment(output=OutputWriter(sink)))
+        self.assertEqual(sink.getvalue().split(), ["...", "500"])
+
+        # A body that can raise still runs, so the error is not skipped
+        for condition, error in (("(x / 0) == 1", ZeroDivisionError), ("x < name", TypeError),
+                                 ("(x + name) == 1", RuntimeError)):
+            ast = parse(tokenize(f'octyl x := 1;\noctyl name := "a";\nintertillage [1..500] -> i: {{\n'
+                                 f'    equiangular {condition}: {{\n    }}\n}}\n'))
+            analyze(ast)
+            self.assertFalse(ast.children[2].info.pure_body)
+            env = Environment(output=OutputWriter(io.StringIO()))
+            with self.assertRaises(error):
+                for child in ast.children:
+                    execute(child, env)
+
+    def run_reduction(self, code, analyzed=True):
+        ast = parse(tokenize(code))
+        if analyzed:
+            analyze(ast)
+        sink = io.StringIO()
+        env = Environment(output=OutputWriter(sink))
+        for child in ast.children:
+            execute(child, env)
+        env.output.flush()
+        return sink.getvalue(), {name: (str(value), type(value)) for name, (value, _) in env.vars.items()}
+
+    def test_intertillage_reduction_closed_form(self):
+        def program(bounds, body):
+            return f"octyl k := 3;\noctyl total := 0;\noctyl n := 0;\nintertillage {bounds} -> i: {{\n{body}\n}}\n"
+
+        accumulate = "total := (total + ((i * i) * k)) - (i / 2);\nn := n + 1;"
+        ast = parse(tokenize(program("[1..5]", accumulate)))
+        self.assertEqual(analyze(ast).program.children[3].info.reduction, ("total", "n"))
+        # Both ways must agree exactly, including past the displayed head
+        # (only the tail iteration runs after it) and past the step bound
+        for bounds, body in (("[1..50]", accumulate), ("[4..4]", accumulate), ("[1..101]", accumulate),
+                             ("[1..102]", accumulate), ("[1..5000]", accumulate), ("[1..20000]", accumulate),
+                             ("[1..1000000000]", "total := total + i;"), ("[∞..∞ + 50]", "total := total + i;"),
+                             ("[∞ + 3..∞ + 40]", "total := i + total;\nn := n + 1;"),
+                             ("[∞..∞ + 5000]", "total := total + i;"), ("[∞..∞ + 20000]", "total := i + total;"),
+                             ("[1..90]", "total := total + 0.1;"), ("[1..100]", "total := total + (i * 0.3);"),
+                             ("[1234567..1234600]", "total := total + (i * i * i);")):
+            code = program(bounds, body)
+            self.assertEqual(self.run_reduction(code), self.run_reduction(code, analyzed=False))
+
+        output, values = self.run_reduction(program("[1..5000]", "total := total + i;"))
+        self.assertEqual(output.split(), ["..."])
+        self.assertEqual(values["total"], ("10050", int))  # 1..100, then 5000
+        output, values = self.run_reduction(program("[1..20000]", accumulate))
+        self.assertEqual(output.splitlines(), ["⚠️ Loop bounded to 10000 steps.", "..."])
+        self.assertEqual(values["n"], ("101", int))
+
+        # Anything else in the body, or a non-polynomial update, keeps stepping
+        _, values = self.run_reduction(program("[1..20000]", "total := total * 2;\nn := n + 1;"))
+        self.assertEqual(values["n"], ("101", int))
+
+    CHECKPOINT_PROGRAM = """
+    octyl n := 0;
+    posit varnothing nabla infty ds2(): {
+        intertillage [1..3] -> i: {
+            print(n + i);
+        }
+        n := n + 10;
+        recur ds2(5);
+    }
+    """
+
+    def run_checkpointed(self, directory, should_continue=lambda: True, sink=None, checkpoint_id=None,
+                         program=CHECKPOINT_PROGRAM):
+        ast = parse(tokenize(program))
+        sink = sink if sink is not None else io.StringIO()
+        env = Environment(output=OutputWriter(sink, chunk_size=0))
+        tracker = Checkpointer(ast, program, directory, checkpoint_id, interval=0,
+                               read_output=lambda start, end: sink.getvalue()[start:end])
+        env.checkpoint = tracker
+        if checkpoint_id is not None:
+            checkpoint = load_checkpoint(directory, checkpoint_id)
+            sink.write(checkpoint.output)
+            tracker.resume(checkpoint, env)
+        try:
+            execute(ast, env, should_continue)
+        finally:
+            tracker.close()
+        return tracker.id, sink.getvalue()
+
+    def test_checkpoint_resume_after_stop(self):
+        expected = self.run_simulang_output(self.CHECKPOINT_PROGRAM)
+        calls = []
+
+        def stop_after_two_iterations():
+            calls.append(1)
+            return len(calls) <= 2
+
+        with tempfile.TemporaryDirectory() as directory:
+            checkpoint_id, partial = self.run_checkpointed(directory, stop_after_two_iterations)
+            self.assertEqual(partial.split(), ["1", "2", "3", "11", "12", "13"])
+            _, resumed = self.run_checkpointed(directory, checkpoint_id=checkpoint_id)
+        self.assertEqual(resumed, expected)
+
+    @staticmethod
+    def crashing_sink(lines):
+        class CrashingSink(io.StringIO):
+            def write(self, text):
+                if self.getvalue().count("\n") == lines:
+                    raise KeyboardInterrupt("worker killed")
+                return super().write(text)
+        return CrashingSink()
+
+    def test_checkpoint_resume_inside_intertillage(self):
+        expected = self.run_simulang_output(self.CHECKPOINT_PROGRAM)
+        with tempfile.TemporaryDirectory() as directory:
+            with self.assertRaises(KeyboardInterrupt):
+                self.run_checkpointed(directory, sink=self.crashing_sink(7))
+            checkpoint_id = sorted(os.listdir(directory))[0]
+            checkpoint = load_checkpoint(directory, checkpoint_id)
+            self.assertEqual(checkpoint.output.split(), ["1", "2", "3", "11", "12", "13", "21"])
+            self.assertEqual(checkpoint.vars["n"], (20, False))
+            _, resumed = self.run_checkpointed(directory, checkpoint_id=checkpoint_id)
+        self.assertEqual(resumed, expected)
+
+    def test_checkpoint_resume_inside_enclosed_loop(self):
+        # The crash stops in an inner loop or a called posit; the enclosing
+        # intertillage must carry on from its saved iteration, not restart
+        nested = """
+        posit varnothing nabla infty ds2(): {
+            intertillage [1..3] -> i: {
+                intertillage [1..3] -> j: {
+                    print(i * 10 + j);
+                }
+            }
+        }
+        """
+        called = """
+        posit show(): {
+            intertillage [1..3] -> j: {
+                print(i * 10 + j);
+            }
+        }
+        posit varnothing nabla infty ds2(): {
+            intertillage [1..3] -> i: {
+                show();
+            }
+        }
+        """
+        for program in (nested, called):
+            expected = self.run_simulang_output(program)
+            with tempfile.TemporaryDirectory() as directory:
+                with self.assertRaises(KeyboardInterrupt):
+                    self.run_checkpointed(directory, sink=self.crashing_sink(5), program=program)
+                checkpoint_id = os.listdir(directory)[0]
+                self.assertEqual(load_checkpoint(directory, checkpoint_id).output.split(), ["11", "12", "13", "21", "22"])
+                _, resumed = self.run_checkpointed(directory, checkpoint_id=checkpoint_id, program=program)
+            self.assertEqual(resumed, expected)
+
+    def test_checkpoint_ids_and_retention(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for bad in ("../x", os.path.join(directory, "x"), "", 7, "A" * 32):
+                with self.assertRaises(CheckpointError):
+                    load_checkpoint(directory, bad)
+                with self.assertRaises(CheckpointError):
+                    Checkpointer(parse(tokenize("octyl x := 1;")), "", directory, bad or "x")
+            self.assertEqual(os.listdir(directory), [])
+
+            old, _ = self.run_checkpointed(directory)
+            fresh, _ = self.run_checkpointed(directory)
+            os.mkdir(os.path.join(directory, "not-a-checkpoint"))
+            stale = time.time() - 7200
+            for name in os.listdir(os.path.join(directory, old)):
+                os.utime(os.path.join(directory, old, name), (stale, stale))
+            self.assertEqual(prune_checkpoints(directory, 3600), 1)
+            self.assertEqual(sorted(os.listdir(directory)), sorted([fresh, "not-a-checkpoint"]))
+
+    def test_service_state_directory_is_private(self):
+        os.environ.setdefault("SIMULANG_RUN_DB", ":memory:")
+        from simulang_service import private_directory
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = private_directory(os.path.join(directory, "state"))
+            self.assertEqual(os.stat(path).st_mode & 0o777, 0o700)
+            os.chmod(path, 0o777)  # writable by other users
+            with self.assertRaises(RuntimeError):
+                private_directory(path)
+
+    MEMO_PROGRAM = """
+    octyl step := 1;
+    posit frame(): {
+        boundary [0..step] -> b: {
+            print(b.left);
+        }
+        area := step * 4;
+    }
+    posit varnothing nabla infty ds2(): {
+        frame();
+        frame();
+        frame();
+        print(area);
+        step := step + 1;
+        frame();
+        frame();
+        recur ds2(3);
+    }
+    """
+
+    def test_memoized_calls(self):
+        expected = self.run_simulang_output(self.MEMO_PROGRAM)
+        ast = parse(tokenize(self.MEMO_PROGRAM))
+        analyze(ast)
+        sink = io.StringIO()
+        env = Environment(output=OutputWriter(sink))
+        env.memo = FunctionCache()
+        execute(ast, env)
+        self.assertEqual(sink.getvalue(), expected)
+        self.assertEqual(env.get("area"), 16)
+        # frame() reads the boundary it bound on the previous call, so the
+        # first two calls after each change of step miss and the rest hit.
+        self.assertEqual((env.memo.hits, env.memo.misses), (7, 8))
+
+        ast = parse(tokenize("""
+        octyl x := 1;
+        posit same(): {
+            print(x);
+            y := x + 1;
+        }
+        posit varnothing nabla infty ds2(): {
+            same();
+            same();
+            same();
+        }
+        """))
+        analyze(ast)
+        sink = io.StringIO()
+        env = Environment(output=OutputWriter(sink))
+        env.memo = FunctionCache(maxsize=1)
+        execute(ast, env)
+        self.assertEqual(sink.getvalue().split(), ["1", "1", "1"])
+        self.assertEqual(env.get("y"), 2)
+        # the first call sees y undefined; with maxsize=1 that entry is evicted
+        self.assertEqual((env.memo.hits, env.memo.misses, env.memo.evictions), (1, 2, 1))
+
+    def test_memo_skips_llm_functions(self):
+        ast = parse(tokenize("""
+        posit ask(): {
+            contradiction "The sky is blue." -> c: {
+                print(c);
+            }
+        }
+        posit varnothing nabla infty ds2(): {
+            ask();
+        }
+        """))
+        analyze(ast)
+        self.assertIn("llm", ast.children[0].info.effects)
+        memo = FunctionCache()
+        env = Environment(output=OutputWriter(io.StringIO()))
+        env.memo = memo
+        try:
+            execute(ast, env)
+        except ImportError:
+            pass  # openai is optional here; the call was still routed around the cache
+        self.assertEqual(memo.stats()["uncacheable"], 1)
+        self.assertEqual(memo.stats()["size"], 0)
+
+    def test_incremental_compile_matches_full_parse(self):
+        code = """
+        coeternal a := 1;
+        posit f(): {
+            print(a);
+        }
+        octyl b := 2;
+        """
+        compiler = IncrementalCompiler(code)
+        start = code.index("print(a)")
+        compiler.edit(start + 6, start + 7, "b")
+        self.assertEqual(compiler.reparsed, 1)
+        compiler.edit(len(compiler.text), len(compiler.text), "octyl c := \"x\";\n")
+        self.assertEqual(compiler.reparsed, 1)
+        # removing the closing brace pulls the next statement into the body
+        brace = compiler.text.index("}")
+        compiler.edit(brace, brace + 1, "")
+        self.assertFalse(compiler.summary()["ok"])
+        compiler.edit(brace, brace, "}")
+        self.assertTrue(compiler.summary()["ok"])
+        self.assertEqual(compiler.tokens(), tokenize(compiler.text))
+        self.assertEqual(repr(compiler.program()), repr(parse(tokenize(compiler.text))))
+
+    def test_incremental_compile_diagnostics(self):
+        compiler = IncrementalCompiler("coeternal a := 1;\nposit f(): {\n    print(a)\n}\n")
+        [diagnostic] = compiler.diagnostics()
+        self.assertEqual((diagnostic["line"], diagnostic["column"]), (4, 1))
+        compiler.edit(0, 0, "$")
+        [diagnostic] = compiler.diagnostics()
+        self.assertEqual((diagnostic["line"], diagnostic["column"]), (1, 1))
+        self.assertIn("Unexpected character", diagnostic["message"])
+
+    def test_expression_parsing(self):
+        ast = parse(tokenize("octyl v := (a.b + 3∞) * ∞2 - (1 % \"s\");"))
+        self.assertEqual(ast.children[0].value[1],
+                         ("Binary", "-",
+                          ("Binary", "*",
+                           ("Binary", "+", ("Member", ("Ident", "a"), "b"), ("Binary", "*", ("Number", 3.0), ("Infty", "∞"))),
+                           ("Binary", "*", ("Infty", "∞"), ("Number", 2.0))),
+                          ("Binary", "%", ("Number", 1.0), ("String", "s"))))
+        # nesting far deeper than the recursion limit
+        ast = parse(tokenize("octyl v := " + "(" * 5000 + "1" + ")" * 5000 + ";"))
+        self.assertEqual(ast.children[0].value[1], ("Number", 1.0))
+        with self.assertRaises(SyntaxError):
+            parse(tokenize("octyl v := (1 + 2;"))
+
+    def test_run_registry_is_shared_between_workers(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "runs.sqlite3")
+            for worker, other in ((MemoryRunRegistry(),) * 2, (SQLiteRunRegistry(path), SQLiteRunRegistry(path))):
+                worker.create("r1")
+                writer = OutputWriter(RunOutputSink(worker, "r1"))
+                writer.write_line("first")
+                writer.flush()
+                self.assertEqual(other.read_output("r1"), ("first\n", 1))
+                writer.write_line("second")
+                writer.flush()
+                self.assertEqual(other.read_output("r1", 1), ("second\n", 2))
+                self.assertEqual(other.read_output("r1", 2), ("", 2))
+
+                should_continue = StopPoller(worker, "r1", interval=0)
+                self.assertTrue(should_continue())
+                other.request_stop("r1")
+                self.assertFalse(should_continue())
+                worker.set_status("r1", "stopped", {"memo": {"hits": 1}})
+                run = other.get("r1")
+                self.assertEqual((run["status"], run["info"]), ("stopped", {"memo": {"hits": 1}}))
+                self.assertEqual(other.latest(), "r1")
+                other.prune(-1)
+                self.assertIsNone(worker.latest())
+
+    def test_meter_interrupts_loops(self):
+        ast = parse(tokenize("""
+        octyl n := 0;
+        intertillage [1..5000] -> i: {
+            n := n + 1;
+        }
+        """))
+        env = Environment(output=OutputWriter(io.StringIO()))
+        execute(ast.children[0], env)
+        env.meter = Meter(max_steps=1000, check_every=64)
+        with self.assertRaises(ExecutionInterrupted) as caught:
+            execute(ast.children[1], env)
+        self.assertEqual(caught.exception.reason, "budget")
+        self.assertEqual(env.get("n"), 100)  # only displayed iterations run the body
+
+        stop_after = iter([True, True, False])
+        env.meter = Meter(should_continue=lambda: next(stop_after), check_every=100)
+        with self.assertRaises(ExecutionInterrupted) as caught:
+            execute(ast.children[1], env)
+        self.assertEqual((caught.exception.reason, caught.exception.steps), ("stopped", 300))
+
+    def test_meter_interrupts_boundary_build(self):
+        ast = parse(tokenize("""
+        posit f(): {
+            boundary [1..1000000] -> b: {
+                print(b);
+            }
+        }
+        """))
+        env = Environment(output=OutputWriter(io.StringIO()))
+        env.meter = Meter(max_steps=100000)
+        with self.assertRaises(ExecutionInterrupted):
+            execute(ast.children[0].children[0], env)
+        self.assertNotIn("b", env.vars)
+
+    def test_memory_profile_and_limit(self):
+        code = "octyl x := 1;\nposit f(): {\n    boundary [1..100000] -> b: {\n        print(b);\n    }\n}\n"
+        tokens, spans = tokenize_spans(code)
+        ast = parse(tokens)
+
+        def run(limit):
+            env = Environment(output=OutputWriter(io.StringIO()))
+            env.meter = Meter()
+            env.memory = env.meter.memory = MemoryProfile(limit, token_lines(code, spans))
+            env.memory.start()
+            try:
+                execute_body(ast, env, lambda: True)
+            finally:
+                env.memory.stop()
+            return env.memory.summary()
+
+        summary = run(None)
+        self.assertEqual(next(iter(summary["by_type"])), "Boundary")
+        self.assertEqual(summary["hotspots"][0]["line"], 3)
+        self.assertGreater(summary["peak"], 800000)  # the 100000-element list
+        with self.assertRaises(ExecutionInterrupted) as caught:
+            run(256 * 1024)
+        self.assertEqual(caught.exception.reason, "memory")
+
+    def test_parallel_bifurcator(self):
+        ast = parse(tokenize("""
+        octyl total := 0;
+        posit f(): {
+            bifurcator 10[2, 3] -> a(x, y): {
+                print(a);
+                total := total + a;
+                intertillage [1..3] -> i: {
+                    print(i * a);
+                }
+            }
+            print(total);
+        }
+        """))
+        analyze(ast)
+        sink = io.StringIO()
+        env = Environment(output=OutputWriter(sink))
+        env.parallel_bifurcation = True
+        execute(ast.children[0], env)
+        execute_body(ast.children[1], env, lambda: True, until_recur=True)
+        env.output.flush()
+        self.assertEqual(sink.getvalue().splitlines()[1:], [
+            "⎯⎯ a: left branch ⎯⎯", "2", "2", "4", "6",
+            "⎯⎯ a: right branch ⎯⎯", "3", "3", "6", "9",
+            "3",  # both branches assigned total; the right one is applied last
+        ])
+        self.assertEqual((env.get("a"), env.get("x"), env.get("y")), (10, 2, 3))
+
+    def test_run_batch(self):
+        program = "octyl n := 2;\nposit f(): {\n    print(n * 3);\n}\n"
+        programs = [("a", program), ("b", "octyl := 1;"), ("c", program), ("d", "posit g(): {\n    print(missing);\n}\n")]
+        cache = ParseCache()
+        results = dict(run_batch(programs, jobs=1, cache=cache))
+        self.assertEqual([results[index]["ok"] for index in range(4)], [True, False, True, False])
+        self.assertEqual((results[0]["output"], results[2]["output"]), ("6\n", "6\n"))
+        self.assertTrue(results[1]["error"].startswith("SyntaxError"))
+        self.assertEqual(results[3]["error"], "RuntimeError: Undefined variable missing")
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    OPTIMIZER_PROGRAM = """
+    coeternal scale := 3;
+    coeternal horizon := ∞;
+    octyl total := 0;
+    posit unused(): {
+        print("never");
+    }
+    posit helper(): {
+        total := total + scale;
+    }
+    posit varnothing nabla infty ds2(): {
+        equiangular scale == 3: {
+            print(scale * 2);
+        }
+        equiangular 1 == 2: {
+            print("dead");
+        }
+        print(2∞ + 1);
+        print(horizon);
+        helper();
+        print(total);
+    }
+    """
+
+    def test_optimizer_preserves_output(self):
+        for mode in ("app", PROGRAM):
+            outputs = []
+            for disabled in (set(PassManager().signature().split(":")[1].split(",")), set()):
+                # the app runs every posit in order and has no calls
+                code = self.OPTIMIZER_PROGRAM if mode == PROGRAM else self.OPTIMIZER_PROGRAM.replace("helper();", "")
+                ast = parse(tokenize(code))
+                optimizer = PassManager(disabled=disabled, mode=mode)
+                optimizer.run(ast)
+                analyze(ast)
+                sink = io.StringIO()
+                env = Environment(output=OutputWriter(sink))
+                if mode == PROGRAM:
+                    execute(ast, env)
+                else:
+                    execute_body(ast, env, lambda: True)
+                env.output.flush()
+                outputs.append(sink.getvalue())
+            self.assertEqual(outputs[0], outputs[1])
+            rewrites = {timing["pass"]: timing["rewrites"] for timing in optimizer.timings}
+            self.assertEqual(rewrites["constant_propagation"], 3)
+            self.assertEqual(rewrites["symbolic_folding"], 2)  # 2∞, then 2∞ + 1
+            self.assertEqual(rewrites["constant_conditions"], 2)
+            self.assertEqual(rewrites["dead_functions"], 1 if mode == PROGRAM else 0)
+        self.assertNotIn("never", outputs[0])
+
+    OPTIMIZER_LOOP_PROGRAM = """
+    coeternal step := 2;
+    octyl acc := 0;
+    octyl big := 0;
+    octyl far := ∞;
+    posit varnothing nabla infty ds2(): {
+        intertillage [1..5000] -> i: {
+            acc := acc + i;
+            equiangular 1 == 2: {
+                print("dead");
+            }
+        }
+        intertillage [1..20000] -> j: {
+            big := big + (j * step);
+            equiangular step == 2: {
+                print(big);
+            }
+        }
+        intertillage [1..150] -> k: {
+            far := 2∞ + k;
+        }
+        print(acc);
+        print(big);
+        print(far);
+    }
+    """
+
+    def test_optimizer_passes_preserve_output_in_loops(self):
+        # Every pass on its own, and all of them, against the unoptimized
+        # and unanalyzed program; the loops change analysis (reduction,
+        # purity) once a pass rewrites their bodies
+        names = list(PassManager().signature().split(":")[1].split(","))
+        for mode in ("app", PROGRAM):
+            outputs = {}
+            for enabled in [(), *[(name,) for name in names], tuple(names)]:
+                for analyzed in (False, True):
+                    ast = parse(tokenize(self.OPTIMIZER_LOOP_PROGRAM))
+                    PassManager(disabled=set(names) - set(enabled), mode=mode).run(ast)
+                    if analyzed:
+                        analyze(ast)
+                    sink = io.StringIO()
+                    env = Environment(output=OutputWriter(sink))
+                    if mode == PROGRAM:
+                        execute(ast, env)
+                    else:
+                        execute_body(ast, env, lambda: True)
+                    env.output.flush()
+                    outputs[enabled, analyzed] = sink.getvalue()
+            expected = outputs[(), False]
+            self.assertIn("10050\n", expected)
+            for key, output in outputs.items():
+                self.assertEqual(output, expected, key)
+
+    def test_optimizer_passes_can_be_disabled(self):
+        optimizer = PassManager(disabled={"dead_functions", "symbolic_folding"})
+        self.assertEqual(optimizer.signature(), "app:constant_propagation,constant_conditions")
+        ast = optimizer.run(parse(tokenize("coeternal a := 1;\nposit f(): {\n    equiangular a == 1: {\n        print(a);\n    }\n}\n")))
+        self.assertEqual(ast.children[1].children[0].type, "Print")
+        analyze(ast)
+        with self.assertRaises(RuntimeError):
+            optimizer.run(ast)
+
+    def test_link_resolves_calls_per_program(self):
+        first = parse(tokenize("posit f(): {\n    print(1);\n}\nposit varnothing nabla infty ds2(): {\n    f();\n}\n"))
+        second = parse(tokenize("posit f(): {\n    print(2);\n}\nposit varnothing nabla infty ds2(): {\n    f();\n}\n"))
+        module = link(first)
+        self.assertIs(link(first), module)
+        self.assertEqual((sorted(module.functions), module.calls), (["ds2", "f"], 1))
+        self.assertIs(first.children[1].children[0].target, first.children[0])
+        outputs = []
+        for ast in (first, second, first):
+            sink = io.StringIO()
+            execute(ast, Environment(output=OutputWriter(sink)))
+            outputs.append(sink.getvalue())
+        self.assertEqual(outputs, ["1\n", "2\n", "1\n"])
+
+        code = "posit varnothing nabla infty ds2(): {\n    equiangular 1 == 2: {\n        missing();\n    }\n}\n"
+        with self.assertRaises(LinkError) as caught:
+            link(parse(tokenize(code)))
+        self.assertEqual(caught.exception.undefined, ["missing"])
+        self.assertEqual(link(parse(tokenize(code)), strict=False).undefined, ["missing"])
+        self.assertEqual(IncrementalCompiler(code).diagnostics(),
+                         [{"line": 3, "column": 9, "message": "Undefined function: missing"}])
+
+    def test_tokenize_file_in_parallel(self):
+        code = "".join(f'posit f{k}(): {{\n    print("}} ∞ {k}");\n    equiangular x == {k}: {{\n        octyl y := 3∞;\n    }}\n}}\n'
+                       for k in range(200))
+        data = code.encode("utf-8")
+        points = split_points(data, 4)
+        self.assertEqual((len(points), points[-1]), (4, len(data)))
+        self.assertTrue(all(data[:point].decode("utf-8").endswith("}\n}") for point in points[:-1]))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "big.sim")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(code)
+            self.assertEqual(tokenize_file_spans(path, jobs=4, min_chunk=256), tokenize_spans(code))
+            with open(path, "a", encoding="utf-8") as f:
+                f.write("octyl z := 1 @ 2;")
+            with self.assertRaises(SyntaxError) as caught:
+                tokenize_file_spans(path, jobs=4, min_chunk=256)
+            self.assertEqual(caught.exception.position, len(code) + 13)
+
+    def test_llm_scheduler_fair_queueing(self):
+        llm = LLMScheduler(concurrency=1)
+        order = []
+        started = threading.Event()
+        release = threading.Event()
+
+        def blocker():
+            started.set()
+            release.wait(5)
+
+        def request(label):
+            return lambda: order.append(label) or label
+
+        first = llm.submit(blocker, run="x")
+        self.assertTrue(started.wait(5))
+        tickets = [llm.submit(request(label), run=run, priority=priority)
+                   for label, run, priority in (("a1", "a", 0), ("a2", "a", 0), ("a3", "a", 0), ("b1", "b", 0), ("p", "c", 1))]
+        cancelled = llm.submit(request("b2"), run="b")
+        llm.cancel(cancelled)
+        self.assertEqual(llm.stats()["queued_by_run"], {"a": 3, "b": 1, "c": 1})
+        release.set()
+        self.assertEqual([ticket.result() for ticket in tickets], ["a1", "a2", "a3", "b1", "p"])
+        first.result()
+        self.assertEqual(order, ["p", "a1", "b1", "a2", "a3"])
+        stats = llm.stats()
+        self.assertEqual((stats["queued"], stats["in_flight"], stats["completed"], stats["submitted"]), (0, 0, 6, 7))
+
+    def test_llm_scheduler_retries_rate_limits(self):
+        class RateLimited(Exception):
+            status_code = 429
+
+            class response:
+                headers = {"retry-after": "0"}
+
+        attempts = []
+
+        def flaky(failures):
+            def request():
+                attempts.append(failures)
+                if attempts.count(failures) <= failures:
+                    raise RateLimited()
+                return "ok"
+            return request
+
+        llm = LLMScheduler(retries=2, backoff=0.001)
+        self.assertEqual(llm.call(flaky(2), run="a"), "ok")
+        with self.assertRaises(RateLimited):
+            llm.call(flaky(3), run="a")
+        stats = llm.stats()
+        self.assertEqual((stats["rate_limited"], stats["completed"], stats["failed"]), (5, 1, 1))
+
+        now = [0.0]
+        bucket = TokenBucket(rate=2, burst=2, clock=lambda: now[0])
+        self.assertEqual([bucket.delay(), bucket.delay(), bucket.delay()], [0.0, 0.0, 0.5])
+        now[0] = 0.5
+        self.assertEqual(bucket.delay(), 0.0)
+
+    @unittest.skipUnless(importlib.util.find_spec("openai") is None, "needs openai to be missing")
+    def test_contradictions_fall_back_without_openai(self):
+        output = self.run_simulang_output("""
+        posit varnothing nabla infty ds2(): {
+            contradiction "light is a wave" -> c: {
+                print(c);
+            }
+            contradiction ("up", "down") -> [fp, T]: {
+                print(T);
+            }
+        }
+        """)
+        self.assertIn("Not(light is a wave)", output.splitlines())
+        self.assertIn("⚠️ OpenAI fallback", output)
+
+    def test_llm_prefetch(self):
+        ast = parse(tokenize("""
+        posit f(): {
+            contradiction "light is a wave" -> c: {
+                print(c);
+            }
+            contradiction ("up", "down") -> [fp, T]: {
+                print(T);
+            }
+            contradiction x -> d: {
+                print(d);
+            }
+            boundary ["sea".."sky"] -> b: {
+                print(b.top);
+            }
+        }
+        """))
+        found = list(llm_requests(ast))
+        self.assertEqual([(site, prompt) for site, _, prompt, _ in found], [
+            ("contradiction_infer", prompts.infer_prompt("light is a wave")),
+            ("contradiction", prompts.classify_prompt("up", "down")),
+            ("boundary", prompts.boundary_prompt("sea", "sky")),
+        ])  # `x` is only known at run time
+        fp_prompt, follow_up = found[1][3]("convex")
+        self.assertEqual(fp_prompt, prompts.focal_point_prompt("convex", "up", "down"))
+        self.assertEqual(follow_up("fp")[0], prompts.truth_prompt("convex", "up", "down", "fp"))
+
+        llm = LLMScheduler()
+        responses = PrefetchedResponses(ttl=60)
+        key = request_key(messages("system", "prompt"))
+        tickets = [llm.submit(lambda: "first"), llm.submit(lambda: "second")]
+        for ticket in tickets:
+            responses.put(key, ticket)
+        self.assertEqual(responses.pending(key), 2)
+        self.assertIs(responses.take(key), tickets[0])
+        self.assertEqual(responses.pending(key), 1)
+        expired = PrefetchedResponses(ttl=0)
+        expired.put(key, llm.submit(lambda: "stale"))
+        self.assertEqual(expired.pending(key), 0)
+
+        # Done-callbacks (which queue prefetch follow-ups) run before waiters wake
+        release, followed_up = threading.Event(), []
+        ticket = llm.submit(lambda: release.wait(5) and "classification")
+
+        def follow_up(ticket):
+            time.sleep(0.1)
+            followed_up.append(ticket.value)
+        ticket.add_done_callback(follow_up)
+        release.set()
+        self.assertTrue(ticket.wait(5))
+        self.assertEqual(followed_up, ["classification"])
+
+        # ask() picks up a finished prefetch instead of sending the request
+        ticket = llm.submit(lambda: "prefetched reply")
+        ticket.wait(5)
+        prefetched.put(request_key(messages(prompts.INFER_CONTEXT, "q")), ticket)
+        self.assertEqual(ask(prompts.INFER_CONTEXT, "q", Meter()), "prefetched reply")
+
+    def test_asgi_long_poll_and_stream(self):
+        os.environ.setdefault("SIMULANG_RUN_DB", ":memory:")
+        import asgi
+
+        async def request(method, path, body=None, query=""):
+            messages = [{"type": "http.request", "body": json.dumps(body).encode() if body is not None else b""}]
+            sent = []
+
+            async def receive():
+                if messages:
+                    return messages.pop()
+                await asyncio.sleep(3600)
+
+            async def send(message):
+                sent.append(message)
+
+            await asgi.app({"type": "http", "method": method, "path": path, "query_string": query.encode()}, receive, send)
+            return sent[0]["status"], b"".join(message.get("body", b"") for message in sent[1:]).decode()
+
+        code = "octyl n := 0;\nposit varnothing nabla infty ds2(): {\n    print(n);\n    n := n + 1;\n    recur ds2(3);\n}\n"
+
+        async def scenario():
+            status, body = await request("POST", "/compile", {"code": code})
+            self.assertEqual((status, "output" in json.loads(body)), (200, True))
+            self.assertEqual((await request("GET", "/missing"))[0], 404)
+
+            run_id = json.loads((await request("POST", "/run", {"code": code, "checkpoint_interval": 0}))[1])["run_id"]
+            output, cursor, done = "", 0, False
+            while not done:
+                result = json.loads((await request("GET", "/fetch_output", query=f"run_id={run_id}&since={cursor}&wait=5"))[1])
+                output += result["output"]
+                cursor, done = result["cursor"], result["done"]
+
+            status, body = await request("GET", "/stream_output", query=f"run_id={run_id}")
+            lines = [json.loads(line) for line in body.splitlines()]
+            return output, "".join(line["output"] for line in lines), lines[-1]["done"]
+
+        output, streamed, done = asyncio.run(scenario())
+        self.assertEqual(output.split(), ["0", "1", "2", "⚠️", "Loop", "bounded", "to", "3", "steps."])
+        self.assertEqual((streamed, done), (output, True))
+
+    def test_flat_ast_round_trip(self):
+        code = """
+        coeternal light := ∞;
+        octyl n := 0;
+        posit helper(): {
+            n := n + 2;
+        }
+        posit varnothing nabla infty ds2(): {
+            delineator "d": {
+                print(2∞ + 1);
+                print(light);
+            }
+            intertillage [1..3] -> i: {
+                print(i * 2.5);
+            }
+            bifurcator 3[5, 7] -> o(l, r): {
+                print(l + r);
+            }
+            helper();
+            print(n);
+            recur ds2(2);
+        }
+        """
+        ast = parse(tokenize(code))
+        PassManager().run(ast)
+        flat = decode(encode(ast))
+        self.assertEqual(repr(flat), repr(ast))
+        self.assertEqual(flat.children[3].children[0].children[0].value[0], "Symbolic")
+
+        def output(program):
+            sink = io.StringIO()
+            execute(program, Environment(output=OutputWriter(sink)))
+            return sink.getvalue()
+
+        expected = output(ast)
+        self.assertEqual(output(flat), expected)
+        shared = SharedAST(parse(tokenize(code)))
+        try:
+            self.assertEqual(output(attach(shared.name)), expected)
+            results = dict(run_batch([("a", code), ("b", code), ("c", "octyl := 1;")], jobs=1, executor="process", share_ast=True))
+        finally:
+            detach(shared.name)
+            shared.unlink()
+        unshared = dict(run_batch([("a", code)], jobs=1))[0]["output"]
+        self.assertEqual([results[index]["output"] for index in range(2)], [unshared, unshared])
+        self.assertTrue(results[2]["error"].startswith("SyntaxError"))
+
+    def test_metrics_exposition(self):
+        registry = Registry()
+        requests = registry.register(Counter("test_requests_total", "Requests.", ["site"]))
+        latency = registry.register(Histogram("test_latency_seconds", "Latency.", buckets=(0.1, 1.0)))
+        ok = requests.labels("ok")
+
+        def work():
+            for _ in range(1000):
+                ok.inc()
+            latency.observe(0.5)
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        requests.labels('a "b"').inc(2)
+        latency.observe(0.05)
+        self.assertEqual(registry.render().splitlines(), [
+            "# HELP test_requests_total Requests.",
+            "# TYPE test_requests_total counter",
+            'test_requests_total{site="a \\"b\\""} 2',
+            'test_requests_total{site="ok"} 4000',
+            "# HELP test_latency_seconds Latency.",
+            "# TYPE test_latency_seconds histogram",
+            'test_latency_seconds_bucket{le="0.1"} 1',
+            'test_latency_seconds_bucket{le="1"} 5',
+            'test_latency_seconds_bucket{le="+Inf"} 5',
+            "test_latency_seconds_sum 2.05",
+            "test_latency_seconds_count 5",
+        ])
+
+        # Cells of exited threads are retired as new threads register,
+        # without waiting for a collection
+        counter = Counter("test_threads_total", "Threads.")
+        for _ in range(20):
+            thread = threading.Thread(target=counter.inc)
+            thread.start()
+            thread.join()
+        self.assertLessEqual(len(counter._default._shards._cells), 2)
+        self.assertEqual(counter._default.value(), 20)
+
 if __name__ == '__main__':
     unittest.main()